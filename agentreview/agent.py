@@ -8,8 +8,13 @@ from typing import List, Union
 from tenacity import RetryError
 
 from .backends import IntelligenceBackend, load_backend
+from .backends.coalescing import coalesced_query
 from .config import AgentConfig, BackendConfig, Configurable
+from .context_window import ContextWindowManager
 from .message import SYSTEM_NAME, Message
+from .metrics import track_call
+from .model_router import ModelRouter, get_player_role
+from .tracing import span
 
 # A special signal sent by the player to indicate that it is not possible to continue the conversation, and it requests to end the conversation.
 # It contains a random UUID string to avoid being exploited by any of the players.
@@ -64,9 +69,12 @@ class Player(Agent):
             role_desc (str): Description of the player's role.
             backend (Union[BackendConfig, IntelligenceBackend]): The backend that will be used for decision making. It can be either a LLM backend or a Human backend.
             global_prompt (str): A universal prompt that applies to all players. Defaults to None.
+            model_router (ModelRouter): Selects the model of the backend in each phase, see `select_model`. Defaults
+                to None, i.e. the model of the backend config is always used.
         """
 
         self.data_dir = kwargs.pop("data_dir", None)
+        self.model_router: ModelRouter = kwargs.pop("model_router", None)
         self.args = args
 
 
@@ -96,6 +104,36 @@ class Player(Agent):
 
         self.backend = backend
 
+        # The model route of the calls of the player, set by `select_model`
+        self.route = None
+
+        self.context_window = self._get_context_window()
+
+    def _get_context_window(self):
+        # Stateful backends keep the history on their side, so it cannot be compacted here. None if the context window
+        # of the model is unknown.
+        if self.backend.uses_context_window and not self.backend.stateful:
+            return ContextWindowManager.for_backend(
+                self.backend, max_context_tokens=getattr(self.args, "max_context_tokens", None))
+        return None
+
+    def select_model(self, phase: str = None):
+        """
+        Switch the backend to the model routed to this player in `phase` (see `model_router.py`). Called before each
+        action, so that routes with a latency policy follow the latencies observed so far.
+        """
+        if self.model_router is None or not hasattr(self.backend, "model"):
+            return
+
+        self.route, model = self.model_router.select(get_player_role(self.name), phase)
+        if model != self.backend.model:
+            logging.info(f"Routing {self.name} to {model} (route {self.route})")
+            self.backend.model = model
+            # Saved configs (`to_config`) record the current model
+            self.backend._config_dict["model"] = model
+            # The context window depends on the model
+            self.context_window = self._get_context_window()
+
     def to_config(self) -> AgentConfig:
         return AgentConfig(
             name=self.name,
@@ -104,6 +142,16 @@ class Player(Agent):
             global_prompt=self.global_prompt,
         )
 
+    def fit_context(self, observation: List[Message]) -> List[Message]:
+        """Compact or drop the messages of the observation that do not fit in the context window of the model."""
+        if self.context_window is None:
+            return observation
+
+        observation, report = self.context_window.fit(observation, self.role_desc, self.global_prompt, self.name)
+        if report.changed:
+            logging.info(f"Fitted the context of {self.name} in the context window: {report.format()}")
+        return observation
+
     def act(self, observation: List[Message]) -> str:
         """
         Take an action based on the observation (Generate a response), which can later be parsed to actual actions that affect the game dynamics.
@@ -114,14 +162,24 @@ class Player(Agent):
         Returns:
             str: The action (response) of the player.
         """
+        observation = self.fit_context(observation)
+
         try:
-            response = self.backend.query(
-                agent_name=self.name,
-                role_desc=self.role_desc,
-                history_messages=observation,
-                global_prompt=self.global_prompt,
-                request_msg=None,
-            )
+            with span("backend.request", backend=self.backend.type_name, player=self.name), \
+                    track_call(self.backend, player=self.name, route=self.route) as record:
+                # Identical requests of concurrent arenas share one response, if enabled for this temperature
+                response = coalesced_query(
+                    self.backend,
+                    max_temperature=getattr(self.args, "coalesce_max_temperature", None),
+                    agent_name=self.name,
+                    role_desc=self.role_desc,
+                    history_messages=observation,
+                    global_prompt=self.global_prompt,
+                    request_msg=None,
+                )
+
+            if self.model_router is not None:
+                self.model_router.observe(self.route, record)
         except RetryError as e:
             err_msg = f"Agent {self.name} failed to generate a response. Error: {e.last_attempt.exception()}. Sending signal to end the conversation."
             logging.warning(err_msg)
@@ -144,6 +202,8 @@ class Player(Agent):
         Returns:
             str: The action (response) of the player.
         """
+        observation = self.fit_context(observation)
+
         try:
             response = self.backend.async_query(
                 agent_name=self.name,
@@ -8,6 +8,7 @@ from .agent import Player
 from .backends import Human
 from .config import ArenaConfig
 from .environments import Environment, TimeStep, load_environment
+from .tracing import span
 
 
 class TooManyInvalidActions(Exception):
@@ -57,18 +58,19 @@ class Arena:
         )  # get the observation for the player
 
         timestep = None
-        for i in range(
-            self.invalid_actions_retry
-        ):  # try to take an action for a few times
-            action = player(observation)  # take an action
-            if self.environment.check_action(action, player_name):  # action is valid
-                timestep = self.environment.step(
-                    player_name, action
-                )  # update the environment
-                break
-            else:  # action is invalid
-                logging.warning(f"{player_name} made an invalid action {action}")
-                continue
+        with span("step", player=player_name):
+            for i in range(
+                self.invalid_actions_retry
+            ):  # try to take an action for a few times
+                action = player(observation)  # take an action
+                if self.environment.check_action(action, player_name):  # action is valid
+                    timestep = self.environment.step(
+                        player_name, action
+                    )  # update the environment
+                    break
+                else:  # action is invalid
+                    logging.warning(f"{player_name} made an invalid action {action}")
+                    continue
 
         if (
             timestep is None
@@ -184,16 +186,7 @@ class Arena:
                 writer.writerow(header)
                 writer.writerows(message_rows)
         elif path.endswith(".json"):
-            for message in messages:
-                message_row = {
-                    "agent_name": message.agent_name,
-                    "content": message.content,
-                    "turn": message.turn,
-                    "timestamp": str(message.timestamp),
-                    "visible_to": message.visible_to,
-                    "msg_type": message.msg_type,
-                }
-                message_rows.append(message_row)
+            message_rows = [message.to_dict() for message in messages]
 
             with open(path, "w") as f:
                 json.dump(message_rows, f, indent=2)
@@ -40,6 +40,12 @@ def parse_args():
         help="Specifies the scoring method used by the Area Chair (AC) to evaluate papers: 'recommendation' or 'ranking'."
     )
 
+    parser.add_argument(
+        "--ac_structured_output", action="store_true",
+        help="If set, the Area Chair returns its decisions (Phase 5) as JSON, enforced with a JSON schema through "
+             "the `response_format` of the OpenAI API. Requires a model that supports structured outputs."
+    )
+
     parser.add_argument(
         "--conference", type=str, default="ICLR2023",
         help="Conference name where the papers are being evaluated, e.g., 'ICLR2023'."
@@ -63,11 +69,41 @@ def parse_args():
         "--skip_logging", action="store_true", help="If set, we do not log the messages in the console."
     )
 
+    parser.add_argument(
+        "--quiet", action="store_true",
+        help="If set, only warnings and errors are written to the console (batch mode). The per-paper log files of "
+             "`--log_dir` are not affected."
+    )
+
+    parser.add_argument(
+        "--log_dir", type=str, default=None,
+        help="If set, the logs of each paper (or AC batch) are also written to `{log_dir}/{experiment}/{paper}.log`."
+    )
+
+    parser.add_argument(
+        "--log_max_message_chars", type=int, default=2000,
+        help="Log messages longer than this (e.g. whole papers) are truncated on the console. 0 to never truncate."
+    )
+
+    parser.add_argument(
+        "--log_max_records_per_second", type=float, default=50,
+        help="Log records below the WARNING level written to the console per second. The others are counted and "
+             "summarized. 0 for no limit."
+    )
+
     parser.add_argument(
         "--num_papers_per_area_chair", type=int, default=10,
         help="The number of papers each area chair is assigned for evaluation."
     )
 
+    parser.add_argument(
+        "--ac_batch_token_budget", type=int, default=None,
+        help="If set, the papers of Phase 5 are packed into AC batches whose context (metareviews, role description "
+             "of the AC and its response) fits in this many tokens, instead of batches of "
+             "`--num_papers_per_area_chair` papers. The papers to accept are split among the "
+             "batches in proportion to their sizes, and the batches are recorded next to the AC decisions."
+    )
+
     # Model configuration
     parser.add_argument(
         "--model_name", type=str, default="gpt-4o", choices=["gpt-4", "gpt-4o", "gpt-35-turbo"],
@@ -75,6 +111,38 @@ def parse_args():
              "cost-effective alternative, or 'gpt-4o' for larger context support."
     )
 
+    parser.add_argument(
+        "--max_context_tokens", type=int, default=None,
+        help="Context window (in tokens) that the prompts of the LLM-based players must fit in. Older and "
+             "lower-priority messages (e.g. the paper contents) are compacted when a prompt does not fit. Defaults to "
+             "the context window of the model."
+    )
+
+    parser.add_argument(
+        "--hedge_percentile", type=float, default=None,
+        help="If set, a backend call that has not returned after this percentile of the recent latencies of its model "
+             "(e.g. 95) is sent again, and the first response is used. Cuts the tail latency at the cost of some "
+             "duplicated requests, see `--hedge_budget`."
+    )
+
+    parser.add_argument(
+        "--hedge_budget", type=float, default=0.05,
+        help="The maximum fraction of the backend calls that are sent again when `--hedge_percentile` is set."
+    )
+
+    parser.add_argument(
+        "--coalesce_max_temperature", type=float, default=None,
+        help="If set, identical requests of concurrent arenas (e.g. the BASELINE reviewers of several experiments on "
+             "the same paper) share one response when the backend samples at this temperature or lower. Use 0 to only "
+             "share deterministic requests. Disabled by default, so that every sampled response is independent."
+    )
+
+    parser.add_argument(
+        "--backend_type", type=str, default="openai-chat",
+        help="Backend used by the LLM-based players (reviewers, authors and ACs). Use 'fake' for a deterministic "
+             "backend that returns well-formed responses without making any API calls (e.g. for load testing)."
+    )
+
     # Output directories
     parser.add_argument(
         "--output_dir", type=str, default="outputs", help="Directory where results, logs, and outputs will be stored."
@@ -85,6 +153,18 @@ def parse_args():
         "--max_num_words", type=int, default=16384, help="Maximum number of words in the paper."
     )
 
+    parser.add_argument(
+        "--metrics_dir", type=str, default=None,
+        help="If set, per-call backend metrics (latency, tokens, retries and cost) are written to `calls.jsonl` and, "
+             "in the Prometheus text format, to `metrics.prom` in this directory."
+    )
+
+    parser.add_argument(
+        "--trace_path", type=str, default=None,
+        help="If set, tracing spans (sweep, paper arena, phase, step, backend request and attempt) are saved to this "
+             "file in the Chrome Trace Event format. Open it with https://ui.perfetto.dev or chrome://tracing."
+    )
+
     parser.add_argument(
         "--visual_dir", type=str, default="outputs/visual",
         help="Directory where visualization files (such as graphs and plots) will be stored."
@@ -100,6 +180,16 @@ def parse_args():
         "--data_dir", type=str, default='data', help="Directory where input data (e.g., papers) are stored."
     )
 
+    parser.add_argument(
+        "--download_workers", type=int, default=8,
+        help="Number of papers downloaded in parallel from OpenReview."
+    )
+
+    parser.add_argument(
+        "--openreview_pdf_url", type=str, default="https://openreview.net/pdf?id={note_id}",
+        help="URL template of the paper PDFs on OpenReview. `{note_id}` is replaced by the ID of the submission note."
+    )
+
     parser.add_argument(
         "--acceptance_rate", type=float, default=0.32,
         help="Percentage of papers to accept. We use 0.32, the average acceptance rate for ICLR 2020 - 2023"
@@ -124,7 +214,7 @@ def parse_args():
     # Sanity checks for authentication
     print("Running sanity checks for the arguments...")
 
-    if args.openai_client_type == "openai":
+    if args.openai_client_type == "openai" and args.backend_type == "openai-chat":
         if os.environ.get('OPENAI_API_KEY') is None:
             assert isinstance(args.openai_key, str), ("Please specify the `--openai_key` argument OR set the "
                                                       "OPENAI_API_KEY environment variable.")
@@ -141,7 +231,7 @@ def parse_args():
                        f"Otherwise, please choose from the following: "
                        f"{EXISTING_EXPERIMENT_SETTINGS}")
 
-    if args.openai_client_type == "azure_openai":
+    if args.openai_client_type == "azure_openai" and args.backend_type == "openai-chat":
         if os.environ.get('AZURE_OPENAI_KEY') is None:
             assert isinstance(args.openai_key, str), ("Please specify the `--openai_key` argument OR set the "
                                                       "AZURE_OPENAI_KEY environment variable.")
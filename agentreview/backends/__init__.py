@@ -2,6 +2,7 @@ from ..config import BackendConfig
 from .anthropic import Claude
 from .base import IntelligenceBackend
 from .cohere import CohereAIChat
+from .fake import FakeChat
 from .hf_transformers import TransformersConversational
 from .human import Human
 from .openai import OpenAIChat
@@ -14,6 +15,7 @@ ALL_BACKENDS = [
     TransformersConversational,
     Claude,
     Dummy,
+    FakeChat,
 ]
 
 BACKEND_REGISTRY = {backend.type_name: backend for backend in ALL_BACKENDS}
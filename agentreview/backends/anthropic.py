@@ -1,16 +1,17 @@
+import importlib.util
 import os
 import re
 from typing import List
 
-from tenacity import retry, stop_after_attempt, wait_random_exponential
-
 from ..message import SYSTEM_NAME as SYSTEM
 from ..message import Message
+from ..metrics import record_attempt
+from ..tracing import traced
 from .base import IntelligenceBackend
+from .resilience import retry_policy
 
-try:
-    import anthropic
-except ImportError:
+# The anthropic package is imported when the backend is created, so that it is not loaded by runs that do not use it
+if importlib.util.find_spec("anthropic") is None:
     is_anthropic_available = False
     # logging.warning("anthropic package is not installed")
 else:
@@ -42,10 +43,16 @@ class Claude(IntelligenceBackend):
         self.max_tokens = max_tokens
         self.model = model
 
+        import anthropic
+
         self.client = anthropic.Client(os.environ["ANTHROPIC_API_KEY"])
 
-    @retry(stop=stop_after_attempt(6), wait=wait_random_exponential(min=1, max=60))
+    @retry_policy()
+    @traced("backend.attempt")
     def _get_response(self, prompt: str):
+        import anthropic
+
+        record_attempt()
         response = self.client.completion(
             prompt=prompt,
             stop_sequences=[anthropic.HUMAN_PROMPT],
@@ -87,6 +94,8 @@ class Claude(IntelligenceBackend):
         if request_msg:
             all_messages.append((SYSTEM, request_msg.content))
 
+        import anthropic
+
         prompt = ""
         prev_is_human = False  # Whether the previous message is from human (in anthropic, the human is the user)
         for i, message in enumerate(all_messages):
@@ -2,11 +2,10 @@ import os
 import re
 from typing import List
 
-from tenacity import retry, stop_after_attempt, wait_random_exponential
-
 from ..message import SYSTEM_NAME as SYSTEM
 from ..message import Message
 from .base import IntelligenceBackend
+from .resilience import retry_policy
 
 try:
     import bardapi
@@ -41,7 +40,7 @@ class Bard(IntelligenceBackend):
 
         self.client = bardapi.core.Bard()
 
-    @retry(stop=stop_after_attempt(6), wait=wait_random_exponential(min=1, max=60))
+    @retry_policy()
     def _get_response(self, prompt: str):
         response = self.client.get_answer(
             input_text=prompt,
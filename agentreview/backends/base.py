@@ -10,6 +10,8 @@ class IntelligenceBackend(Configurable):
 
     stateful = None
     type_name = None
+    # Whether the prompts go to a model with a limited context window, which `ContextWindowManager` fits them into
+    uses_context_window = True
 
     @abstractmethod
     def __init__(self, **kwargs):
@@ -27,6 +29,11 @@ class IntelligenceBackend(Configurable):
                 )
         return super().__init_subclass__(**kwargs)
 
+    @property
+    def provider_name(self) -> str:
+        """The provider called by this backend. Backends of the same provider share a circuit breaker."""
+        return self.type_name
+
     def to_config(self) -> BackendConfig:
         self._config_dict["backend_type"] = self.type_name
         return BackendConfig(**self._config_dict)
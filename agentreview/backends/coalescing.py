@@ -0,0 +1,145 @@
+"""
+Coalescing of identical in-flight requests.
+
+When several experiments on the same paper run concurrently, their players with the same settings (e.g. the BASELINE
+reviewers) send byte-identical requests at the same time. `coalesced_query` sends each distinct request once: requests
+are keyed by a hash of the backend settings and of the prompt, and the callers of a request that is already in flight
+wait for its response instead of sending a copy. Only concurrent requests are shared, nothing is cached once the
+response has been returned.
+
+Sharing a response only preserves the semantics of the experiments if the backend would have answered the same, so
+coalescing is limited to the backends sampling at a temperature of at most `max_temperature`
+(`--coalesce_max_temperature` on the command line). With the default of None, no request is coalesced. Stateful
+backends are never coalesced.
+
+    response = coalesced_query(backend, max_temperature=0.0, agent_name=..., role_desc=..., history_messages=...)
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..message import Message
+from ..metrics import record_coalesced
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(backend, agent_name: str, role_desc: str, history_messages: List[Message], global_prompt: str = None,
+                request_msg: Message = None) -> str:
+    """
+    A hash of everything the response of `backend.query` depends on: the backend settings (including the current
+    model) and the prompt. The turns and timestamps of the messages are left out, since the backends do not send them.
+    """
+    config = dict(backend.to_config())
+    config["model"] = getattr(backend, "model", config.get("model"))
+    payload = {
+        "backend": config,
+        "agent_name": agent_name,
+        "role_desc": role_desc,
+        "global_prompt": global_prompt,
+        "messages": [(message.agent_name, message.content) for message in history_messages],
+        "request_msg": request_msg.content if request_msg is not None else None,
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    """A request in flight, and its outcome once done."""
+
+    __slots__ = ("done", "result", "error", "num_waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.num_waiters = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time, sharing its outcome with the callers that arrive while it runs."""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.num_calls = 0
+        self.num_coalesced = 0
+
+    def do(self, key: str, func: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        Call `func(*args, **kwargs)`, unless a call with the same key is in flight, in which case wait for its
+        outcome. Returns the result and whether it was shared. Errors are shared as well: every caller raises the
+        error of the call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.num_waiters += 1
+                self.num_coalesced += 1
+                is_leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.num_calls += 1
+                is_leader = True
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if call.num_waiters:
+                logger.debug(f"Shared the response of request {key[:12]} with {call.num_waiters} identical requests")
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.num_calls, "coalesced": self.num_coalesced}
+
+
+# Shared by all the arenas of the process
+_SINGLE_FLIGHT = SingleFlight()
+
+
+def can_coalesce(backend, max_temperature: Optional[float]) -> bool:
+    """Whether the requests of `backend` may be shared. Backends without a temperature are deterministic."""
+    if max_temperature is None or backend.stateful:
+        return False
+    temperature = getattr(backend, "temperature", None)
+    return temperature is None or temperature <= max_temperature
+
+
+def coalesced_query(backend, max_temperature: Optional[float] = None, **query_kwargs) -> str:
+    """`backend.query(**query_kwargs)`, shared with the identical requests in flight if the backend can be coalesced."""
+    if not can_coalesce(backend, max_temperature):
+        return backend.query(**query_kwargs)
+
+    key = request_key(backend, **query_kwargs)
+    result, shared = _SINGLE_FLIGHT.do(key, backend.query, **query_kwargs)
+    if shared:
+        record_coalesced()
+    return result
+
+
+def get_coalescing_counts() -> Dict[str, int]:
+    return _SINGLE_FLIGHT.counts()
+
+
+def format_coalescing_counts() -> str:
+    counts = get_coalescing_counts()
+    total = counts["requests"] + counts["coalesced"]
+    share = counts["coalesced"] / total if total else 0.0
+    return (f"Coalesced requests: {counts['coalesced']} of {total} ({share:.1%}) shared the response of an identical "
+            f"request in flight")
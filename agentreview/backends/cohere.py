@@ -1,10 +1,11 @@
 import os
 from typing import List
 
-from tenacity import retry, stop_after_attempt, wait_random_exponential
-
 from ..message import Message
+from ..metrics import record_attempt
+from ..tracing import traced
 from .base import IntelligenceBackend
+from .resilience import retry_policy
 
 # Try to import the cohere package and check whether the API key is set
 try:
@@ -59,8 +60,10 @@ class CohereAIChat(IntelligenceBackend):
         self.session_id = None
         self.last_msg_hash = None
 
-    @retry(stop=stop_after_attempt(6), wait=wait_random_exponential(min=1, max=60))
+    @retry_policy()
+    @traced("backend.attempt")
     def _get_response(self, new_message: str, persona_prompt: str):
+        record_attempt()
         response = self.client.chat(
             new_message,
             persona_prompt=persona_prompt,
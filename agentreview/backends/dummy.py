@@ -1,14 +1,22 @@
-from agentreview.config import Configurable
+from .base import IntelligenceBackend
 
 
-class Dummy(Configurable):
-    """A dummy backend does not make any API calls. We use it for extracting paper contents in PaperExtractor
-    and also for testing."""
+class Dummy(IntelligenceBackend):
+    """A dummy backend does not make any API calls. We use it for extracting paper contents in PaperExtractor.
+
+    For a backend that returns well-formed reviews and decisions (e.g. for testing), use `FakeChat` in `fake.py`."""
     stateful = False
     type_name = "dummy"
+    uses_context_window = False
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
+    def query(self, *args, **kwargs) -> str:
+        return ""
+
+    async def async_query(self, *args, **kwargs) -> str:
+        return ""
+
     def reset(self):
-        pass
\ No newline at end of file
+        pass
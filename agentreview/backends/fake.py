@@ -0,0 +1,278 @@
+"""
+A deterministic fake backend for load testing.
+
+The responses are canned but well-formed: reviews, rebuttals, metareviews and AC decisions follow the formats
+requested in `role_descriptions.py`, so that the whole pipeline (including `PaperDecision.parse_ac_decisions`) runs
+end-to-end without calling any API. The same prompt always yields the same response. Latency and errors are sampled
+from configurable distributions so that orchestration overhead and concurrency scaling can be measured.
+
+The response generator is shared with the local OpenAI-compatible server in `mock_server.py`.
+"""
+
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import List, Optional
+
+from ..message import SYSTEM_NAME, Message
+from ..metrics import record_attempt, record_usage
+from ..tracing import traced
+from .base import IntelligenceBackend
+from .hedging import call_hedged
+from .resilience import retry_policy
+
+DEFAULT_LATENCY = {"distribution": "fixed", "mean": 0.0}
+
+LATENCY_DISTRIBUTIONS = ["fixed", "uniform", "normal", "lognormal", "exponential"]
+
+
+class FakeBackendError(Exception):
+    """An injected error. `status_code` mirrors the HTTP status code an API would have returned."""
+
+    def __init__(self, message: str, status_code: int = 500, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class FakeRateLimitError(FakeBackendError):
+    """An injected 429 (Too Many Requests) error."""
+
+    def __init__(self, message: str = "Rate limit exceeded (injected)", retry_after: Optional[float] = None):
+        super().__init__(message, status_code=429, retry_after=retry_after)
+
+
+def sample_latency(latency: dict, rng: random.Random) -> float:
+    """
+    Sample a latency (in seconds) from a latency configuration.
+
+    args:
+        latency: a dict with a `distribution` (one of LATENCY_DISTRIBUTIONS), a `mean` and, depending on the
+            distribution, a `std` (normal, lognormal) or `low`/`high` (uniform). Samples are clipped at 0.
+        rng: the random number generator to sample from
+    """
+    distribution = latency.get("distribution", "fixed")
+    mean = float(latency.get("mean", 0.0))
+    std = float(latency.get("std", 0.0))
+
+    if distribution == "fixed":
+        value = mean
+    elif distribution == "uniform":
+        value = rng.uniform(float(latency.get("low", 0.0)), float(latency.get("high", 2 * mean)))
+    elif distribution == "normal":
+        value = rng.gauss(mean, std)
+    elif distribution == "lognormal":
+        # Parameterized by the mean and std of the latency itself rather than of the underlying normal distribution
+        if mean <= 0:
+            value = 0.0
+        else:
+            sigma2 = math.log(1 + (std / mean) ** 2)
+            mu = math.log(mean) - sigma2 / 2
+            value = rng.lognormvariate(mu, sigma2 ** 0.5)
+    elif distribution == "exponential":
+        value = rng.expovariate(1 / mean) if mean > 0 else 0.0
+    else:
+        raise ValueError(f"Unknown latency distribution: {distribution}. Choose from {LATENCY_DISTRIBUTIONS}.")
+
+    return max(0.0, value)
+
+
+def _rng_for(*parts: str) -> random.Random:
+    digest = hashlib.sha256("\x00".join(parts).encode()).hexdigest()
+    return random.Random(int(digest[:16], 16))
+
+
+def generate_fake_response(system_prompt: str, conversation: str, seed: int = 0,
+                           decision_drop_rate: float = 0.0) -> str:
+    """
+    Generate a deterministic response for the role described in `system_prompt`.
+
+    args:
+        system_prompt: the system prompt, which contains the role description of the player
+        conversation: the rendered conversation history
+        seed: a seed mixed into the hash of the prompt, so that different seeds give different (but still
+            deterministic) responses
+        decision_drop_rate: the probability that the AC leaves out the decision of a paper, to exercise the repair
+            of incomplete AC decisions
+    """
+    rng = _rng_for(str(seed), system_prompt, conversation)
+    prompt = system_prompt.lower()
+
+    if "area chair" in prompt and ("rank the papers" in prompt or "decide if a paper is accepted" in prompt):
+        # Only match the paper IDs in the metareview block, not the ones in the format instructions
+        paper_ids = list(dict.fromkeys(re.findall(r"Paper ID: (\d+)\nMetareview:", system_prompt + conversation)))
+        rng.shuffle(paper_ids)
+
+        # When asked again for the missing decisions, continue the ranking after the ranks already taken
+        match = re.search(r"willingness to accept from (\d+) to", prompt)
+        first_rank = int(match.group(1)) if match else 1
+
+        decisions = []
+        for rank, paper_id in enumerate(paper_ids, start=first_rank):
+            if rng.random() < decision_drop_rate:
+                continue
+            if "rank the papers" in prompt:
+                decisions.append((int(paper_id), "willingness_to_accept", rank))
+            else:
+                decisions.append((int(paper_id), "decision", "Accept" if rng.random() < 0.32 else "Reject"))
+
+        if "respond with a json object" in prompt:
+            return json.dumps({"decisions": [{"paper_id": paper_id, field: value}
+                                             for paper_id, field, value in decisions]})
+
+        lines = []
+        for paper_id, field, value in decisions:
+            label = "Willingness to accept" if field == "willingness_to_accept" else "Decision"
+            lines += [f"Paper ID: {paper_id}", f"{label}: {value}"]
+        return "\n".join(lines)
+
+    if "area chair" in prompt:
+        score = rng.choice([3, 4, 5, 5.5, 6, 6.5, 7, 8])
+        return (f"Score: {score}\n"
+                f"Summary: The reviewers agree that the submission studies a relevant problem. After weighing the "
+                f"reviews, the rebuttal and the discussion, I consider the contribution "
+                f"{'sufficient' if score >= 6 else 'insufficient'} for acceptance.")
+
+    if "you are an author" in prompt:
+        return ("Response: We thank the reviewer for the careful reading of our paper. We address each concern "
+                "below and will clarify the presentation, add the requested ablations and discuss the limitations "
+                "in the revised manuscript.")
+
+    if "you are a reviewer" in prompt:
+        rating = rng.choice([1, 3, 4, 5, 6, 7, 8])
+
+        if "updated paper review" in prompt:
+            rating = min(10, max(1, rating + rng.choice([-1, 0, 0, 1])))
+            review = ""
+            if "overall rating" in prompt:
+                review += f"Overall rating: {rating}\n\n"
+            review += ("Summary: The authors addressed some of my concerns in the rebuttal, but questions about the "
+                       "experimental evaluation remain.")
+            return review
+
+        review = ""
+        if "overall rating" in prompt:
+            review += f"Overall rating: {rating}\n\n"
+        review += ("Significance and novelty: The paper tackles a relevant problem with a moderately novel approach.\n\n"
+                   "Reasons for acceptance:\n1. Clear motivation.\n2. Sound method.\n3. Broad experiments.\n"
+                   "4. Well written.\n\n"
+                   "Reasons for rejection:\n1. Limited novelty.\n2. Missing baselines.\n3. Unclear ablations.\n"
+                   "4. Limited theoretical analysis.\n\n"
+                   "Suggestions for improvement:\n1. Add baselines.\n2. Add ablations.\n3. Discuss limitations.\n"
+                   "4. Release code.")
+        return review
+
+    return "Thank you. I have nothing further to add."
+
+
+class FakeChat(IntelligenceBackend):
+    """
+    A deterministic fake backend that returns well-formed responses without making API calls.
+
+    Useful for measuring orchestration overhead and concurrency scaling of the review pipeline.
+    """
+
+    stateful = False
+    type_name = "fake"
+
+    def __init__(
+            self,
+            latency: dict = None,
+            error_rate: float = 0.0,
+            rate_limit_rate: float = 0.0,
+            retry_after: float = 1.0,
+            seed: int = 0,
+            decision_drop_rate: float = 0.0,
+            model: str = None,
+            hedging: dict = None,
+            **kwargs,
+    ):
+        """
+        Instantiate the fake backend.
+
+        args:
+            latency: the latency distribution of each call, see `sample_latency`. Defaults to no latency.
+            error_rate: the probability that a call fails with an injected 500 error
+            rate_limit_rate: the probability that a call fails with an injected 429 error
+            retry_after: the Retry-After value (in seconds) attached to injected 429 errors
+            seed: the seed for the responses, the latencies and the injected errors
+            decision_drop_rate: the probability that the AC leaves out the decision of a paper (Phase 5)
+            model: the model the backend stands in for, used to tag the metrics and for model routing
+            hedging: the hedging settings, as for OpenAIChat
+        """
+        latency = dict(latency) if latency is not None else dict(DEFAULT_LATENCY)
+        super().__init__(
+            latency=latency,
+            error_rate=error_rate,
+            rate_limit_rate=rate_limit_rate,
+            retry_after=retry_after,
+            seed=seed,
+            decision_drop_rate=decision_drop_rate,
+            model=model,
+            hedging=hedging,
+            **kwargs,
+        )
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self.decision_drop_rate = decision_drop_rate
+        self.model = model
+        self.hedging = hedging
+
+        # Latencies and injected errors are random but reproducible across runs with the same seed
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _sample_call(self):
+        with self._rng_lock:
+            delay = sample_latency(self.latency, self._rng)
+            draw = self._rng.random()
+        return delay, draw
+
+    @retry_policy()
+    @traced("backend.attempt")
+    def _get_response(self, system_prompt: str, conversation: str) -> str:
+        record_attempt()
+        delay, draw = self._sample_call()
+        time.sleep(delay)
+
+        if draw < self.rate_limit_rate:
+            raise FakeRateLimitError(retry_after=self.retry_after)
+        if draw < self.rate_limit_rate + self.error_rate:
+            raise FakeBackendError("Internal server error (injected)", status_code=500)
+
+        response = generate_fake_response(system_prompt, conversation, seed=self.seed,
+                                          decision_drop_rate=self.decision_drop_rate)
+
+        # Rough token counts (4 characters per token), as in the mock server
+        record_usage((len(system_prompt) + len(conversation)) // 4, len(response) // 4)
+        return response
+
+    def query(
+            self,
+            agent_name: str,
+            role_desc: str,
+            history_messages: List[Message],
+            global_prompt: str = None,
+            request_msg: Message = None,
+            *args,
+            **kwargs,
+    ) -> str:
+        system_prompt = f"{global_prompt.strip()}\n\n{role_desc}" if global_prompt else role_desc
+
+        lines = [f"[{msg.agent_name}]: {msg.content}" for msg in history_messages]
+        if request_msg:
+            lines.append(f"[{SYSTEM_NAME}]: {request_msg.content}")
+        else:
+            lines.append(f"[{SYSTEM_NAME}]: Now you speak, {agent_name}.")
+
+        return call_hedged(self, self._get_response, system_prompt, "\n\n".join(lines))
+
+    async def async_query(self, *args, **kwargs) -> str:
+        return self.query(*args, **kwargs)
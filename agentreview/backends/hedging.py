@@ -0,0 +1,245 @@
+"""
+Hedged requests, to cut the tail latency of the backend calls.
+
+The wall time of a paper is the sum of the latencies of its sequential calls, and provider latencies have a heavy
+tail. With hedging, a call that has not returned after the `percentile`-th percentile of the recent latencies of its
+backend and model is sent a second time, and the first successful response wins. The other response is discarded
+(the request cannot be cancelled, so its tokens are still spent).
+
+Hedging is opt-in, through the `hedging` entry of the config of a backend that supports it (OpenAIChat and FakeChat),
+e.g. `{"percentile": 95, "budget": 0.05}` (see `Hedger`), or with `--hedge_percentile` on the command line. Each
+hedged request is charged to a budget that grows by `budget` per call, so that at most about `budget` of the calls
+are duplicated even when the provider slows down as a whole.
+
+Once a call is hedged, each of its two requests records its attempts and token usage separately. Only the winner is
+charged to the metrics of the call (see `metrics.track_call`), so a hedge is not counted as a retry. The tokens of the
+discarded request are counted by the `Hedger` instead. `format_hedging_counts` reports the hedged requests (sent, won
+by the duplicate, lost by the duplicate), the wasted requests (one discarded response per hedged call, whichever
+request won) and their tokens. Hedges that are mostly lost mean that the threshold is too low for the latency
+distribution.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, Tuple
+
+from ..metrics import CallRecord, detached_call, merge_detached_call
+from ..metrics import percentile as latency_percentile
+from ..tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERCENTILE = 95.0
+DEFAULT_BUDGET = 0.05
+
+# Threads running the hedged calls. Each hedged call holds two threads at most.
+MAX_HEDGING_WORKERS = 256
+
+
+class Hedger:
+    """The hedging policy and the recent latencies of the calls to one backend and model."""
+
+    def __init__(self, name: str, percentile: float = DEFAULT_PERCENTILE, budget: float = DEFAULT_BUDGET,
+                 min_samples: int = 20, window: int = 500, min_delay_s: float = 0.5, max_burst: float = 5.0):
+        """
+        args:
+            name: the name of the backend and model, for logging and reporting
+            percentile: the percentile of the recent latencies after which a call is hedged
+            budget: the maximum fraction of the calls that are hedged
+            min_samples: calls are not hedged until this many latencies were observed
+            window: the number of recent latencies the threshold is computed from
+            min_delay_s: the lower bound of the threshold, in seconds
+            max_burst: the maximum number of hedges that can be sent in a row once the budget has accumulated
+        """
+        if not 0 < percentile < 100:
+            raise ValueError(f"The hedging percentile must be between 0 and 100, got {percentile}")
+        if not 0 <= budget <= 1:
+            raise ValueError(f"The hedging budget must be between 0 and 1, got {budget}")
+
+        self.name = name
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay_s = min_delay_s
+        self.max_burst = max_burst
+
+        self.num_calls = 0
+        self.num_hedged = 0
+        self.num_won = 0
+        self.num_discarded = 0
+        self.num_skipped = 0
+        self.wasted_prompt_tokens = 0
+        self.wasted_completion_tokens = 0
+
+        self._latencies = deque(maxlen=window)
+        # The budget accumulates from the first call, so that no call is hedged with a budget of 0
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def get_delay(self) -> Optional[float]:
+        """How long to wait before hedging a call, or None if too few latencies were observed."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            return max(self.min_delay_s, latency_percentile(list(self._latencies), self.percentile))
+
+    def observe(self, latency_s: float):
+        with self._lock:
+            self._latencies.append(latency_s)
+
+    def _start_call(self):
+        with self._lock:
+            self.num_calls += 1
+            self._tokens = min(self.max_burst, self._tokens + self.budget)
+
+    def _acquire_hedge(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                self.num_skipped += 1
+                return False
+            self._tokens -= 1
+            self.num_hedged += 1
+            return True
+
+    def _submit(self, func: Callable, args, kwargs) -> Tuple[Future, CallRecord]:
+        """
+        Run `func` on the hedging threads, in the context of the caller (metrics tags and tracing). Its attempts and
+        usage are collected in the returned record instead of the record of the caller.
+        """
+        detached = CallRecord(backend="detached")
+
+        def timed_call():
+            with detached_call(detached):
+                start = time.perf_counter()
+                result = func(*args, **kwargs)
+            # Losing requests are observed as well, so that the threshold follows the latencies of the provider and
+            # not those of the winners
+            self.observe(time.perf_counter() - start)
+            return result
+
+        return _get_executor().submit(contextvars.copy_context().run, timed_call), detached
+
+    def _discard(self):
+        with self._lock:
+            self.num_discarded += 1
+
+    def _waste(self, record: CallRecord):
+        """Count the tokens of a discarded request, once it has completed."""
+        with self._lock:
+            self.wasted_prompt_tokens += record.prompt_tokens
+            self.wasted_completion_tokens += record.completion_tokens
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Call `func(*args, **kwargs)`, hedged if it is slower than the threshold. Returns the first success."""
+        self._start_call()
+        delay = self.get_delay() if self.budget > 0 else None
+
+        if delay is None:
+            # Learning the latencies, or hedging disabled. Call in the current thread.
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            self.observe(time.perf_counter() - start)
+            return result
+
+        primary, primary_record = self._submit(func, args, kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._acquire_hedge():
+            try:
+                return primary.result()
+            finally:
+                merge_detached_call(primary_record)
+
+        with span("backend.hedge", backend=self.name, delay_s=round(delay, 3)):
+            hedge, hedge_record = self._submit(func, args, kwargs)
+            records = {primary: primary_record, hedge: hedge_record}
+            pending = {primary, hedge}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            with self._lock:
+                                self.num_won += 1
+                        # The other request is discarded, possibly once it completes
+                        loser = hedge if future is primary else primary
+                        self._discard()
+                        loser.add_done_callback(lambda _, record=records[loser]: self._waste(record))
+                        merge_detached_call(records[future])
+                        return future.result()
+
+        # Both failed. Raise the error of the original request, as without hedging.
+        self._discard()
+        self._waste(hedge_record)
+        merge_detached_call(primary_record)
+        return primary.result()
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "calls": self.num_calls,
+                "hedged": self.num_hedged,
+                "won": self.num_won,
+                # Duplicates that lost to (or failed with) the original request
+                "lost": self.num_hedged - self.num_won,
+                # Requests whose response (or error) was discarded: one per hedged call, whichever request won
+                "wasted": self.num_discarded,
+                "over_budget": self.num_skipped,
+                # The tokens spent by the discarded requests, not included in the cost of the calls
+                "wasted_prompt_tokens": self.wasted_prompt_tokens,
+                "wasted_completion_tokens": self.wasted_completion_tokens,
+            }
+
+
+_HEDGERS: Dict[str, Hedger] = {}
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _REGISTRY_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=MAX_HEDGING_WORKERS, thread_name_prefix="hedging")
+        return _EXECUTOR
+
+
+def get_hedger(name: str, **settings) -> Hedger:
+    """The hedger of a backend and model, shared by all its callers. `settings` are used when it is created."""
+    with _REGISTRY_LOCK:
+        if name not in _HEDGERS:
+            _HEDGERS[name] = Hedger(name, **settings)
+        return _HEDGERS[name]
+
+
+def call_hedged(backend, func: Callable, *args, **kwargs):
+    """Call `func`, hedged if the backend has `hedging` settings. Backends of the same provider and model share a
+    `Hedger`."""
+    settings = getattr(backend, "hedging", None)
+    if not settings:
+        return func(*args, **kwargs)
+    name = f"{backend.provider_name}:{getattr(backend, 'model', None) or 'default'}"
+    return get_hedger(name, **settings).call(func, *args, **kwargs)
+
+
+def get_hedging_counts() -> Dict[str, Dict[str, int]]:
+    """The counts of hedged requests by backend and model, e.g. {"openai-chat:openai:gpt-4o": {"hedged": 3, ...}}."""
+    with _REGISTRY_LOCK:
+        hedgers = list(_HEDGERS.values())
+    return {hedger.name: hedger.counts() for hedger in hedgers}
+
+
+def format_hedging_counts() -> str:
+    counts = get_hedging_counts()
+    if not counts:
+        return "Hedged requests: hedging disabled"
+    lines = ["Hedged requests:"]
+    for name, hedger_counts in counts.items():
+        threshold = _HEDGERS[name].get_delay()
+        threshold = f"{threshold:.2f}s" if threshold is not None else "learning"
+        lines.append(f"  {name}: " + ", ".join(f"{key}={value}" for key, value in hedger_counts.items())
+                     + f" (threshold {threshold})")
+    return "\n".join(lines)
@@ -1,12 +1,24 @@
+import importlib.util
+import logging
 import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from contextlib import contextmanager, redirect_stderr, redirect_stdout
-from typing import List
-
-from tenacity import retry, stop_after_attempt, wait_random_exponential
+from typing import TYPE_CHECKING, Dict, List, Tuple
 
 from ..message import SYSTEM_NAME as SYSTEM
 from ..message import Message
+from ..metrics import record_attempt
+from ..tracing import span, traced
 from .base import IntelligenceBackend
+from .resilience import retry_policy
+
+if TYPE_CHECKING:
+    from transformers import Conversation, ConversationalPipeline
+
+logger = logging.getLogger(__name__)
 
 
 @contextmanager
@@ -17,19 +29,147 @@ def suppress_stdout_stderr():
             yield (err, out)
 
 
-with suppress_stdout_stderr():
-    # Try to import the transformers package
-    try:
-        import transformers
+# Importing transformers (and torch) takes seconds, so it is only imported when a model is loaded
+is_transformers_available = importlib.util.find_spec("transformers") is not None
+
+
+def _import_transformers():
+    """Import and return the `pipeline` function and the `Conversation` class of transformers."""
+    with suppress_stdout_stderr():
         from transformers import pipeline
-        from transformers.pipelines.conversational import (
-            Conversation,
-            ConversationalPipeline,
-        )
-    except ImportError:
-        is_transformers_available = False
-    else:
-        is_transformers_available = True
+        from transformers.pipelines.conversational import Conversation
+    return pipeline, Conversation
+
+
+# Process-wide pipelines and batch schedulers, keyed by (model, device). Sharing them lets every player in every
+# arena of the process feed the same batch instead of loading its own copy of the model. A pipeline runs one
+# generation at a time: the batches of its scheduler and the unbatched calls all hold its lock.
+_PIPELINES: Dict[Tuple[str, int], "ConversationalPipeline"] = {}
+_PIPELINE_LOCKS: Dict[Tuple[str, int], threading.Lock] = {}
+_SCHEDULERS: Dict[Tuple[str, int], "BatchScheduler"] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_pipeline(model: str, device: int = -1):
+    """Return the conversational pipeline for (model, device), loading it on first use."""
+    key = (model, device)
+    with _REGISTRY_LOCK:
+        if key not in _PIPELINES:
+            pipeline, _ = _import_transformers()
+            chatbot = pipeline(task="conversational", model=model, device=device)
+
+            # Batched generation pads every prompt in the batch to the same length. Decoder-only models usually
+            # have no pad token and must be padded on the left so that generation continues from real tokens.
+            tokenizer = chatbot.tokenizer
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+            if not chatbot.model.config.is_encoder_decoder:
+                tokenizer.padding_side = "left"
+
+            _PIPELINES[key] = chatbot
+            _PIPELINE_LOCKS[key] = threading.Lock()
+        return _PIPELINES[key]
+
+
+def get_pipeline_lock(model: str, device: int = -1) -> threading.Lock:
+    """The lock held while the pipeline of (model, device) generates. The pipeline must have been loaded."""
+    with _REGISTRY_LOCK:
+        return _PIPELINE_LOCKS[(model, device)]
+
+
+def get_batch_scheduler(model: str, device: int = -1, max_batch_size: int = 8, max_wait_ms: float = 10.0):
+    """
+    Return the process-wide batch scheduler for (model, device), starting it on first use. The settings of the first
+    caller are kept; later callers with different settings share the existing scheduler and get a warning.
+    """
+    chatbot = get_pipeline(model, device)
+    lock = get_pipeline_lock(model, device)
+    key = (model, device)
+    with _REGISTRY_LOCK:
+        if key not in _SCHEDULERS:
+            _SCHEDULERS[key] = BatchScheduler(chatbot, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                                              lock=lock)
+        scheduler = _SCHEDULERS[key]
+
+    if scheduler.max_batch_size != max_batch_size or scheduler.max_wait != max_wait_ms / 1000.0:
+        logger.warning(f"The batch scheduler of {model} (device {device}) already runs with max_batch_size="
+                       f"{scheduler.max_batch_size} and max_wait_ms={scheduler.max_wait * 1000:g}. Ignoring "
+                       f"max_batch_size={max_batch_size} and max_wait_ms={max_wait_ms:g}.")
+    return scheduler
+
+
+class BatchScheduler:
+    """
+    Micro-batching scheduler in front of a ConversationalPipeline.
+
+    Callers from any thread submit a Conversation and block on the returned future. A background worker collects
+    the requests that arrive within `max_wait_ms` of the first one (up to `max_batch_size`), runs them through the
+    pipeline as one padded batch and routes each generated response back to its caller.
+    """
+
+    def __init__(self, chatbot, max_batch_size: int = 8, max_wait_ms: float = 10.0, lock: threading.Lock = None):
+        assert max_batch_size >= 1, "max_batch_size must be a positive integer"
+        self.chatbot = chatbot
+        # Held while generating, shared with the unbatched callers of the pipeline
+        self.lock = lock if lock is not None else threading.Lock()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._requests: "queue.Queue[Tuple[Conversation, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="hf-batch-scheduler", daemon=True)
+        self._worker.start()
+
+        # Statistics about the batches run so far
+        self.num_batches = 0
+        self.num_requests = 0
+
+    def submit(self, conversation) -> Future:
+        """Queue a conversation for generation. The future resolves to the generated response."""
+        future = Future()
+        self._requests.put((conversation, future))
+        return future
+
+    def generate(self, conversation) -> str:
+        """Queue a conversation and wait for its response."""
+        return self.submit(conversation).result()
+
+    def _collect_batch(self) -> List[Tuple["Conversation", Future]]:
+        batch = [self._requests.get()]  # Block until there is at least one request
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            conversations = [conversation for conversation, _ in batch]
+
+            try:
+                with self.lock, span("hf.batch_generate", batch_size=len(conversations)):
+                    outputs = self.chatbot(conversations, batch_size=len(conversations))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            # The pipeline unwraps single-element inputs
+            if not isinstance(outputs, list):
+                outputs = [outputs]
+
+            for (_, future), conversation in zip(batch, outputs):
+                future.set_result(conversation.generated_responses[-1])
+
+            self.num_batches += 1
+            self.num_requests += len(batch)
 
 
 class TransformersConversational(IntelligenceBackend):
@@ -38,19 +178,44 @@ class TransformersConversational(IntelligenceBackend):
     stateful = False
     type_name = "transformers:conversational"
 
-    def __init__(self, model: str, device: int = -1, **kwargs):
-        super().__init__(model=model, device=device, **kwargs)
+    def __init__(self, model: str, device: int = -1, batch_size: int = 1, max_batch_wait_ms: float = 10.0,
+                 **kwargs):
+        """
+        Instantiate the Transformers backend.
+
+        args:
+            model: the name or path of the model
+            device: the device to run the model on (-1 for CPU)
+            batch_size: the maximum number of concurrent requests generated together. 1 disables batching.
+            max_batch_wait_ms: how long the scheduler waits for more requests before running a partial batch
+        """
+        super().__init__(model=model, device=device, batch_size=batch_size, max_batch_wait_ms=max_batch_wait_ms,
+                         **kwargs)
         self.model = model
         self.device = device
+        self.batch_size = batch_size
+        self.max_batch_wait_ms = max_batch_wait_ms
 
         assert is_transformers_available, "Transformers package is not installed"
-        self.chatbot = pipeline(
-            task="conversational", model=self.model, device=self.device
-        )
+        self.chatbot = get_pipeline(self.model, self.device)
+        self.chatbot_lock = get_pipeline_lock(self.model, self.device)
 
-    @retry(stop=stop_after_attempt(6), wait=wait_random_exponential(min=1, max=60))
+        if self.batch_size > 1:
+            self.scheduler = get_batch_scheduler(self.model, self.device, max_batch_size=self.batch_size,
+                                                 max_wait_ms=self.max_batch_wait_ms)
+        else:
+            self.scheduler = None
+
+    @retry_policy()
+    @traced("backend.attempt")
     def _get_response(self, conversation):
-        conversation = self.chatbot(conversation)
+        record_attempt()
+        if self.scheduler is not None:
+            return self.scheduler.generate(conversation)
+
+        # The pipeline is shared by the players of all the arenas, and generates one request at a time
+        with self.chatbot_lock:
+            conversation = self.chatbot(conversation)
         response = conversation.generated_responses[-1]
         return response
 
@@ -105,6 +270,7 @@ class TransformersConversational(IntelligenceBackend):
         new_user_input = user_inputs[-1]
 
         # Recreate a conversation object from the history messages
+        _, Conversation = _import_transformers()
         conversation = Conversation(
             text=new_user_input,
             past_user_inputs=past_user_inputs,
@@ -2,10 +2,9 @@ import os
 import re
 from typing import List
 
-from tenacity import retry, stop_after_attempt, wait_random_exponential
-
 from ..message import SYSTEM_NAME, Message
 from .base import IntelligenceBackend
+from .resilience import retry_policy
 
 try:
     from langchain.llms import OpenAI
@@ -75,7 +74,7 @@ class LangChainOpenAIChat(IntelligenceBackend):
             openai_api_key=api_key,
         )
 
-    @retry(stop=stop_after_attempt(6), wait=wait_random_exponential(min=1, max=60))
+    @retry_policy()
     def _get_response(self, messages):
         response = self.llm(prompt=messages, stop=STOP)
         return response
@@ -0,0 +1,200 @@
+"""
+A local OpenAI-compatible HTTP server for load testing.
+
+It answers `POST /v1/chat/completions` (and the Azure-style `/openai/deployments/<deployment>/chat/completions`) with
+the same deterministic responses as the `FakeChat` backend, with configurable latency and injected 429/500 errors.
+Point the OpenAI client at it to exercise the real `OpenAIChat` backend, including its HTTP client and retries,
+without paying for an API:
+
+    python -m agentreview.backends.mock_server --port 8000 --latency_mean 0.5 --rate_limit_rate 0.05
+
+    export OPENAI_BASE_URL=http://127.0.0.1:8000/v1
+    export OPENAI_API_KEY=sk-mock
+    python run_paper_review_cli.py --openai_client_type openai ...
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+from .fake import LATENCY_DISTRIBUTIONS, generate_fake_response, sample_latency
+
+logger = logging.getLogger(__name__)
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """A threaded HTTP server that mimics the OpenAI chat completions endpoint."""
+
+    daemon_threads = True
+
+    def __init__(
+            self,
+            server_address: Tuple[str, int],
+            latency: dict = None,
+            error_rate: float = 0.0,
+            rate_limit_rate: float = 0.0,
+            retry_after: float = 1.0,
+            seed: int = 0,
+    ):
+        super().__init__(server_address, MockOpenAIRequestHandler)
+        self.latency = latency or {"distribution": "fixed", "mean": 0.0}
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.seed = seed
+
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+        # Counters by response status, useful to check the number of retries seen by the server
+        self.num_requests = 0
+        self.status_counts = {}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def sample_call(self):
+        with self._rng_lock:
+            self.num_requests += 1
+            return sample_latency(self.latency, self._rng), self._rng.random()
+
+    def count_status(self, status: int):
+        with self._rng_lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+
+class MockOpenAIRequestHandler(BaseHTTPRequestHandler):
+    server: MockOpenAIServer
+
+    # Keep the connections alive between requests, as the API does, so that clients can reuse their pooled connections.
+    # Every response sets its Content-Length.
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        self.server.count_status(status)
+
+    def _send_error(self, status: int, message: str, error_type: str, headers: dict = None):
+        self._send_json(status, {"error": {"message": message, "type": error_type, "param": None, "code": None}},
+                        headers=headers)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]})
+        else:
+            self._send_error(404, f"Unknown path: {self.path}", "invalid_request_error")
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        if not path.endswith("/chat/completions"):
+            self._send_error(404, f"Unknown path: {self.path}", "invalid_request_error")
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+            messages = request["messages"]
+        except (ValueError, KeyError):
+            self._send_error(400, "The request body must be JSON with a `messages` field.", "invalid_request_error")
+            return
+
+        delay, draw = self.server.sample_call()
+        time.sleep(delay)
+
+        if draw < self.server.rate_limit_rate:
+            self._send_error(429, "Rate limit reached (injected).", "rate_limit_error",
+                             headers={"Retry-After": str(self.server.retry_after)})
+            return
+        if draw < self.server.rate_limit_rate + self.server.error_rate:
+            self._send_error(500, "The server had an error while processing your request (injected).", "server_error")
+            return
+
+        system_prompt = "\n\n".join(msg["content"] for msg in messages if msg.get("role") == "system")
+        conversation = "\n\n".join(msg["content"] for msg in messages if msg.get("role") != "system")
+        content = generate_fake_response(system_prompt, conversation, seed=self.server.seed)
+
+        # Rough token counts (4 characters per token) so that clients can exercise their usage accounting
+        prompt_tokens = sum(len(msg["content"]) for msg in messages) // 4
+        completion_tokens = len(content) // 4
+
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, **kwargs) -> MockOpenAIServer:
+    """
+    Start a mock server in a background thread and return it. Use port 0 to pick a free port.
+
+    Call `server.shutdown()` to stop it.
+    """
+    server = MockOpenAIServer((host, port), **kwargs)
+    thread = threading.Thread(target=server.serve_forever, name="mock-openai-server", daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible server for load testing AgentReview")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency_distribution", type=str, default="fixed", choices=LATENCY_DISTRIBUTIONS)
+    parser.add_argument("--latency_mean", type=float, default=0.0, help="Mean latency of each request in seconds.")
+    parser.add_argument("--latency_std", type=float, default=0.0,
+                        help="Standard deviation of the latency (normal and lognormal distributions).")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Probability of an injected 500 error.")
+    parser.add_argument("--rate_limit_rate", type=float, default=0.0, help="Probability of an injected 429 error.")
+    parser.add_argument("--retry_after", type=float, default=1.0, help="Retry-After header sent with 429 errors.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        (args.host, args.port),
+        latency={"distribution": args.latency_distribution, "mean": args.latency_mean, "std": args.latency_std},
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    print(f"Mock OpenAI server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
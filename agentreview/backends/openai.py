@@ -1,12 +1,13 @@
 import re
 from typing import List
 
-from tenacity import retry, stop_after_attempt, wait_random_exponential
-
-from agentreview.arguments import parse_args
 from agentreview.utility.authentication_utils import get_openai_client
 from .base import IntelligenceBackend
+from .hedging import call_hedged
+from .resilience import retry_policy
 from ..message import SYSTEM_NAME, Message
+from ..metrics import record_attempt, record_usage
+from ..tracing import traced
 
 # Default config follows the OpenAI playground
 DEFAULT_TEMPERATURE = 1.0
@@ -33,6 +34,8 @@ class OpenAIChat(IntelligenceBackend):
             max_tokens: int = DEFAULT_MAX_TOKENS,
             model: str = DEFAULT_MODEL,
             merge_other_agents_as_one_user: bool = True,
+            response_format: dict = None,
+            hedging: dict = None,
             **kwargs,
     ):
         """
@@ -43,12 +46,18 @@ class OpenAIChat(IntelligenceBackend):
             max_tokens: the maximum number of tokens to sample
             model: the model to use
             merge_other_agents_as_one_user: whether to merge messages from other agents as one user message
+            response_format: the `response_format` of the API, e.g. a JSON schema for structured outputs. Not sent
+                if None.
+            hedging: if set, slow calls are sent again and the first response wins, see `Hedger` for the settings
+                (e.g. `{"percentile": 95, "budget": 0.05}`). Not hedged if None.
         """
         super().__init__(
             temperature=temperature,
             max_tokens=max_tokens,
             model=model,
             merge_other_agents_as_one_user=merge_other_agents_as_one_user,
+            response_format=response_format,
+            hedging=hedging,
             **kwargs,
         )
         self.client_type = kwargs.get("openai_client_type", None)
@@ -57,13 +66,25 @@ class OpenAIChat(IntelligenceBackend):
         self.max_tokens = max_tokens
         self.model = model
         self.merge_other_agent_as_user = merge_other_agents_as_one_user
+        self.response_format = response_format
+        self.hedging = hedging
+
 
 
+    @property
+    def provider_name(self) -> str:
+        return f"{self.type_name}:{self.client_type}"
 
-    @retry(stop=stop_after_attempt(6), wait=wait_random_exponential(min=1, max=60))
+    @retry_policy()
+    @traced("backend.attempt")
     def _get_response(self, messages):
         # Refer to https://learn.microsoft.com/en-us/azure/ai-services/openai/how-to/switching-endpoints for how to
         # make API calls
+        record_attempt()
+
+        extra_params = {}
+        if self.response_format is not None:
+            extra_params["response_format"] = self.response_format
 
         if self.client_type == "openai":
             completion = self.client.chat.completions.create(
@@ -72,6 +93,7 @@ class OpenAIChat(IntelligenceBackend):
                 temperature=self.temperature,
                 max_tokens=self.max_tokens,
                 stop=STOP,
+                **extra_params,
             )
 
         elif self.client_type == "azure_openai":
@@ -81,11 +103,16 @@ class OpenAIChat(IntelligenceBackend):
                 temperature=self.temperature,
                 max_tokens=self.max_tokens,
                 stop=STOP,
+                **extra_params,
             )
 
         else:
             raise NotImplementedError
 
+        usage = getattr(completion, "usage", None)
+        if usage is not None:
+            record_usage(usage.prompt_tokens, usage.completion_tokens)
+
         response = completion.choices[0].message.content
 
         response = response.strip()
@@ -164,7 +191,7 @@ class OpenAIChat(IntelligenceBackend):
                     else:
                         raise ValueError(f"Invalid role: {messages[-1]['role']}")
 
-        response = self._get_response(messages, *args, **kwargs)
+        response = call_hedged(self, self._get_response, messages, *args, **kwargs)
 
         # Remove the agent name if the response starts with it
         response = re.sub(rf"^\s*\[.*]:", "", response).strip()  # noqa: F541
@@ -0,0 +1,365 @@
+"""
+Retry policy and circuit breaker shared by the backends.
+
+`retry_policy` replaces the bare `@retry(stop=stop_after_attempt(6), wait=wait_random_exponential(min=1, max=60))`
+of the backends:
+
+* Errors are classified as rate limits, server errors, timeouts, connection errors, content-policy refusals or other
+  client errors. Only the transient ones are retried; the others fail fast.
+* Retry-After headers (and the `retry_after` of the fake backend's errors) are honoured instead of the random
+  exponential wait.
+* All the backends calling the same provider share a `CircuitBreaker`. After `failure_threshold` consecutive transient
+  failures, the circuit opens and every caller waits (i.e. queued arenas pause) until the provider has recovered,
+  which is probed by a single request at a time.
+* Errors are counted per provider and error class, see `get_error_counts`.
+
+Like before, a failed call raises `tenacity.RetryError`, which `Player.act` turns into the end of the conversation.
+"""
+
+import email.utils
+import functools
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from tenacity import RetryCallState, retry, stop_after_attempt, stop_after_delay, wait_random_exponential
+from tenacity.stop import stop_base
+from tenacity.wait import wait_base
+
+from ..tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_MIN_WAIT = 1
+DEFAULT_MAX_WAIT = 60
+
+# Upper bound of the total time spent on one call, waits included
+DEFAULT_MAX_DELAY = 900
+
+# Upper bound of the wait requested by a Retry-After header
+MAX_RETRY_AFTER = 300
+
+ERROR_CLASSES = ["rate_limit", "server", "timeout", "connection", "content_policy", "client", "circuit_open",
+                 "unknown"]
+
+# Transient errors, which are retried
+RETRYABLE_ERROR_CLASSES = {"rate_limit", "server", "timeout", "connection", "unknown"}
+# Failures of the provider, which count towards opening the circuit. Unknown errors may not come from the provider, so
+# they leave the circuit as it is.
+PROVIDER_FAILURE_CLASSES = {"rate_limit", "server", "timeout", "connection"}
+
+CONTENT_POLICY_MARKERS = ["content_filter", "content_policy", "content management policy"]
+
+
+class CircuitOpenError(Exception):
+    """Raised when a provider's circuit stays open for longer than the maximum wait of the caller."""
+
+    def __init__(self, provider: str):
+        super().__init__(f"The circuit of provider '{provider}' is open: too many consecutive failures.")
+        self.provider = provider
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def classify_error(error: BaseException) -> str:
+    """Return the class of an error raised by a backend, one of ERROR_CLASSES."""
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+
+    # Match the exceptions of the provider SDKs by name, so that none of them has to be imported
+    name = type(error).__name__.lower()
+    status_code = _status_code(error)
+    code = str(getattr(error, "code", "") or "").lower()
+    message = str(error).lower()
+
+    if status_code == 429 or "ratelimit" in name:
+        return "rate_limit"
+    if "timeout" in name or isinstance(error, TimeoutError) or status_code == 408:
+        return "timeout"
+    if "connection" in name or isinstance(error, ConnectionError):
+        return "connection"
+    if any(marker in code or marker in message for marker in CONTENT_POLICY_MARKERS):
+        return "content_policy"
+    if status_code is not None and status_code >= 500:
+        return "server"
+    if status_code is not None and 400 <= status_code < 500:
+        # 409 (conflict) is transient for the OpenAI API
+        return "server" if status_code == 409 else "client"
+    return "unknown"
+
+
+def is_retryable(error: BaseException) -> bool:
+    return classify_error(error) in RETRYABLE_ERROR_CLASSES
+
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """The wait (in seconds) requested by the provider, from the Retry-After headers of the response if any."""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return float(retry_after)
+
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        # An HTTP date
+        date = email.utils.parsedate_to_datetime(value)
+        return max(0.0, date.timestamp() - time.time()) if date is not None else None
+
+
+class ErrorCounters:
+    """Thread-safe counts of the errors by provider and error class."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[Tuple[str, str], int] = {}
+
+    def increment(self, provider: str, error_class: str):
+        with self._lock:
+            self._counts[(provider, error_class)] = self._counts.get((provider, error_class), 0) + 1
+
+    def get(self) -> Dict[str, Dict[str, int]]:
+        counts = {}
+        with self._lock:
+            for (provider, error_class), count in self._counts.items():
+                counts.setdefault(provider, {})[error_class] = count
+        return counts
+
+    def reset(self):
+        with self._lock:
+            self._counts = {}
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker shared by the callers of a provider.
+
+    * closed: calls go through. `failure_threshold` consecutive transient failures open the circuit.
+    * open: callers wait for `recovery_timeout` seconds (or longer, if the provider asked for it with Retry-After).
+    * half-open: a single call probes the provider while the other callers keep waiting. The circuit closes if the
+      probe succeeds, and opens again with a doubled recovery timeout (up to `max_recovery_timeout`) if it fails.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, provider: str, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 max_recovery_timeout: float = 300.0, max_wait: float = 1800.0):
+        """
+        args:
+            provider: the name of the provider, for logging
+            failure_threshold: the number of consecutive transient failures that opens the circuit
+            recovery_timeout: how long the circuit stays open before a probe is allowed
+            max_recovery_timeout: the upper bound of the recovery timeout after failed probes
+            max_wait: how long a caller waits for the circuit to close before giving up with CircuitOpenError
+        """
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.max_recovery_timeout = max_recovery_timeout
+        self.max_wait = max_wait
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.num_opened = 0
+        self._current_timeout = recovery_timeout
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Wait until a call is allowed. Raises CircuitOpenError after `max_wait` seconds."""
+        with self._cond:
+            if self.state == self.CLOSED:
+                return
+
+            deadline = time.monotonic() + self.max_wait
+            with span("circuit_breaker.wait", provider=self.provider):
+                while True:
+                    now = time.monotonic()
+                    if self.state == self.CLOSED:
+                        return
+                    if self.state == self.OPEN and now >= self._open_until:
+                        logger.info(f"Circuit of {self.provider} is half-open, probing the provider")
+                        self.state = self.HALF_OPEN
+                    if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                        self._probe_in_flight = True
+                        return
+                    if now >= deadline:
+                        raise CircuitOpenError(self.provider)
+
+                    timeout = self._open_until - now if self.state == self.OPEN else deadline - now
+                    self._cond.wait(max(0.01, min(timeout, deadline - now)))
+
+    def record_success(self):
+        with self._cond:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit of {self.provider} is closed again")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._current_timeout = self.recovery_timeout
+            self._probe_in_flight = False
+            self._cond.notify_all()
+
+    def record_failure(self, retry_after: Optional[float] = None):
+        with self._cond:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN:
+                self._current_timeout = min(2 * self._current_timeout, self.max_recovery_timeout)
+                self._open(retry_after)
+            elif self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._open(retry_after)
+            self._probe_in_flight = False
+            self._cond.notify_all()
+
+    def release(self):
+        """End a call that tells nothing about the provider. The probe of a half-open circuit is left to another call."""
+        with self._cond:
+            if self.state == self.HALF_OPEN and self._probe_in_flight:
+                self._probe_in_flight = False
+                self._cond.notify_all()
+
+    def _open(self, retry_after: Optional[float]):
+        timeout = max(self._current_timeout, min(retry_after or 0.0, MAX_RETRY_AFTER))
+        logger.warning(f"Circuit of {self.provider} is open after {self.consecutive_failures} consecutive failures. "
+                       f"Pausing the calls for {timeout:.1f}s.")
+        self.state = self.OPEN
+        self.num_opened += 1
+        self._open_until = time.monotonic() + timeout
+
+
+_ERROR_COUNTERS = ErrorCounters()
+_CIRCUIT_BREAKERS: Dict[str, CircuitBreaker] = {}
+_CIRCUIT_BREAKER_SETTINGS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def configure_circuit_breakers(**kwargs):
+    """Set the parameters of the circuit breakers created from now on, see `CircuitBreaker`."""
+    with _REGISTRY_LOCK:
+        _CIRCUIT_BREAKER_SETTINGS.update(kwargs)
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    with _REGISTRY_LOCK:
+        if provider not in _CIRCUIT_BREAKERS:
+            _CIRCUIT_BREAKERS[provider] = CircuitBreaker(provider, **_CIRCUIT_BREAKER_SETTINGS)
+        return _CIRCUIT_BREAKERS[provider]
+
+
+def get_error_counts() -> Dict[str, Dict[str, int]]:
+    """The number of errors by provider and error class, e.g. {"openai-chat:openai": {"rate_limit": 3}}."""
+    return _ERROR_COUNTERS.get()
+
+
+def format_error_counts() -> str:
+    counts = get_error_counts()
+    if not counts:
+        return "Backend errors: none"
+    lines = ["Backend errors:"]
+    for provider, provider_counts in counts.items():
+        breaker = _CIRCUIT_BREAKERS.get(provider)
+        opened = f" (circuit opened {breaker.num_opened} times)" if breaker is not None and breaker.num_opened else ""
+        lines.append(f"  {provider}: " + ", ".join(f"{error_class}={count}"
+                                                   for error_class, count in sorted(provider_counts.items())) + opened)
+    return "\n".join(lines)
+
+
+class wait_retry_after(wait_base):
+    """Wait for the time requested by the provider if any, and fall back to `fallback` otherwise."""
+
+    def __init__(self, fallback: wait_base, max_retry_after: float = MAX_RETRY_AFTER):
+        self.fallback = fallback
+        self.max_retry_after = max_retry_after
+
+    def __call__(self, retry_state: RetryCallState) -> float:
+        if retry_state.outcome is not None and retry_state.outcome.failed:
+            retry_after = get_retry_after(retry_state.outcome.exception())
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after)
+        return self.fallback(retry_state)
+
+
+class stop_if_not_retryable(stop_base):
+    """Stop at once on errors that will not go away by retrying, e.g. content-policy refusals."""
+
+    def __call__(self, retry_state: RetryCallState) -> bool:
+        if retry_state.outcome is None or not retry_state.outcome.failed:
+            return False
+        return not is_retryable(retry_state.outcome.exception())
+
+
+def _log_before_sleep(retry_state: RetryCallState):
+    error = retry_state.outcome.exception()
+    logger.warning(f"Attempt {retry_state.attempt_number} failed with a {classify_error(error)} error "
+                   f"({type(error).__name__}: {error}). Retrying in {retry_state.next_action.sleep:.1f}s.")
+
+
+def retry_policy(max_attempts: int = DEFAULT_MAX_ATTEMPTS, min_wait: float = DEFAULT_MIN_WAIT,
+                 max_wait: float = DEFAULT_MAX_WAIT, max_delay: float = DEFAULT_MAX_DELAY) -> Callable:
+    """
+    Decorator for the `_get_response` method of a backend. The circuit breaker is picked by the
+    `provider_name` of the backend.
+
+    args:
+        max_attempts: the maximum number of attempts
+        min_wait: the minimum random exponential wait between attempts, in seconds
+        max_wait: the maximum random exponential wait between attempts, in seconds
+        max_delay: the maximum total time of the call, waits included, in seconds
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def attempt(self, *args, **kwargs):
+            provider = self.provider_name
+            breaker = get_circuit_breaker(provider)
+            try:
+                breaker.acquire()
+            except CircuitOpenError:
+                _ERROR_COUNTERS.increment(provider, "circuit_open")
+                raise
+
+            try:
+                result = func(self, *args, **kwargs)
+            except Exception as e:
+                error_class = classify_error(e)
+                _ERROR_COUNTERS.increment(provider, error_class)
+                if error_class in PROVIDER_FAILURE_CLASSES:
+                    breaker.record_failure(get_retry_after(e))
+                elif error_class == "unknown":
+                    # Neither a failure nor a success of the provider
+                    breaker.release()
+                else:
+                    # The provider did answer, the request itself is at fault
+                    breaker.record_success()
+                raise
+
+            breaker.record_success()
+            return result
+
+        return retry(
+            stop=stop_after_attempt(max_attempts) | stop_after_delay(max_delay) | stop_if_not_retryable(),
+            wait=wait_retry_after(wait_random_exponential(min=min_wait, max=max_wait)),
+            before_sleep=_log_before_sleep,
+        )(attempt)
+
+    return decorator
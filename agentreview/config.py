@@ -1,8 +1,45 @@
+import ast
 import copy
+import functools
 import json
 
 from .utils import AttributedDict
 
+# The only field that may hold a dict serialized as a string, e.g. when a config is edited in the UI
+METADATA_FIELD = "metadata"
+
+
+@functools.lru_cache(maxsize=1024)
+def _literal_eval_metadata(value: str):
+    try:
+        metadata = ast.literal_eval(value)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+    return metadata if isinstance(metadata, dict) else None
+
+
+def parse_metadata(value):
+    """
+    Parse the metadata field if it is a dict serialized as a string. Only Python literals are accepted, so nothing
+    is executed. Returns the value unchanged if it is not such a string.
+    """
+    if not isinstance(value, str) or not value.lstrip().startswith("{"):
+        return value
+    metadata = _literal_eval_metadata(value)
+    # The cached dict is shared, so each config gets its own copy
+    return copy.deepcopy(metadata) if metadata is not None else value
+
+
+def _clone(value):
+    # Copy a config that has already been converted and validated, without converting and validating it again
+    if isinstance(value, Config):
+        clone = dict.__new__(type(value))
+        dict.update(clone, {key: _clone(item) for key, item in value.items()})
+        return clone
+    if isinstance(value, list):
+        return [_clone(item) for item in value]
+    return value
+
 
 class Config(AttributedDict):
     """
@@ -11,23 +48,24 @@ class Config(AttributedDict):
     The class has a few useful methods to load and save the config.
     """
 
+    __slots__ = ()
+
     # convert dict to Config recursively
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         for key, value in self.items():
 
-            # Try to convert the value (the "metadata" field) to dict if applicable
-            try:
-                value = dict(eval(value))
-            except Exception:
-                pass
+            if key == METADATA_FIELD:
+                value = parse_metadata(value)
 
-            if isinstance(value, dict):
+            if isinstance(value, Config):
+                self[key] = _clone(value)
+            elif isinstance(value, dict):
                 self[key] = init_config(value)  # convert dict to Config recursively
             # convert list of dict to list of Config recursively
             elif isinstance(value, list) and len(value) > 0:
                 self[key] = [
-                    init_config(item) if isinstance(item, dict) else item
+                    _clone(item) if isinstance(item, Config) else init_config(item) if isinstance(item, dict) else item
                     for item in value
                 ]
 
@@ -71,6 +109,8 @@ class Configurable:
 class EnvironmentConfig(Config):
     """EnvironmentConfig contains a env_type field to indicate the name of the environment."""
 
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # check if the env_type field is specified
@@ -81,6 +121,8 @@ class EnvironmentConfig(Config):
 class BackendConfig(Config):
     """BackendConfig contains a backend_type field to indicate the name of the backend."""
 
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # check if the backend_type field is specified
@@ -91,6 +133,8 @@ class BackendConfig(Config):
 class AgentConfig(Config):
     """AgentConfig contains role_desc and backend fields."""
 
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # check if the role_desc field is specified
@@ -107,6 +151,8 @@ class AgentConfig(Config):
 class ArenaConfig(Config):
     """ArenaConfig contains a list of AgentConfig."""
 
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # check if the players field is specified and it is List[AgentConfig]
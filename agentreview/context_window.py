@@ -0,0 +1,246 @@
+"""
+Fitting the observation of a player into the context window of its model.
+
+In Phases 3 and 4, the reviewers and the AC see the whole history: the paper, the reviews, the rebuttals and the
+discussion. `ContextWindowManager.fit` is called by `Player.act` between `get_observation` and `backend.query`. When
+the prompt would not fit in the context window (minus the tokens reserved for the response), it compacts the messages
+of lowest priority first, keeping the beginning and the end of each one, and drops them only if compacting is not
+enough. The older turns of the discussion go first, while the paper, which the reviews and decisions are grounded on,
+is compacted last. The most recent message is always kept, and is compacted last.
+
+Compacted messages are cached by sender, content and size, so that players seeing the same message (e.g. the paper
+contents), in the same arena or in others, share the work.
+
+    manager = ContextWindowManager.for_backend(backend)
+    observation, report = manager.fit(observation, role_desc, global_prompt, agent_name)
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .message import SYSTEM_NAME, Message
+from .prompt_templates import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Context windows (in tokens) of the models, matched by prefix of the model name
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-35-turbo-16k": 16385,
+    "gpt-35-turbo": 16385,
+    "gpt-3.5-turbo": 16385,
+    "claude": 200000,
+}
+
+# Tokens added by the chat format to each message, and kept free to absorb errors in the token counts
+TOKENS_PER_MESSAGE = 4
+SAFETY_MARGIN = 0.05
+
+# Messages are not compacted below this size
+MIN_COMPACTED_TOKENS = 256
+
+# Priorities of the messages by sender (lower priorities are compacted first). Messages from the player itself get
+# `OWN_MESSAGE_PRIORITY`, and messages from other senders get `DEFAULT_PRIORITY`. The paper is kept verbatim the
+# longest.
+DEFAULT_PRIORITY = 2
+OWN_MESSAGE_PRIORITY = 3
+PAPER_PRIORITY = 4
+SENDER_PRIORITIES = {
+    SYSTEM_NAME: 1,
+    "Paper Extractor": PAPER_PRIORITY,
+}
+
+
+def get_context_window(model: Optional[str]) -> Optional[int]:
+    """The context window of a model, or None if it is unknown."""
+    if model:
+        for prefix in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+            if model.startswith(prefix):
+                return MODEL_CONTEXT_WINDOWS[prefix]
+    return None
+
+
+def compact_message_content(content: str, max_tokens: int) -> str:
+    """Default compaction: keep the first two thirds and the last third of the budget of tokens."""
+    head_tokens = (max_tokens * 2) // 3
+    return truncate_to_tokens(content, head_tokens, max_tokens - head_tokens)
+
+
+@dataclass
+class ContextReport:
+    """What `ContextWindowManager.fit` did to an observation."""
+
+    budget: int
+    original_tokens: int
+    final_tokens: int
+    # (agent_name, turn, tokens before, tokens after)
+    compacted: List[Tuple[str, int, int, int]] = field(default_factory=list)
+    # (agent_name, turn, tokens)
+    dropped: List[Tuple[str, int, int]] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.compacted or self.dropped)
+
+    def format(self) -> str:
+        parts = [f"{self.original_tokens} -> {self.final_tokens} tokens (budget {self.budget})"]
+        if self.compacted:
+            parts.append("compacted " + ", ".join(f"{name}@{turn} ({before}->{after})"
+                                                  for name, turn, before, after in self.compacted))
+        if self.dropped:
+            parts.append("dropped " + ", ".join(f"{name}@{turn} ({tokens})" for name, turn, tokens in self.dropped))
+        return "; ".join(parts)
+
+
+class _CompactionCache:
+    """A thread-safe LRU cache of token counts and compacted contents, keyed by `content_key`."""
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute: Callable):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = value
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by all the players of the process
+_CACHE = _CompactionCache()
+
+
+def content_key(message: Message) -> Tuple[str, int, int]:
+    """
+    The cache key of a message: its sender and content. Unlike `msg_hash`, it leaves out the timestamp, so that the
+    same message in different arenas (e.g. the paper in each experiment) shares the cache. The hash of a string is
+    computed once by Python and stored with it.
+    """
+    return message.agent_name, hash(message.content), len(message.content)
+
+
+def message_tokens(message: Message) -> int:
+    return _CACHE.get_or_compute(("tokens",) + content_key(message), lambda: count_tokens(message.content))
+
+
+class ContextWindowManager:
+    """Fits observations into a token budget. See the module docstring."""
+
+    def __init__(self, budget: int, compact: Callable[[str, int], str] = compact_message_content,
+                 min_compacted_tokens: int = MIN_COMPACTED_TOKENS, sender_priorities: Dict[str, int] = None):
+        """
+        args:
+            budget: the maximum number of tokens of the prompt (system prompt and messages)
+            compact: a function `(content, max_tokens) -> content` that shortens a message, e.g. by summarizing it.
+                Defaults to keeping the beginning and the end of the message.
+            min_compacted_tokens: messages are not compacted below this size, but dropped instead
+            sender_priorities: priorities by sender, see `SENDER_PRIORITIES`
+        """
+        self.budget = budget
+        self.compact = compact
+        self.min_compacted_tokens = min_compacted_tokens
+        self.sender_priorities = sender_priorities if sender_priorities is not None else SENDER_PRIORITIES
+
+    @classmethod
+    def for_backend(cls, backend, max_context_tokens: int = None, **kwargs) -> Optional["ContextWindowManager"]:
+        """
+        A manager whose budget is the context window of the model of `backend` (or `max_context_tokens`, if set),
+        minus the tokens of the response and a safety margin. Returns None if the context window is unknown, e.g. for
+        the fake backend.
+        """
+        context_window = max_context_tokens or get_context_window(getattr(backend, "model", None))
+        if context_window is None:
+            return None
+        max_response_tokens = getattr(backend, "max_tokens", None) or 0
+        budget = int(context_window * (1 - SAFETY_MARGIN)) - max_response_tokens
+        return cls(budget=max(budget, 0), **kwargs)
+
+    def priority(self, message: Message, agent_name: str) -> int:
+        if message.agent_name == agent_name:
+            return OWN_MESSAGE_PRIORITY
+        return self.sender_priorities.get(message.agent_name, DEFAULT_PRIORITY)
+
+    def _compacted(self, message: Message, max_tokens: int) -> Tuple[Message, int]:
+        def compute():
+            content = self.compact(message.content, max_tokens)
+            return content, count_tokens(content)
+
+        key = ("compacted",) + content_key(message) + (max_tokens, self.compact)
+        content, num_tokens = _CACHE.get_or_compute(key, compute)
+        return Message(agent_name=message.agent_name, content=content, turn=message.turn,
+                       timestamp=message.timestamp, visible_to=message.visible_to, msg_type=message.msg_type,
+                       logged=message.logged), num_tokens
+
+    def fit(self, observation: List[Message], role_desc: str, global_prompt: str = None,
+            agent_name: str = None) -> Tuple[List[Message], ContextReport]:
+        """
+        Returns the observation, with messages compacted or dropped if needed to fit in the budget, and a report.
+        The observation is returned as is if it fits.
+        """
+        fixed_tokens = count_tokens(role_desc or "") + count_tokens(global_prompt or "") + 2 * TOKENS_PER_MESSAGE
+        tokens = [message_tokens(message) + TOKENS_PER_MESSAGE for message in observation]
+        total = fixed_tokens + sum(tokens)
+        report = ContextReport(budget=self.budget, original_tokens=total, final_tokens=total)
+
+        if total <= self.budget:
+            return observation, report
+
+        messages = list(observation)
+        last = len(messages) - 1
+
+        # Lowest priority first, then oldest first. The most recent message comes last.
+        order = sorted(range(len(messages)),
+                       key=lambda i: (i == last, self.priority(messages[i], agent_name), i))
+
+        # Compact, reducing each message by at most what is needed
+        for i in order:
+            if total <= self.budget:
+                break
+            content_tokens = tokens[i] - TOKENS_PER_MESSAGE
+            # Round the size down so that players with slightly different budgets share the compacted messages
+            target = max(self.min_compacted_tokens, content_tokens - (total - self.budget)) // 64 * 64
+            if target >= content_tokens:
+                continue
+            messages[i], num_tokens = self._compacted(messages[i], target)
+            report.compacted.append((messages[i].agent_name, messages[i].turn, content_tokens, num_tokens))
+            total -= content_tokens - num_tokens
+            tokens[i] = num_tokens + TOKENS_PER_MESSAGE
+
+        # Drop whole messages if compacting was not enough, but never the most recent one
+        dropped = set()
+        for i in order:
+            if total <= self.budget or i == last:
+                break
+            dropped.add(i)
+            report.dropped.append((messages[i].agent_name, messages[i].turn, tokens[i]))
+            total -= tokens[i]
+
+        report.final_tokens = total
+        if total > self.budget:
+            logger.warning(f"The prompt of {agent_name} does not fit in {self.budget} tokens even after compaction: "
+                           f"{report.format()}")
+
+        return [message for i, message in enumerate(messages) if i not in dropped], report
+
+    @staticmethod
+    def clear_cache():
+        _CACHE.clear()
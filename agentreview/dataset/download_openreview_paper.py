@@ -4,31 +4,214 @@ Download all papers from one year of ICLR conference using OpenReview API.
 This script downloads all paper PDFs and their corresponding metadata
 from the ICLR 2023 conference using the OpenReview API.
 
+PDFs are downloaded concurrently through a pooled HTTP session. Each PDF is streamed to a `.part` file, which is
+verified (size, PDF header and, if known, SHA-256) and then atomically renamed. If the script is interrupted, the
+next run skips the papers already in the corpus manifest and resumes the partial downloads with HTTP range requests.
+
 Alternative methods to download can be found in this
 [colab notebook](https://colab.research.google.com/drive/1vXXNxn8lnO3j1dgoidjybbKIN0DW0Bt2),
 though it's not used here.
 """
 
-import glob
 import json
+import logging
 import os
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Tuple
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from agentreview.arguments import parse_args
+from agentreview.dataset.manifest import EXTRACTION_PENDING, CorpusManifest, file_sha256
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b"%PDF"
+# Complete PDFs end with this marker (followed by at most a few bytes of whitespace)
+PDF_EOF_MARKER = b"%%EOF"
+PDF_EOF_SEARCH_BYTES = 1024
+
+# HTTP status codes that are retried by the session, honoring the Retry-After header
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class DownloadError(Exception):
+    """Raised when a file cannot be downloaded or fails verification."""
+
+
+def create_session(pool_size: int = 8, max_retries: int = 5, backoff_factor: float = 1.0) -> requests.Session:
+    """
+    Create an HTTP session whose connection pool is shared by the download threads.
+
+    Connection errors and the status codes in `RETRY_STATUS_CODES` are retried with exponential backoff. For 429
+    and 503, the wait time in the Retry-After header is used instead.
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _expected_total_size(response: requests.Response) -> Optional[int]:
+    """Total size of the file, from the Content-Range header of a partial response or the Content-Length."""
+    if response.status_code == 206:
+        total = response.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+        return int(total) if total.isdigit() else None
+
+    content_length = response.headers.get("Content-Length")
+    return int(content_length) if content_length is not None and content_length.isdigit() else None
+
+
+def verify_pdf(path: str, expected_sizes: List[Optional[int]] = (), expected_sha256: str = None,
+               require_eof: bool = False) -> Tuple[int, str]:
+    """
+    Check that a file is a PDF of the expected size and SHA-256 (those that are not None), and return its size and
+    SHA-256. Raises a `DownloadError` listing the failed checks.
+
+    args:
+        require_eof: also check that the file ends with the `%%EOF` marker. Used for files of unknown size, whose
+            truncation cannot be detected from their size.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.read(len(PDF_MAGIC))
+        f.seek(max(0, size - PDF_EOF_SEARCH_BYTES))
+        tail = f.read()
+    sha256 = file_sha256(path)
+
+    errors = []
+    if header != PDF_MAGIC:
+        errors.append(f"not a PDF (starts with {header!r})")
+    if require_eof and PDF_EOF_MARKER not in tail:
+        errors.append(f"truncated (no {PDF_EOF_MARKER.decode()} marker at the end)")
+    for expected in expected_sizes:
+        if expected is not None and expected != size:
+            errors.append(f"size is {size} instead of {expected}")
+    if expected_sha256 is not None and expected_sha256 != sha256:
+        errors.append(f"SHA-256 is {sha256} instead of {expected_sha256}")
+
+    if errors:
+        raise DownloadError("; ".join(errors))
+    return size, sha256
+
+
+def download_pdf(session: requests.Session, url: str, path: str, expected_sha256: str = None,
+                 expected_size: int = None, max_attempts: int = 3, chunk_size: int = 1 << 16,
+                 timeout: Tuple[float, float] = (10, 60)) -> Tuple[int, str]:
+    """
+    Download a PDF to `path`, resuming a previous partial download if there is one.
+
+    args:
+        session: the HTTP session created by `create_session`
+        url: the URL of the PDF
+        path: the destination. The data is written to `{path}.part` and renamed once verified.
+        expected_sha256: if set, the SHA-256 that the downloaded file must have
+        expected_size: if set, the size in bytes that the downloaded file must have
+        max_attempts: attempts for errors in the middle of the transfer, each resuming where the last one stopped.
+            Errors before the transfer starts are retried by the session.
+
+    Returns:
+        The size and the SHA-256 of the downloaded file.
+    """
+    part_path = f"{path}.part"
+    total_size = None
+
+    for attempt in range(1, max_attempts + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416:
+                    # The partial file already has all the bytes. It is verified below.
+                    break
+
+                if response.status_code not in (200, 206):
+                    raise DownloadError(f"GET {url} returned status {response.status_code}")
+
+                if response.status_code == 200:
+                    # The server does not support range requests, or there was nothing to resume
+                    offset = 0
+
+                total_size = _expected_total_size(response)
+
+                with open(part_path, "ab" if offset else "wb") as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+            break
+
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == max_attempts:
+                raise DownloadError(f"Failed to download {url} after {max_attempts} attempts: {e}") from e
+            logger.warning(f"Download of {url} interrupted ({type(e).__name__}). Resuming "
+                           f"(attempt {attempt + 1}/{max_attempts}) ...")
+
+    try:
+        size, sha256 = verify_pdf(part_path, expected_sizes=[total_size, expected_size], expected_sha256=expected_sha256)
+    except DownloadError as e:
+        # Start from scratch next time
+        os.remove(part_path)
+        raise DownloadError(f"Downloaded file from {url} is invalid: {e}") from e
+
+    os.replace(part_path, path)
+    return size, sha256
+
+
+def _write_json_atomically(obj, path: str):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def download_paper(session: requests.Session, note, manifest: CorpusManifest, papers_directory: str,
+                   notes_directory: str, url_template: str):
+    """Download the PDF and the note (which contains the reviews, rebuttals, and decisions) of a submission."""
+    paper_id = note.number
+    paper_path = os.path.join(papers_directory, f"{paper_id}.pdf")
+    note_path = os.path.join(notes_directory, f"{paper_id}.json")
+
+    size = sha256 = None
+    if os.path.exists(paper_path):
+        # Downloaded by an interrupted run that did not get to save the manifest, or by the previous downloader, which
+        # wrote the PDFs in place and may have left truncated files
+        try:
+            size, sha256 = verify_pdf(paper_path, require_eof=True)
+        except DownloadError as e:
+            logger.warning(f"Downloading paper {paper_id} again, the existing {paper_path} is invalid: {e}")
+            os.remove(paper_path)
+
+    if sha256 is None:
+        logger.debug(f"Downloading paper {paper_id}: {note.content.get('title', 'N/A')}")
+        size, sha256 = download_pdf(session, url_template.format(note_id=note.id), paper_path)
+
+    _write_json_atomically(note.to_json(), note_path)
+
+    manifest.update(paper_id, pdf_path=paper_path, note_path=note_path, size=size,
+                    mtime=os.stat(paper_path).st_mtime, sha256=sha256, extraction_status=EXTRACTION_PENDING)
 
-try:
-    import openreview
-except ImportError:
-    raise ImportError("Please install openreview package using `pip install openreview-py`")
 
 def download_papers(args):
     """Downloads all papers from ICLR 2023 using OpenReview API.
 
     This function authenticates with the OpenReview API using environment
     variables for the username and password. It then iterates through the
-    available papers, downloads the PDF, and saves the corresponding metadata
-    (in JSON format) in the specified directories.
+    available papers, downloads the PDFs with `args.download_workers` threads,
+    and saves the corresponding metadata (in JSON format) in the specified
+    directories. Downloaded papers are recorded in the corpus manifest.
 
     Raises:
         AssertionError: If the OPENREVIEW_USERNAME or OPENREVIEW_PASSWORD environment
@@ -36,6 +219,11 @@ def download_papers(args):
         AssertionError: If the conference argument is not for ICLR.
     """
 
+    try:
+        import openreview
+    except ImportError:
+        raise ImportError("Please install openreview package using `pip install openreview-py`")
+
     openreview_username = os.environ.get("OPENREVIEW_USERNAME")
     openreview_password = os.environ.get("OPENREVIEW_PASSWORD")
 
@@ -59,77 +247,58 @@ def download_papers(args):
 
     assert "ICLR" in args.conference, "Only works for ICLR conferences!"
     year = int(args.conference.split("ICLR")[-1])  # Only works for ICLR currently
-    ids = []
 
     # Create directories if they don't exist
     for path in [papers_directory, notes_directory]:
         os.makedirs(path, exist_ok=True)
 
-    while True:
-        # Fetch submissions with pagination
-        notes = client.get_notes(
-            invitation=f'ICLR.cc/{year}/Conference/-/Blind_Submission',
-            details='all',
-            offset=offset,
-            limit=page_size
-        )
-
-        if not notes:
-            break  # Exit if no more notes are available
+    # Papers already downloaded are looked up in the manifest instead of globbing the PDFs on every page
+    manifest = CorpusManifest.load(args.data_dir, args.conference)
+    session = create_session(pool_size=args.download_workers)
+    num_downloaded, failed_paper_ids = 0, []
 
-        # Get existing paper IDs to avoid re-downloading
-        existing_papers = glob.glob(f"{papers_directory}/*.pdf")
-        existing_paper_ids = {int(os.path.basename(paper).split(".pdf")[0]) for paper in existing_papers}
+    with ThreadPoolExecutor(max_workers=args.download_workers) as executor:
+        while True:
+            # Fetch submissions with pagination
+            notes = client.get_notes(
+                invitation=f'ICLR.cc/{year}/Conference/-/Blind_Submission',
+                details='all',
+                offset=offset,
+                limit=page_size
+            )
 
-        for note in notes:
-            paper_id = note.number
-            paper_path = os.path.join(papers_directory, f"{paper_id}.pdf")
-            note_path = os.path.join(notes_directory, f"{paper_id}.json")
+            if not notes:
+                break  # Exit if no more notes are available
 
             # Skip existing papers
-            if paper_id in existing_paper_ids:
-                print(f"Paper {paper_id} already downloaded.")
-                continue
-
-            print(f"Title: {note.content.get('title', 'N/A')}")
-            print(f"Abstract: {note.content.get('abstract', 'N/A')}")
-            print(f"TL;DR: {note.content.get('TL;DR', 'N/A')}")
-            pdf_link = f"https://openreview.net/pdf?id={note.id}"
-            print(f"PDF Link: {pdf_link}")
-
-            # Attempt to download the paper PDF, retry if fails
-            tries = 0
-            while tries < 10:
-                try:
-                    response = requests.get(pdf_link)
-
-                    if response.status_code == 200:
-                        
-                        with open(paper_path, "wb") as pdf_file:
-                            pdf_file.write(response.content)
-
-                        print(f"PDF downloaded successfully as {paper_path}")
-
-                        # Save metadata as JSON, which contains the reviews, rebuttals, and decisions. 
-                        with open(note_path, "w") as note_file:
-                            json.dump(note.to_json(), note_file, indent=2)
+            futures = {executor.submit(download_paper, session, note, manifest, papers_directory, notes_directory,
+                                       args.openreview_pdf_url): note.number
+                       for note in notes if not manifest.has_pdf(note.number)}
 
-                        break
-
-                    else:
-                        print(f"Attempt {tries} failed. Status code: {response.status_code}")
-                        if response.status_code == 429:  # Too many requests
-                            print("Too many requests. Sleeping for 10 seconds.")
-                            time.sleep(10)
+            logger.info(f"Downloading {len(futures)} papers ({len(notes) - len(futures)} already downloaded) ...")
 
+            for future in as_completed(futures):
+                paper_id = futures[future]
+                try:
+                    future.result()
+                    num_downloaded += 1
                 except Exception as e:
-                    print(f"Attempt {tries} failed with error: {e}")
+                    failed_paper_ids.append(paper_id)
+                    logger.error(f"Failed to download paper {paper_id}: {e}")
+
+            # Save the progress after every page, so that an interrupted run resumes from here
+            manifest.save()
+            offset += page_size
 
-                tries += 1
+    session.close()
 
-        offset += page_size
+    logger.info(f"Downloaded {num_downloaded} papers to {papers_directory}")
+    if failed_paper_ids:
+        logger.warning(f"Failed to download {len(failed_paper_ids)} papers, which will be retried on the next run: "
+                       f"{sorted(failed_paper_ids)}")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     args = parse_args()
     download_papers(args)
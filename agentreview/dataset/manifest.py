@@ -0,0 +1,327 @@
+"""
+Manifest of the papers of one conference, stored in `{data_dir}/{conference}/manifest.json`.
+
+The manifest records, for every paper, its decision, the paths of its PDF and OpenReview note, the size, mtime and
+SHA-256 of the PDF, and whether its contents have been extracted. It is built by scanning the `paper/` and `notes/`
+directories once, and is then updated incrementally by the scripts that download and categorize the papers. Entry
+points read it instead of globbing the corpus, which takes minutes on network filesystems.
+
+    manifest = get_corpus_manifest("data", "ICLR2023")
+    paper_ids = manifest.paper_ids(with_pdf=True)
+    pdf_path = manifest.pdf_path(paper_ids[0])
+
+The manifest built on first use does not have the SHA-256 of the PDFs. To hash them, or to rescan the corpus after
+adding or moving files by hand (only new or modified PDFs are hashed):
+
+    python agentreview/dataset/manifest.py --conference ICLR2023
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Collection, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Values of `PaperRecord.extraction_status`
+EXTRACTION_PENDING = "pending"
+EXTRACTION_DONE = "extracted"
+EXTRACTION_FAILED = "failed"
+
+
+@dataclass
+class PaperRecord:
+    """A paper in the manifest. Paths are relative to `{data_dir}/{conference}`."""
+
+    paper_id: int
+    decision: Optional[str] = None
+    pdf_path: Optional[str] = None
+    note_path: Optional[str] = None
+    size: Optional[int] = None
+    mtime: Optional[float] = None
+    sha256: Optional[str] = None
+    extraction_status: str = EXTRACTION_PENDING
+    extraction: Dict = field(default_factory=dict)
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _scan_directory(directory: str, extension: str,
+                    decisions: Collection[str]) -> Dict[int, Tuple[Optional[str], os.DirEntry]]:
+    """
+    Find the `{paper_id}{extension}` files directly in `directory` and in its subdirectories named after one of
+    `decisions`. Other subdirectories (e.g. `.ipynb_checkpoints`) are ignored.
+
+    Returns a mapping from paper ID to (decision, DirEntry). The decision is None for uncategorized files.
+    """
+    found = {}
+    if not os.path.isdir(directory):
+        return found
+
+    def add(entry: os.DirEntry, decision: Optional[str]):
+        paper_id = entry.name[:-len(extension)]
+        if paper_id.isdigit():
+            found[int(paper_id)] = (decision, entry)
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                if entry.name not in decisions:
+                    logger.debug(f"Skipping {entry.path}, which is not named after a paper decision")
+                    continue
+                with os.scandir(entry.path) as sub_entries:
+                    for sub_entry in sub_entries:
+                        if sub_entry.name.endswith(extension) and sub_entry.is_file():
+                            add(sub_entry, entry.name)
+            elif entry.name.endswith(extension):
+                # Categorized files take precedence over uncategorized ones
+                paper_id = entry.name[:-len(extension)]
+                if not (paper_id.isdigit() and int(paper_id) in found):
+                    add(entry, None)
+
+    return found
+
+
+class CorpusManifest:
+    """
+    The papers of one conference, indexed by paper ID.
+
+    Updates are made in memory and written to disk by `save`, which replaces the manifest atomically. All methods
+    are thread-safe.
+    """
+
+    def __init__(self, data_dir: str, conference: str, records: Dict[int, PaperRecord] = None):
+        self.data_dir = data_dir
+        self.conference = conference
+        self.root = os.path.join(data_dir, conference)
+        self.path = os.path.join(self.root, MANIFEST_FILENAME)
+        self.records: Dict[int, PaperRecord] = records if records is not None else {}
+        self._lock = threading.RLock()
+        self._dirty = False
+
+    @classmethod
+    def load(cls, data_dir: str, conference: str, build_if_missing: bool = True,
+             hash_files: bool = False) -> "CorpusManifest":
+        """
+        Load the manifest of a conference, building it from the files on disk if it does not exist yet. The PDFs are
+        only hashed when building if `hash_files`, since the entry points that build it on first use do not need the
+        hashes. Run this module to hash them.
+        """
+        manifest = cls(data_dir, conference)
+
+        if os.path.exists(manifest.path):
+            with open(manifest.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            if data.get("version") != MANIFEST_VERSION:
+                raise ValueError(f"Unsupported manifest version {data.get('version')} in {manifest.path}")
+
+            manifest.records = {int(paper_id): PaperRecord(paper_id=int(paper_id), **record)
+                                for paper_id, record in data["papers"].items()}
+
+        elif build_if_missing:
+            logger.info(f"Building the manifest of {conference} from {manifest.root} ...")
+            manifest.refresh(hash_files=hash_files)
+            manifest._import_legacy_decisions()
+            manifest.save()
+
+        return manifest
+
+    def __contains__(self, paper_id: int) -> bool:
+        return int(paper_id) in self.records
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, paper_id: int) -> Optional[PaperRecord]:
+        return self.records.get(int(paper_id))
+
+    def has_pdf(self, paper_id: int) -> bool:
+        record = self.records.get(int(paper_id))
+        return record is not None and record.pdf_path is not None
+
+    def pdf_path(self, paper_id: int) -> Optional[str]:
+        """Absolute path of the PDF of a paper, or None if the paper has no PDF."""
+        record = self.records.get(int(paper_id))
+        if record is None or record.pdf_path is None:
+            return None
+        return os.path.join(self.root, record.pdf_path)
+
+    def paper_ids(self, decision: str = None, with_pdf: bool = False) -> List[int]:
+        return sorted(paper_id for paper_id, record in self.records.items()
+                      if (decision is None or record.decision == decision)
+                      and (not with_pdf or record.pdf_path is not None))
+
+    def get_paper_decision_mapping(self) -> Tuple[Dict[int, str], Dict[str, List[int]]]:
+        """Returns the mappings from paper IDs to decisions and from decisions to (sorted) paper IDs."""
+        paper_id2decision, paper_decision2ids = {}, {}
+        for paper_id in sorted(self.records):
+            decision = self.records[paper_id].decision
+            if decision is not None:
+                paper_id2decision[paper_id] = decision
+                paper_decision2ids.setdefault(decision, []).append(paper_id)
+        return paper_id2decision, paper_decision2ids
+
+    def update(self, paper_id: int, **fields) -> PaperRecord:
+        """Create or update the record of a paper. `pdf_path` and `note_path` are paths on the filesystem."""
+        return self._set(int(paper_id), self._relative_paths(fields))
+
+    def _relative_paths(self, fields: dict) -> dict:
+        for key in ["pdf_path", "note_path"]:
+            if fields.get(key) is not None:
+                fields[key] = os.path.relpath(os.path.abspath(fields[key]), os.path.abspath(self.root))
+        return fields
+
+    def _set(self, paper_id: int, fields: dict) -> PaperRecord:
+        with self._lock:
+            record = self.records.get(paper_id)
+            if record is None:
+                record = self.records[paper_id] = PaperRecord(paper_id=paper_id)
+            for key, value in fields.items():
+                setattr(record, key, value)
+            self._dirty = True
+        return record
+
+    def add_pdf(self, paper_id: int, pdf_path: str, hash_file: bool = True, **fields) -> PaperRecord:
+        """Record the PDF of a paper together with its size, mtime and (optionally) SHA-256."""
+        stat = os.stat(pdf_path)
+        return self.update(paper_id, pdf_path=pdf_path, size=stat.st_size, mtime=stat.st_mtime,
+                           sha256=file_sha256(pdf_path) if hash_file else None,
+                           extraction_status=EXTRACTION_PENDING, **fields)
+
+    def set_extraction_status(self, paper_id: int, status: str, **details):
+        self.update(paper_id, extraction_status=status, extraction=details)
+
+    def refresh(self, hash_files: bool = True):
+        """
+        Rescan the `paper/` and `notes/` directories. Only the PDFs that are new, or whose size or mtime changed,
+        are hashed again. Papers whose files are gone keep their decision but lose their paths.
+        """
+        from agentreview.utility.utils import get_all_paper_decisions
+
+        start = time.time()
+        decisions = get_all_paper_decisions(self.conference)
+        pdfs = _scan_directory(os.path.join(self.root, "paper"), ".pdf", decisions)
+        notes = _scan_directory(os.path.join(self.root, "notes"), ".json", decisions)
+        num_hashed = 0
+
+        with self._lock:
+            for paper_id in set(self.records) - set(pdfs) - set(notes):
+                record = self.records[paper_id]
+                if record.pdf_path is not None or record.note_path is not None:
+                    self._set(paper_id, dict(pdf_path=None, note_path=None, size=None, mtime=None, sha256=None))
+
+            for paper_id in set(pdfs) | set(notes):
+                record = self.records.get(paper_id)
+                fields = {}
+
+                # The note is in the subdirectory of the decision; fall back to the PDF for papers without notes
+                note_decision, note_entry = notes.get(paper_id, (None, None))
+                pdf_decision, pdf_entry = pdfs.get(paper_id, (None, None))
+                decision = note_decision or pdf_decision
+                if decision is not None:
+                    fields["decision"] = decision
+                fields["note_path"] = note_entry.path if note_entry else None
+
+                if pdf_entry is None:
+                    fields.update(pdf_path=None, size=None, mtime=None, sha256=None)
+
+                else:
+                    stat = pdf_entry.stat()
+                    unchanged = (record is not None and record.size == stat.st_size and record.mtime == stat.st_mtime
+                                 and (record.sha256 is not None or not hash_files))
+                    fields.update(pdf_path=pdf_entry.path, size=stat.st_size, mtime=stat.st_mtime)
+                    if not unchanged:
+                        fields["sha256"] = file_sha256(pdf_entry.path) if hash_files else None
+                        fields["extraction_status"] = EXTRACTION_PENDING
+                        num_hashed += hash_files
+
+                fields = self._relative_paths(fields)
+                if record is None or any(getattr(record, key) != value for key, value in fields.items()):
+                    self._set(paper_id, fields)
+
+        logger.info(f"Scanned {len(pdfs)} PDFs and {len(notes)} notes of {self.conference} "
+                    f"({num_hashed} hashed) in {time.time() - start:.1f}s")
+
+    def _import_legacy_decisions(self):
+        """Take the decisions of papers without notes from the `id2decision.json` cache of earlier versions."""
+        legacy_path = os.path.join(self.root, "id2decision.json")
+        if not os.path.exists(legacy_path):
+            return
+
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            paper_id2decision = json.load(f)
+
+        for paper_id, decision in paper_id2decision.items():
+            record = self.records.get(int(paper_id))
+            if record is None or record.decision is None:
+                self.update(paper_id, decision=decision)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            papers = {}
+            for paper_id in sorted(self.records):
+                record = asdict(self.records[paper_id])
+                del record["paper_id"]
+                papers[str(paper_id)] = record
+
+        return {
+            "version": MANIFEST_VERSION,
+            "conference": self.conference,
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "papers": papers,
+        }
+
+    def save(self, force: bool = False):
+        """Write the manifest atomically, so that readers never see a partially written file."""
+        with self._lock:
+            if not (self._dirty or force or not os.path.exists(self.path)):
+                return
+            data = self.to_dict()
+            self._dirty = False
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+_MANIFESTS: Dict[Tuple[str, str], CorpusManifest] = {}
+_MANIFESTS_LOCK = threading.Lock()
+
+
+def get_corpus_manifest(data_dir: str, conference: str) -> CorpusManifest:
+    """Returns the manifest of a conference, loaded at most once per process."""
+    key = (os.path.abspath(data_dir), conference)
+    with _MANIFESTS_LOCK:
+        if key not in _MANIFESTS:
+            _MANIFESTS[key] = CorpusManifest.load(data_dir, conference)
+        return _MANIFESTS[key]
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+    from agentreview.arguments import parse_args
+
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+
+    manifest = CorpusManifest.load(args.data_dir, args.conference, build_if_missing=False)
+    manifest.refresh()
+    manifest.save(force=True)
+    print(f"{len(manifest)} papers ({len(manifest.paper_ids(with_pdf=True))} with PDFs) in {manifest.path}")
@@ -1,29 +1,40 @@
 """
 Process and classify ICLR submissions using OpenReview API.
 
-This script processes ICLR submissions, classifies them into subdirectories
-based on decisions, extracts paper content into JSON format, and checks the
-validity of the processed papers.
-
-It includes three main functions:
-- classify_ICLR_submissions_into_subdirectories: Classifies papers into
-  directories based on decisions.
-- process_submission: Processes each submission by extracting text and saving
-  it as a JSON file.
-- check_processed_paper: Verifies if all processed papers are valid JSON files.
+This script finds the decision (or recommendation) of each ICLR submission in its OpenReview note and records it
+in the corpus manifest (`data/{conference}/manifest.json`). The notes and papers are not moved: the manifest maps
+each paper ID to its decision and to the paths of its files.
+
+Notes are parsed in parallel with a streaming JSON reader (`ijson`, if installed), which stops reading a note as
+soon as the decision is found.
+
+It includes the following functions:
+- extract_decision: Extracts the decision from one note.
+- categorize_ICLR_submissions: Extracts the decisions of all notes and writes them to the manifest in one pass.
 """
 
+import json
+import logging
 import os
 import sys
-import traceback
-from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional, Tuple
 
 from tqdm import tqdm
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from agentreview.arguments import parse_args
-from agentreview.utility.utils import print_colored
+from agentreview.dataset.manifest import CorpusManifest
+
+try:
+    import ijson
+except ImportError:
+    is_ijson_available = False
+else:
+    is_ijson_available = True
+
+logger = logging.getLogger(__name__)
 
 decision_map = {
     # ICLR 2023
@@ -48,65 +59,99 @@ decision_map = {
     "Invite to Workshop Track": "Reject"
 }
 
+# Fields of the note that hold the decision, depending on the year
+DECISION_KEYS = ("recommendation", "decision")
+
 
-def categorize_ICLR_submissions_into_subdirectories():
-    """Classifies ICLR submissions into subdirectories based on review decisions.
+def _iter_string_fields_streaming(f) -> Iterator[Tuple[str, str]]:
+    """Yield the (key, value) pairs of the string fields of a JSON document, in document order, using ijson."""
+    key = None
+    for _, event, value in ijson.parse(f):
+        if event == "map_key":
+            key = value
+            continue
+        if event == "string" and key is not None:
+            yield key, value
+        key = None
 
-    This function iterates through the review notes and identifies the decision
-    (recommendation or final decision) for each submission. It then moves the
-    notes and their corresponding papers into directories based on the decision.
 
-    Raises:
-        AssertionError: If the line containing the decision does not have the
-                        expected format.
+def _iter_string_fields(obj) -> Iterator[Tuple[str, str]]:
+    """Same as `_iter_string_fields_streaming`, for a document that is already parsed."""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if isinstance(value, str):
+                yield key, value
+            else:
+                yield from _iter_string_fields(value)
+    elif isinstance(obj, list):
+        for value in obj:
+            yield from _iter_string_fields(value)
+
+
+def extract_decision(note_path: str) -> Optional[str]:
+    """
+    Returns the first decision or recommendation in a note, mapped through `decision_map`. Returns None if there is
+    no decision, e.g. for withdrawn papers.
     """
-    note_dir = f"data/{args.conference}/notes"
-    paper_dir = f"data/{args.conference}/paper"
+    with open(note_path, "rb") as f:
+        fields = _iter_string_fields_streaming(f) if is_ijson_available else _iter_string_fields(json.load(f))
 
-    for note in os.listdir(note_dir):
-        print(note)
+        for key, value in fields:
+            if key in DECISION_KEYS and value in decision_map:
+                return decision_map[value]
 
-        # Skip directories or irrelevant files
-        if os.path.isdir(os.path.join(note_dir, note)) or ".DS_Store" in note:
-            continue
+    return None
 
-        note_path = os.path.join(note_dir, note)
-        lines = open(note_path, "r").readlines()
-        decision = None
-
-        for line in tqdm(lines):
-            if "\"recommendation\"" in line:
-                assert Counter(line)["\""] == 4, "Unexpected format in recommendation line."
-                print(line)
-                decision = line.split("\"recommendation\"")[1].split("\"")[1]
-                break
-
-            elif "\"decision\"" in line:
-                assert Counter(line)["\""] == 4, "Unexpected format in decision line."
-                print(line)
-                try:
-                    decision = line.split("\"decision\"")[1].split("\"")[1]
-                    break
-                except Exception:
-                    traceback.print_exc()
-                    print_colored(line, 'red')
-
-        if decision is None:
-            # Possibly withdrawn papers
-            print_colored(f"Could not find decision for {note}", "red")
-            continue
 
-        os.makedirs(os.path.join(note_dir, decision_map[decision]), exist_ok=True)
-        os.makedirs(os.path.join(paper_dir, decision_map[decision]), exist_ok=True)
-        os.rename(note_path, os.path.join(note_dir, decision_map[decision], note))
+def _extract_decision_of_note(item: Tuple[int, str]) -> Tuple[int, Optional[str], Optional[str]]:
+    paper_id, note_path = item
+    try:
+        return paper_id, extract_decision(note_path), None
+    except Exception as e:
+        return paper_id, None, f"{type(e).__name__}: {e}"
+
+
+def categorize_ICLR_submissions(data_dir: str, conference: str, num_workers: int = None, overwrite: bool = False):
+    """Extracts the decision of every ICLR submission and records it in the corpus manifest.
+
+    Notes are parsed by a pool of `num_workers` processes (default: the number of CPUs). Only papers without a
+    decision in the manifest are processed, unless `overwrite` is set. The manifest is written once, at the end.
+    """
+    manifest = CorpusManifest.load(data_dir, conference, hash_files=False)
+
+    items = [(record.paper_id, os.path.join(manifest.root, record.note_path))
+             for record in manifest.records.values()
+             if record.note_path is not None and (overwrite or record.decision is None)]
+
+    logger.info(f"Extracting the decisions of {len(items)} submissions to {conference} ...")
+
+    num_undecided, num_failed = 0, 0
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        results = executor.map(_extract_decision_of_note, items, chunksize=max(1, len(items) // 256))
+
+        for paper_id, decision, error in tqdm(results, total=len(items), desc="Notes"):
+            if error is not None:
+                num_failed += 1
+                logger.error(f"Could not parse the note of paper {paper_id}: {error}")
+            elif decision is None:
+                # Possibly withdrawn papers
+                num_undecided += 1
+                logger.debug(f"Could not find decision for paper {paper_id}")
+            else:
+                manifest.update(paper_id, decision=decision)
+
+    manifest.save()
 
-        paper_id = int(note.split(".json")[0])
-        paper_path = os.path.join(paper_dir, f"{paper_id}.pdf")
-        os.rename(paper_path, os.path.join(paper_dir, decision_map[decision], f"{paper_id}.pdf"))
+    _, paper_decision2ids = manifest.get_paper_decision_mapping()
+    for decision, paper_ids in sorted(paper_decision2ids.items()):
+        logger.info(f"{decision}: {len(paper_ids)} papers")
+    logger.info(f"{num_undecided} submissions without a decision, {num_failed} notes that could not be parsed.")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     args = parse_args()
 
-    # Extract contents of each paper into a JSON file
-    categorize_ICLR_submissions_into_subdirectories()
\ No newline at end of file
+    # Record the decision of each paper in the corpus manifest
+    categorize_ICLR_submissions(args.data_dir, args.conference, overwrite=args.overwrite)
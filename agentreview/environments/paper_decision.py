@@ -1,14 +1,20 @@
+import json
 import logging
+import re
 import traceback
 from typing import List
 
 from agentreview.environments import Conversation
 from .base import TimeStep
 from ..message import Message, MessagePool
+from ..role_descriptions import AC_DECISION_FIELDS
+from ..utils import extract_jsons
 
 
 logger = logging.getLogger(__name__)
 
+PAPER_ID_PATTERN = re.compile(r"paper id\s*:\s*(\d+)", re.IGNORECASE)
+
 
 class PaperDecision(Conversation):
     """
@@ -104,18 +110,29 @@ class PaperDecision(Conversation):
 
 
     def check_action(self, action: str, player_name: str) -> bool:
-        """Check if the action is valid."""
+        """
+        Check if the action is valid.
+
+        For the AC, the action is valid once every paper in the batch has a decision. Decisions that can be parsed
+        from an invalid action are kept in `ac_decisions`, so that the AC is only asked again for the missing papers.
+        """
 
         if player_name.startswith("AC"):
 
             try:
-                self.ac_decisions = self.parse_ac_decisions(action)
+                decisions = self.parse_ac_decisions(action)
 
-            except:
+            except Exception:
                 traceback.print_exc()
                 return False
 
-            if not isinstance(self.ac_decisions, dict):
+            if not isinstance(decisions, dict):
+                return False
+
+            self.ac_decisions = self.merge_ac_decisions(self.ac_decisions or {}, decisions)
+
+            if self.missing_paper_ids:
+                logger.warning(f"Missing AC decisions for Paper IDs: {self.missing_paper_ids}")
                 return False
 
         return True
@@ -128,34 +145,127 @@ class PaperDecision(Conversation):
     def ac_decisions(self, value):
         self._ac_decisions = value
 
+    @property
+    def missing_paper_ids(self) -> List[int]:
+        """The IDs of the papers in this batch without a decision yet."""
+        if self.paper_ids is None:
+            return []
+        decisions = self.ac_decisions or {}
+        return [int(paper_id) for paper_id in self.paper_ids if int(paper_id) not in decisions]
+
+    def merge_ac_decisions(self, decisions: dict, new_decisions: dict) -> dict:
+        """
+        Add `new_decisions` to the decisions salvaged from previous actions. Existing decisions are kept.
+
+        With the ranking scoring method, the AC ranks the missing papers separately. Ranks that are already taken
+        are moved after the existing ones, keeping the relative order of the new ranks.
+        """
+        merged = dict(decisions)
+        new_decisions = {paper_id: value for paper_id, value in new_decisions.items() if paper_id not in merged}
+
+        if self.ac_scoring_method == "ranking" and set(new_decisions.values()) & set(merged.values()):
+            next_rank = max(merged.values()) + 1
+            for paper_id, _ in sorted(new_decisions.items(), key=lambda item: item[1]):
+                new_decisions[paper_id] = next_rank
+                next_rank += 1
+
+        merged.update(new_decisions)
+        return merged
+
     def parse_ac_decisions(self, action: str):
         """
         Parse the decisions made by the ACs
+
+        JSON outputs (see `--ac_structured_output`) are parsed first. Otherwise, the "Paper ID: ..." lines are parsed
+        leniently: lines that cannot be parsed are skipped, and only the papers of this batch are kept.
         """
 
-        lines = action.split("\n")
+        paper2rating = self._parse_ac_decisions_json(action)
+
+        if not paper2rating:
+            paper2rating = self._parse_ac_decisions_lines(action)
+
+        if self.paper_ids is not None:
+            paper_ids = {int(paper_id) for paper_id in self.paper_ids}
+            paper2rating = {paper_id: rank for paper_id, rank in paper2rating.items() if paper_id in paper_ids}
+
+        return paper2rating
+
+    def _normalize_rating(self, value):
+        """Convert a rank or a decision to its canonical form. Returns None if it is not valid."""
+        if self.ac_scoring_method == "ranking":
+            try:
+                return int(str(value).strip())
+            except ValueError:
+                return None
+
+        value = str(value).strip().strip("*'\"").lower()
+        if value.startswith("accept"):
+            return "Accept"
+        if value.startswith("reject"):
+            return "Reject"
+        return None
+
+    def _parse_ac_decisions_json(self, action: str) -> dict:
+        text = re.sub(r"^```(?:json)?|```$", "", action.strip()).strip()
+
+        try:
+            items = json.loads(text)
+        except ValueError:
+            # Fall back to the flat JSON objects in the text, e.g. one object per paper
+            items = extract_jsons(action)
+
+        if isinstance(items, dict):
+            items = items.get("decisions", [items])
+
+        if not isinstance(items, list):
+            return {}
+
+        field = AC_DECISION_FIELDS.get(self.ac_scoring_method)
 
         paper2rating = {}
+        for item in items:
+            if not isinstance(item, dict) or "paper_id" not in item or field not in item:
+                continue
 
-        paper_id, rank = None, None
+            try:
+                paper_id = int(item["paper_id"])
+            except (TypeError, ValueError):
+                continue
 
-        for line in lines:
+            rank = self._normalize_rating(item[field])
+            if rank is not None and paper_id not in paper2rating:
+                paper2rating[paper_id] = rank
 
-            if line.lower().startswith("paper id:"):
-                paper_id = int(line.split(":")[1].split('(')[0].strip())
-            elif self.ac_scoring_method == "ranking" and line.lower().startswith("willingness to accept:"):
-                rank = int(line.split(":")[1].strip())
+        return paper2rating
 
-            elif self.ac_scoring_method == "recommendation" and line.lower().startswith("decision"):
-                rank = line.split(":")[1].strip()
+    def _parse_ac_decisions_lines(self, action: str) -> dict:
+        if self.ac_scoring_method == "ranking":
+            value_pattern = re.compile(r"willingness to accept\s*:\s*(\d+)", re.IGNORECASE)
+        else:
+            value_pattern = re.compile(r"decision\s*:\s*\**\s*(\w+)", re.IGNORECASE)
 
+        paper2rating = {}
 
+        paper_id, rank = None, None
+
+        for line in action.split("\n"):
+            # Ignore markdown emphasis such as "**Paper ID:** 12"
+            line = line.replace("*", "")
 
-            if paper_id in paper2rating:
-                raise ValueError(f"Paper {paper_id} is assigned a rank twice.")
+            match = PAPER_ID_PATTERN.search(line)
+            if match is not None:
+                paper_id, rank = int(match.group(1)), None
+
+            match = value_pattern.search(line)
+            if match is not None:
+                rank = self._normalize_rating(match.group(1))
 
             if paper_id is not None and rank is not None:
-                paper2rating[paper_id] = rank
+                if paper_id in paper2rating:
+                    logger.warning(f"Paper {paper_id} is assigned a rank twice. Keeping the first one.")
+                else:
+                    paper2rating[paper_id] = rank
                 paper_id, rank = None, None
 
         return paper2rating
@@ -113,7 +113,7 @@ class PaperReview(Conversation):
     def load_message_history_from_cache(self):
         if self._phase_index == 0:
 
-            print("Loading message history from BASELINE experiment")
+            logger.info("Loading message history from BASELINE experiment")
 
             full_paper_discussion_path = get_rebuttal_dir(paper_id=self.paper_id,
                                                           experiment_name="BASELINE",
@@ -180,7 +180,8 @@ class PaperReview(Conversation):
                            "Phase V. (AC makes decisions).")
 
             else:
-                print(f"Phase {self.phase_index}: end of the speaking order. Move to Phase ({self.phase_index + 1}).")
+                logger.info(f"Phase {self.phase_index}: end of the speaking order. "
+                            f"Move to Phase ({self.phase_index + 1}).")
                 self.phase_index += 1
                 self._current_turn += 1
 
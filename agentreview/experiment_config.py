@@ -245,6 +245,40 @@ malicious_and_irresponsible_Rx1_setting = {
 }
 
 
+"""
+BASELINE_routed: BASELINE with the author and the AC on smaller models. The reviewers keep `--model_name`.
+See `agentreview/model_router.py` for the routes and policies.
+"""
+
+baseline_routed_setting = {
+    "AC": [
+        "BASELINE"
+    ],
+
+    "reviewer": [
+        "BASELINE",
+        "BASELINE",
+        "BASELINE"
+    ],
+
+    "author": [
+        "BASELINE"
+    ],
+    "global_settings":{
+        "provides_numeric_rating": ['reviewer', 'ac'],
+        "persons_aware_of_authors_identities": [],
+        "model_routing": {
+            "author": "gpt-4o-mini",
+            "ac": {
+                "policy": "cheapest_within_latency",
+                "models": ["gpt-4o-mini", "gpt-4o"],
+                "max_latency_s": 60,
+            },
+        },
+    }
+}
+
+
 # All experimental settings.
 # Customize your own by adding new settings to this dict.
 all_settings = {
@@ -260,6 +294,7 @@ all_settings = {
     "inclusive_ACx1": inclusive_ACx1_setting,
     "no_numeric_ratings": no_numeric_ratings_setting,
     "malicious_and_irresponsible_Rx1": malicious_and_irresponsible_Rx1_setting,
+    "BASELINE_routed": baseline_routed_setting,
 
 }
 
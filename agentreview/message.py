@@ -1,7 +1,8 @@
 import hashlib
+import sys
+import threading
 import time
-from dataclasses import dataclass
-from typing import List, Union
+from typing import List, Optional, Union
 from uuid import uuid1
 
 # Preserved roles
@@ -23,7 +24,21 @@ def _hash(input: str):
     return hex_dig
 
 
-@dataclass
+_timestamp_lock = threading.Lock()
+_last_timestamp = 0
+
+
+def _next_timestamp() -> int:
+    """
+    The current wall time in nanoseconds, made strictly increasing so that messages created within the resolution of
+    the clock still have distinct timestamps (and hashes) and are ordered by creation.
+    """
+    global _last_timestamp
+    with _timestamp_lock:
+        _last_timestamp = max(time.time_ns(), _last_timestamp + 1)
+        return _last_timestamp
+
+
 class Message:
     """
     Represents a message in the chatArena environment.
@@ -32,26 +47,78 @@ class Message:
         agent_name (str): Name of the agent who sent the message.
         content (str): Content of the message.
         turn (int): The turn at which the message was sent.
-        timestamp (int): Wall time at which the message was sent. Defaults to current time in nanoseconds.
+        timestamp (int): Wall time at which the message was sent, in nanoseconds. Defaults to the time at which the
+            message is created, and is strictly increasing across the messages of a process.
         visible_to (Union[str, List[str]]): The receivers of the message. Can be a single agent, multiple agents, or 'all'. Defaults to 'all'.
         msg_type (str): Type of the message, e.g., 'text'. Defaults to 'text'.
         logged (bool): Whether the message is logged in the database. Defaults to False.
+
+    Messages use `__slots__` instead of a per-instance `__dict__`, since a sweep keeps millions of them in memory.
     """
 
-    agent_name: str
-    content: str
-    turn: int
-    timestamp: int = time.time_ns()
-    visible_to: Union[str, List[str]] = "all"
-    msg_type: str = "text"
-    logged: bool = False  # Whether the message is logged in the database
+    __slots__ = ("agent_name", "content", "turn", "timestamp", "visible_to", "msg_type", "logged", "_msg_hash")
+
+    _FIELDS = ("agent_name", "content", "turn", "timestamp", "visible_to", "msg_type", "logged")
+
+    # Fields included in `msg_hash`. Setting one of them invalidates the cached hash.
+    _HASHED_FIELDS = frozenset(["agent_name", "content", "turn", "timestamp", "msg_type"])
+
+    def __init__(self, agent_name: str, content: str, turn: int, timestamp: Optional[int] = None,
+                 visible_to: Union[str, List[str]] = "all", msg_type: str = "text", logged: bool = False):
+        # Agent names repeat across all the messages of a run
+        self.agent_name = sys.intern(agent_name)
+        self.content = content
+        self.turn = turn
+        # Saved histories store the timestamp as a string
+        self.timestamp = _next_timestamp() if timestamp is None else int(timestamp)
+        self.visible_to = visible_to
+        self.msg_type = msg_type
+        self.logged = logged  # Whether the message is logged in the database
+
+    def __setattr__(self, name, value):
+        if name in Message._HASHED_FIELDS:
+            object.__setattr__(self, "_msg_hash", None)
+        object.__setattr__(self, name, value)
 
     @property
     def msg_hash(self):
-        # Generate a unique message id given the content, timestamp and role
-        return _hash(
-            f"agent: {self.agent_name}\ncontent: {self.content}\ntimestamp: {str(self.timestamp)}\nturn: {self.turn}\nmsg_type: {self.msg_type}"
-        )
+        # Generate a unique message id given the content, timestamp and role. Computed once and cached.
+        msg_hash = self._msg_hash
+        if msg_hash is None:
+            msg_hash = _hash(
+                f"agent: {self.agent_name}\ncontent: {self.content}\ntimestamp: {str(self.timestamp)}\nturn: {self.turn}\nmsg_type: {self.msg_type}"
+            )
+            object.__setattr__(self, "_msg_hash", msg_hash)
+        return msg_hash
+
+    def to_dict(self) -> dict:
+        """The message in the format of the saved histories, which `Message(**d)` reads back."""
+        return {
+            "agent_name": self.agent_name,
+            "content": self.content,
+            "turn": self.turn,
+            "timestamp": str(self.timestamp),
+            "visible_to": self.visible_to,
+            "msg_type": self.msg_type,
+        }
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in Message._FIELDS)
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in Message._FIELDS)
+        return f"Message({fields})"
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in Message.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
 
 
 class MessagePool:
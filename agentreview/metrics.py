@@ -0,0 +1,466 @@
+"""
+Per-call metrics for the LLM backends.
+
+Every `backend.query` made by a `Player` is recorded as a `CallRecord`: its latency, the number of prompt and
+completion tokens, the number of attempts (tenacity retries included) and an estimated cost. Records are tagged with
+the paper ID, phase, player and experiment they belong to, and are sent to the sinks of the process-wide
+`MetricsRegistry`:
+
+* `InMemoryAggregator` (always enabled): aggregates by phase, player and model, used for the end-of-run summary.
+* `JSONLSink`: one JSON object per call.
+* `PrometheusSink`: counters and a latency histogram in the Prometheus text exposition format, to be picked up by
+  the node exporter's textfile collector.
+
+Tags are propagated with `contextvars`, so that nested code (e.g. the arena and the player) can each add the tags it
+knows about:
+
+    with metrics_tags(paper_id=39, phase="reviewer_write_reviews"):
+        player(observation)
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# USD per 1M tokens (prompt, completion). Azure deployments use the same names as the OpenAI models.
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4": (30.00, 60.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-35-turbo": (0.50, 1.50),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+TAG_NAMES = ["experiment", "paper_id", "phase", "player", "route"]
+
+# Upper bounds (in seconds) of the buckets of the latency histogram
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_TAGS: contextvars.ContextVar = contextvars.ContextVar("agentreview_metrics_tags", default={})
+_CURRENT_CALL: contextvars.ContextVar = contextvars.ContextVar("agentreview_current_call", default=None)
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimate the cost of a call in USD. Returns 0 for models without a known price."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1e6
+
+
+@dataclass
+class CallRecord:
+    """The metrics of a single `backend.query` call."""
+
+    backend: str
+    model: Optional[str] = None
+    experiment: Optional[str] = None
+    paper_id: Optional[str] = None
+    phase: Optional[str] = None
+    player: Optional[str] = None
+    # The model route of the call, e.g. "reviewer" or "ac:ac_make_decisions" (see `model_router.py`)
+    route: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+    latency_s: float = 0.0
+    attempts: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    status: str = "ok"
+    error: Optional[str] = None
+    # Whether the call shared the response of an identical request in flight (see `backends/coalescing.py`)
+    coalesced: bool = False
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.attempts - 1)
+
+    def to_dict(self) -> dict:
+        record = asdict(self)
+        record["retries"] = self.retries
+        return record
+
+
+@contextmanager
+def metrics_tags(**tags):
+    """Add tags to all the calls recorded in this context. Tags set to None are ignored."""
+    merged = dict(_TAGS.get())
+    merged.update({key: str(value) for key, value in tags.items() if value is not None})
+    token = _TAGS.set(merged)
+    try:
+        yield
+    finally:
+        _TAGS.reset(token)
+
+
+def current_tags() -> dict:
+    return dict(_TAGS.get())
+
+
+def record_attempt():
+    """Called by the backends at the start of each attempt (i.e. inside the tenacity-decorated function)."""
+    record = _CURRENT_CALL.get()
+    if record is not None:
+        record.attempts += 1
+
+
+def record_usage(prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    """Called by the backends with the token usage reported by the API."""
+    record = _CURRENT_CALL.get()
+    if record is not None:
+        record.prompt_tokens += prompt_tokens or 0
+        record.completion_tokens += completion_tokens or 0
+
+
+def record_coalesced():
+    """Called when a call shares the response of an identical request in flight, and so spends no tokens."""
+    record = _CURRENT_CALL.get()
+    if record is not None:
+        record.coalesced = True
+
+
+@contextmanager
+def detached_call(record: CallRecord = None):
+    """
+    Collect the attempts and usage recorded in this context in a separate `CallRecord` (`record`, or a new one), which
+    is not emitted. Used for the requests that are only charged to the current call if their response is used, see
+    `backends/hedging.py`.
+    """
+    record = record if record is not None else CallRecord(backend="detached")
+    token = _CURRENT_CALL.set(record)
+    try:
+        yield record
+    finally:
+        _CURRENT_CALL.reset(token)
+
+
+def merge_detached_call(record: CallRecord):
+    """Charge the attempts and usage of a `detached_call` to the current call."""
+    current = _CURRENT_CALL.get()
+    if current is not None:
+        current.attempts += record.attempts
+        current.prompt_tokens += record.prompt_tokens
+        current.completion_tokens += record.completion_tokens
+
+
+@contextmanager
+def track_call(backend, **tags):
+    """
+    Record a call to `backend` made in this context.
+
+    args:
+        backend: the IntelligenceBackend being called
+        tags: extra tags for this call (e.g. `player`), on top of the ones set with `metrics_tags`
+    """
+    all_tags = current_tags()
+    all_tags.update({key: str(value) for key, value in tags.items() if value is not None})
+    record = CallRecord(
+        backend=getattr(backend, "type_name", type(backend).__name__),
+        model=getattr(backend, "model", None),
+        **{key: all_tags.get(key) for key in TAG_NAMES},
+    )
+
+    token = _CURRENT_CALL.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record.status = "error"
+        record.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record.latency_s = time.perf_counter() - start
+        # Backends that do not report their attempts make exactly one
+        record.attempts = max(record.attempts, 1)
+        record.cost_usd = estimate_cost(record.model, record.prompt_tokens, record.completion_tokens)
+        _CURRENT_CALL.reset(token)
+        get_metrics_registry().emit(record)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+class Aggregate:
+    """Running totals over a group of calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.latencies: List[float] = []
+
+    def add(self, record: CallRecord):
+        self.calls += 1
+        self.errors += record.status != "ok"
+        self.retries += record.retries
+        self.coalesced += record.coalesced
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cost_usd += record.cost_usd
+        self.latencies.append(record.latency_s)
+
+    def to_dict(self) -> dict:
+        total_latency = sum(self.latencies)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "coalesced": self.coalesced,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "latency_s_total": round(total_latency, 3),
+            "latency_s_mean": round(total_latency / self.calls, 3) if self.calls else 0.0,
+            "latency_s_p50": round(percentile(self.latencies, 50), 3),
+            "latency_s_p95": round(percentile(self.latencies, 95), 3),
+        }
+
+
+class MetricsSink:
+    """Base class of the metrics sinks."""
+
+    def emit(self, record: CallRecord):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class InMemoryAggregator(MetricsSink):
+    """Aggregates the calls in memory, overall and by phase, player and model."""
+
+    GROUP_BY = ["phase", "player", "model", "route"]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.total = Aggregate()
+        self.groups: Dict[str, Dict[str, Aggregate]] = {key: {} for key in self.GROUP_BY}
+
+    def emit(self, record: CallRecord):
+        with self._lock:
+            self.total.add(record)
+            for key in self.GROUP_BY:
+                value = getattr(record, key) or "unknown"
+                self.groups[key].setdefault(value, Aggregate()).add(record)
+
+    def summary(self) -> dict:
+        with self._lock:
+            summary = {"total": self.total.to_dict()}
+            for key in self.GROUP_BY:
+                summary[f"by_{key}"] = {value: aggregate.to_dict() for value, aggregate in self.groups[key].items()}
+        return summary
+
+
+class JSONLSink(MetricsSink):
+    """Appends one JSON object per call to a file."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def emit(self, record: CallRecord):
+        line = json.dumps(record.to_dict())
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class PrometheusSink(MetricsSink):
+    """
+    Writes counters and a latency histogram in the Prometheus text exposition format.
+
+    The file is rewritten atomically at most every `flush_interval` seconds and when the sink is closed. The paper ID
+    is not used as a label to keep the cardinality low.
+    """
+
+    LABELS = ["experiment", "phase", "player", "route", "backend", "model", "status"]
+
+    def __init__(self, path: str, flush_interval: float = 5.0):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        # Label values -> [calls, retries, prompt tokens, completion tokens, cost, latency sum, bucket counts]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def emit(self, record: CallRecord):
+        labels = tuple(str(getattr(record, name) or "") for name in self.LABELS)
+        with self._lock:
+            series = self._series.setdefault(labels, [0, 0, 0, 0, 0.0, 0.0, [0] * len(LATENCY_BUCKETS)])
+            series[0] += 1
+            series[1] += record.retries
+            series[2] += record.prompt_tokens
+            series[3] += record.completion_tokens
+            series[4] += record.cost_usd
+            series[5] += record.latency_s
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if record.latency_s <= bound:
+                    series[6][i] += 1
+
+            should_flush = time.monotonic() - self._last_flush >= self.flush_interval
+
+        if should_flush:
+            self.flush()
+
+    @staticmethod
+    def _format_labels(names: List[str], values: Tuple[str, ...]) -> str:
+        def escape(value: str) -> str:
+            return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+        return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+    def render(self) -> str:
+        counters = [
+            ("agentreview_backend_calls_total", "Number of backend calls.", 0),
+            ("agentreview_backend_retries_total", "Number of retried backend requests.", 1),
+            ("agentreview_backend_prompt_tokens_total", "Number of prompt tokens.", 2),
+            ("agentreview_backend_completion_tokens_total", "Number of completion tokens.", 3),
+            ("agentreview_backend_cost_usd_total", "Estimated cost of the backend calls in USD.", 4),
+        ]
+
+        with self._lock:
+            series = {labels: [*values[:6], list(values[6])] for labels, values in self._series.items()}
+
+        lines = []
+        for name, help_text, index in counters:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for labels, values in series.items():
+                lines.append(f"{name}{{{self._format_labels(self.LABELS, labels)}}} {values[index]}")
+
+        name = "agentreview_backend_latency_seconds"
+        lines += [f"# HELP {name} Latency of the backend calls, retries included.", f"# TYPE {name} histogram"]
+        for labels, values in series.items():
+            label_str = self._format_labels(self.LABELS, labels)
+            for bound, count in zip(LATENCY_BUCKETS, values[6]):
+                lines.append(f'{name}_bucket{{{label_str},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{label_str},le="+Inf"}} {values[0]}')
+            lines.append(f"{name}_sum{{{label_str}}} {values[5]}")
+            lines.append(f"{name}_count{{{label_str}}} {values[0]}")
+
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        content = self.render()
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, self.path)
+        self._last_flush = time.monotonic()
+
+
+class MetricsRegistry:
+    """Dispatches the call records to the aggregator and the configured sinks."""
+
+    def __init__(self):
+        self.aggregator = InMemoryAggregator()
+        self.sinks: List[MetricsSink] = []
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink: MetricsSink):
+        with self._lock:
+            self.sinks.append(sink)
+
+    def emit(self, record: CallRecord):
+        self.aggregator.emit(record)
+        for sink in list(self.sinks):
+            try:
+                sink.emit(record)
+            except Exception as e:
+                # Metrics must never break a run
+                logger.warning(f"Failed to emit metrics to {type(sink).__name__}: {e}")
+
+    def summary(self) -> dict:
+        return self.aggregator.summary()
+
+    def flush(self):
+        for sink in list(self.sinks):
+            sink.flush()
+
+    def close(self):
+        with self._lock:
+            sinks, self.sinks = self.sinks, []
+        for sink in sinks:
+            sink.close()
+
+    def reset(self):
+        self.close()
+        self.aggregator.reset()
+
+
+_REGISTRY = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _REGISTRY
+
+
+def configure_metrics(metrics_dir: Optional[str] = None) -> MetricsRegistry:
+    """
+    Add the file sinks to the registry.
+
+    args:
+        metrics_dir: if set, the calls are written to `calls.jsonl` and the Prometheus metrics to `metrics.prom` in
+            this directory
+    """
+    registry = get_metrics_registry()
+    if metrics_dir is not None:
+        registry.add_sink(JSONLSink(os.path.join(metrics_dir, "calls.jsonl")))
+        registry.add_sink(PrometheusSink(os.path.join(metrics_dir, "metrics.prom")))
+    return registry
+
+
+def format_metrics_summary(summary: dict = None) -> str:
+    """Format the aggregated metrics as a table, by phase and overall."""
+    if summary is None:
+        summary = get_metrics_registry().summary()
+
+    header = f"{'phase':<32}{'calls':>7}{'retries':>9}{'errors':>8}{'prompt tok':>12}{'compl. tok':>12}" \
+             f"{'mean s':>9}{'p95 s':>9}{'cost $':>10}"
+
+    def row(name: str, stats: dict) -> str:
+        return (f"{name[:31]:<32}{stats['calls']:>7}{stats['retries']:>9}{stats['errors']:>8}"
+                f"{stats['prompt_tokens']:>12}{stats['completion_tokens']:>12}{stats['latency_s_mean']:>9.2f}"
+                f"{stats['latency_s_p95']:>9.2f}{stats['cost_usd']:>10.4f}")
+
+    lines = ["Backend call metrics:", header]
+    lines += [row(phase, stats) for phase, stats in summary.get("by_phase", {}).items()]
+    lines.append(row("total", summary["total"]))
+
+    # Only worth a table when the models are routed
+    by_route = summary.get("by_route", {})
+    if len(summary.get("by_model", {})) > 1 and by_route:
+        lines += ["", header.replace("phase", "route", 1)]
+        lines += [row(route, stats) for route, stats in by_route.items()]
+    return "\n".join(lines)
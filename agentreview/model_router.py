@@ -0,0 +1,162 @@
+"""
+Per-role and per-phase model routing.
+
+By default every LLM-based player uses `--model_name`. The `model_routing` entry of the `global_settings` of an
+experiment setting (see `experiment_config.py`) routes the calls of each role, or of a role in a given phase, to
+another model:
+
+    "global_settings": {
+        ...
+        "model_routing": {
+            "author": "gpt-4o-mini",
+            "ac:ac_make_decisions": "gpt-4o",
+            "ac": {"policy": "cheapest_within_latency", "models": ["gpt-4o-mini", "gpt-4o"], "max_latency_s": 30},
+        },
+    }
+
+Routes are looked up as `{role}:{phase}`, then `{role}`, then `default`, and fall back to `--model_name`. Roles are
+`reviewer`, `author` and `ac`; phases are the names of the phases of the environments (e.g. `reviewer_write_reviews`).
+
+A route is either a model name or a policy:
+* `fixed`: always `model`.
+* `cheapest_within_latency`: the cheapest of `models` (by `MODEL_PRICES`) whose p95 latency on this route, over the
+  last `window` calls, is at most `max_latency_s`. Models with fewer than `min_samples` calls on the route are
+  assumed to meet the target, so that each gets tried. If none meets it, the model with the lowest p95 latency is
+  used.
+
+The route of each call is added to the metrics (the `route` tag), so the costs and latencies are reported per route.
+"""
+
+import json
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple, Union
+
+from .metrics import MODEL_PRICES, CallRecord, estimate_cost, percentile
+
+logger = logging.getLogger(__name__)
+
+POLICY_FIXED = "fixed"
+POLICY_CHEAPEST_WITHIN_LATENCY = "cheapest_within_latency"
+
+# Ratio of prompt to completion tokens used to compare the prices of the models
+PRICE_PROMPT_TOKENS, PRICE_COMPLETION_TOKENS = 4000, 1000
+
+
+def get_player_role(player_name: str) -> str:
+    """The role used for routing, e.g. 'reviewer' for 'Reviewer 2'."""
+    if player_name.startswith("Reviewer"):
+        return "reviewer"
+    if player_name.startswith("Author"):
+        return "author"
+    if player_name.startswith("AC"):
+        return "ac"
+    return player_name.lower().replace(" ", "_")
+
+
+def model_price(model: str) -> float:
+    """The price of a typical call, to compare models. Models without a known price are the most expensive."""
+    if model not in MODEL_PRICES:
+        return float("inf")
+    return estimate_cost(model, PRICE_PROMPT_TOKENS, PRICE_COMPLETION_TOKENS)
+
+
+class Route:
+    """The model selection of one route, and the latencies of its recent calls by model."""
+
+    def __init__(self, name: str, spec: Union[str, dict]):
+        if isinstance(spec, str):
+            spec = {"policy": POLICY_FIXED, "model": spec}
+
+        self.name = name
+        self.policy = spec.get("policy", POLICY_FIXED)
+        self.window = int(spec.get("window", 50))
+
+        if self.policy == POLICY_FIXED:
+            if "model" not in spec:
+                raise ValueError(f"Route '{name}' with the '{POLICY_FIXED}' policy needs a 'model'")
+            self.models = [spec["model"]]
+
+        elif self.policy == POLICY_CHEAPEST_WITHIN_LATENCY:
+            if not spec.get("models") or "max_latency_s" not in spec:
+                raise ValueError(f"Route '{name}' with the '{POLICY_CHEAPEST_WITHIN_LATENCY}' policy needs 'models' "
+                                 f"and 'max_latency_s'")
+            self.models = sorted(spec["models"], key=model_price)
+            self.max_latency_s = float(spec["max_latency_s"])
+            self.min_samples = int(spec.get("min_samples", 5))
+
+        else:
+            raise ValueError(f"Unknown routing policy '{self.policy}' for route '{name}'. "
+                             f"Choose from '{POLICY_FIXED}' and '{POLICY_CHEAPEST_WITHIN_LATENCY}'.")
+
+        self._latencies: Dict[str, Deque[float]] = {model: deque(maxlen=self.window) for model in self.models}
+        self._lock = threading.Lock()
+
+    def select(self) -> str:
+        if self.policy == POLICY_FIXED:
+            return self.models[0]
+
+        with self._lock:
+            p95 = {model: percentile(list(latencies), 95) for model, latencies in self._latencies.items()
+                   if len(latencies) >= self.min_samples}
+            under_sampled = [model for model in self.models if model not in p95]
+
+        # Models are sorted from the cheapest
+        for model in self.models:
+            if model in under_sampled or p95[model] <= self.max_latency_s:
+                return model
+
+        fastest = min(p95, key=p95.get)
+        logger.info(f"No model of route '{self.name}' meets the latency target of {self.max_latency_s}s "
+                    f"(p95: {p95}). Using the fastest, {fastest}.")
+        return fastest
+
+    def observe(self, record: CallRecord):
+        """Record the latency of a call made on this route. Failed and coalesced calls are not counted."""
+        if record.status != "ok" or record.coalesced or record.model not in self._latencies:
+            return
+        with self._lock:
+            self._latencies[record.model].append(record.latency_s)
+
+
+class ModelRouter:
+    """Selects the model of each call from the routes of an experiment setting. See the module docstring."""
+
+    def __init__(self, routes: Dict[str, Union[str, dict]], default_model: str):
+        self.default_model = default_model
+        # The `default` route, if any, is a route like the others (a model name or a policy)
+        self.routes = {name: Route(name, spec) for name, spec in routes.items()}
+
+    def get_route(self, role: str, phase: str = None) -> Tuple[str, Optional[Route]]:
+        """The name of the route of a call and its `Route`, or None if the default model is used."""
+        for name in ([f"{role}:{phase}"] if phase is not None else []) + [role, "default"]:
+            if name in self.routes:
+                return name, self.routes[name]
+        return role if phase is None else f"{role}:{phase}", None
+
+    def select(self, role: str, phase: str = None) -> Tuple[str, str]:
+        """Returns the route of a call and the model to use."""
+        name, route = self.get_route(role, phase)
+        return name, route.select() if route is not None else self.default_model
+
+    def observe(self, route_name: str, record: CallRecord):
+        route = self.routes.get(route_name)
+        if route is not None:
+            route.observe(record)
+
+
+# Routers by (routes, default model), shared by all the papers of an experiment so that the latencies of the routes
+# accumulate across papers
+_ROUTERS: Dict[Tuple[str, str], ModelRouter] = {}
+_ROUTERS_LOCK = threading.Lock()
+
+
+def get_model_router(global_settings: dict, default_model: str) -> ModelRouter:
+    """The router of the `model_routing` of an experiment setting, created once per process."""
+    routes = global_settings.get("model_routing", {})
+    key = (json.dumps(routes, sort_keys=True), default_model)
+    with _ROUTERS_LOCK:
+        if key not in _ROUTERS:
+            _ROUTERS[key] = ModelRouter(routes, default_model)
+        return _ROUTERS[key]
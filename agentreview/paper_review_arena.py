@@ -1,9 +1,11 @@
 import csv
 import json
 import logging
-from typing import Union
+from typing import Dict, Union
 
 from agentreview.arena import Arena, TooManyInvalidActions
+from agentreview.metrics import metrics_tags
+from agentreview.tracing import span, start_span
 from agentreview.role_descriptions import get_reviewer_description
 from agentreview.utility.utils import format_metareviews
 from .agent import Player
@@ -20,6 +22,9 @@ class PaperReviewArena(Arena):
 
     """
 
+    # The tracing span of the current phase, which spans several steps
+    _phase_span = None
+
     # PaperReviewArena.from_config
     @classmethod
     def from_config(cls, config: Union[str, ArenaConfig]):
@@ -67,6 +72,25 @@ class PaperReviewArena(Arena):
     # PaperReviewArena.step()
     def step(self) -> TimeStep:
         """Take a step in the game: one player takes an action and the environment updates."""
+        phase_index = self.environment.phase_index
+        if self._phase_span is None:
+            self._phase_span = start_span("phase", phase_index=phase_index,
+                                          phase=self.environment.phases[phase_index].get("name"))
+
+        timestep = None
+        try:
+            with span("step", parent=self._phase_span, player=self.environment.get_next_player()):
+                timestep = self._step()
+        finally:
+            # End the phase span when the phase changes, the game ends or the step fails
+            if timestep is None or timestep.terminal or self.environment.phase_index != phase_index:
+                if self._phase_span is not None:
+                    self._phase_span.end()
+                self._phase_span = None
+
+        return timestep
+
+    def _step(self) -> TimeStep:
 
         # if self.environment.phase_index > 4 and self.args.task == "paper_review":
         #     logger.info("Finishing the simulation for Phase I - IV. Please run `python run_paper_decision_cli.py ` for "
@@ -81,33 +105,51 @@ class PaperReviewArena(Arena):
 
         player = self.name_to_player[player_name]  # get the player object
 
-        observation = self.environment.get_observation(
-            player_name
-        )  # get the observation for the player
+        with span("get_observation"):
+            observation = self.environment.get_observation(
+                player_name
+            )  # get the observation for the player
 
         timestep = None
 
-        # try to take an action for a few times
-        for i in range(self.invalid_actions_retry):
+        # Tag the backend calls made in this step for the metrics
+        phase = self.environment.phases[self.environment.phase_index]
+        tags = dict(experiment=getattr(self.args, "experiment_name", None),
+                    paper_id=getattr(self.environment, "paper_id", None),
+                    phase=phase.get("name", self.environment.phase_index))
+
+        # Update reviewer description for rebuttal. The compiled template is looked up once, not on every retry.
+        if self.environment.phase_index == 3 and player.name.startswith("Reviewer"):
+            logging.info("Update reviewers' role_desc for Phase 3 (reviewer_ac_discussion)")
+            reviewer_index = int(player.name.split("Reviewer ")[1])
 
+            # reviewer_index starts from 1, so we need to subtract 1 to get the index of the reviewer in the list
+            player.role_desc = get_reviewer_description(phase="reviewer_ac_discussion",
+                                                        **self.environment.experiment_setting["players"][
+                                                            'Reviewer'][reviewer_index - 1])
 
-            # Update reviewer description for rebuttal
-            if self.environment.phase_index == 3 and player.name.startswith("Reviewer"):
-                logging.info("Update reviewers' role_desc for Phase 3 (reviewer_ac_discussion)")
-                reviewer_index = int(player.name.split("Reviewer ")[1])
+        metareviews_prompt = None
 
-                # reviewer_index starts from 1, so we need to subtract 1 to get the index of the reviewer in the list
+        # try to take an action for a few times
+        for i in range(self.invalid_actions_retry):
 
-                player.role_desc = get_reviewer_description(phase="reviewer_ac_discussion",
-                                                            **self.environment.experiment_setting["players"][
-                                                                'Reviewer'][reviewer_index - 1])
-                
+            if self.environment.phase_index == 5:  # Phase 5 AC Makes Decisions
 
-            elif self.environment.phase_index == 5:  # Phase 5 AC Makes Decisions
+                # The segments replace those of the previous attempt, so the prompt does not grow with the retries
+                if self.environment.ac_decisions:
+                    # Some decisions were salvaged from the previous action. Only ask for the missing ones.
+                    player.set_prompt_segments(**self.get_repair_prompt_segments())
+                else:
+                    if metareviews_prompt is None:
+                        metareviews_prompt = format_metareviews(self.environment.metareviews,
+                                                                self.environment.paper_ids)
+                    player.set_prompt_segments(metareviews=metareviews_prompt, instructions="")
 
-                player.role_desc += format_metareviews(self.environment.metareviews, self.environment.paper_ids)
+            # Routes with a latency policy may pick another model on a retry
+            player.select_model(tags["phase"])
 
-            action = player(observation)  # take an action
+            with metrics_tags(**tags):
+                action = player(observation)  # take an action
 
             if self.environment.check_action(action, player_name):  # action is valid
                 timestep = self.environment.step(
@@ -127,6 +169,29 @@ class PaperReviewArena(Arena):
 
         return timestep
 
+    def get_repair_prompt_segments(self) -> Dict[str, str]:
+        """The metareviews of the papers without an AC decision, and the instructions to decide on them only."""
+        env = self.environment
+        missing_paper_ids = env.missing_paper_ids
+        paper_id2metareview = {int(paper_id): metareview for paper_id, metareview in zip(env.paper_ids,
+                                                                                          env.metareviews)}
+
+        logging.info(f"Asking the AC again for the missing decisions of {len(missing_paper_ids)} papers")
+
+        metareviews = format_metareviews([paper_id2metareview[paper_id] for paper_id in missing_paper_ids],
+                                         missing_paper_ids)
+        instructions = (f"\nYour previous response was incomplete. Your decisions for Paper IDs: "
+                        f"{', '.join(str(paper_id) for paper_id in env.ac_decisions)} have been recorded. "
+                        f"Provide the missing decisions for Paper IDs: "
+                        f"{', '.join(str(paper_id) for paper_id in missing_paper_ids)}, using the same format.")
+
+        if env.ac_scoring_method == "ranking":
+            max_rank = max(env.ac_decisions.values())
+            instructions += (f" Ranks 1 to {max_rank} are already taken. Rank the remaining papers with a willingness "
+                             f"to accept from {max_rank + 1} to {max_rank + len(missing_paper_ids)}.")
+
+        return {"metareviews": metareviews, "instructions": instructions + "\n"}
+
     def save_history(self, path: str):
         """
         Save the history of the game to a file.
@@ -161,16 +226,7 @@ class PaperReviewArena(Arena):
                 writer.writerow(header)
                 writer.writerows(message_rows)
         elif path.endswith(".json"):
-            for message in messages:
-                message_row = {
-                    "agent_name": message.agent_name,
-                    "content": message.content,
-                    "turn": message.turn,
-                    "timestamp": str(message.timestamp),
-                    "visible_to": message.visible_to,
-                    "msg_type": message.msg_type,
-                }
-                message_rows.append(message_row)
+            message_rows = [message.to_dict() for message in messages]
 
             with open(path, "w") as f:
 
@@ -4,12 +4,13 @@ import os
 from pathlib import Path
 from typing import List, Union
 
-from llama_index.readers.file.docs import PDFReader
-
 from agentreview.agent import Player
 from .backends import IntelligenceBackend
 from .config import BackendConfig
+from .dataset.manifest import EXTRACTION_DONE, EXTRACTION_FAILED, get_corpus_manifest
 from .message import Message
+from .prompt_templates import PromptBuilder
+from .tracing import span
 
 
 class AreaChair(Player):
@@ -27,6 +28,24 @@ class AreaChair(Player):
         self.env_type = env_type
         self.role_desc = role_desc
 
+    @property
+    def role_desc(self) -> str:
+        """The system prompt: the role description followed by the segments set by `set_prompt_segments`."""
+        return self.prompt.text
+
+    @role_desc.setter
+    def role_desc(self, role_desc: str):
+        self.base_prompt = PromptBuilder(role=role_desc)
+        self.prompt = self.base_prompt
+
+    def set_prompt_segments(self, **segments: str):
+        """
+        Compose the system prompt from the role description and the given segments (e.g. the metareviews), replacing
+        the segments set previously, so that the prompt of a retry is the same as that of the first attempt.
+        """
+        self.prompt = self.base_prompt.with_segments(**segments)
+        logging.info(f"Prompt of {self.name}: {self.prompt.format_token_counts()}")
+
     def act(self, observation: List[Message]) -> str:
 
         # The author just finished their rebuttals (so last speaker is Author 1).
@@ -56,8 +75,6 @@ class Reviewer(Player):
             global_prompt: str = None,
             **kwargs,
     ):
-        print("kwargs")
-        print(kwargs)
         super().__init__(name, role_desc, backend, global_prompt, **kwargs)
 
     def act(self, observation: List[Message]) -> str:
@@ -86,9 +103,7 @@ class PaperExtractorPlayer(Player):
         self.paper_id = paper_id
         self.paper_decision = paper_decision
         self.conference: str = conference
-        
-        if paper_pdf_path is not None:
-            self.paper_pdf_path = paper_pdf_path
+        self.paper_pdf_path = paper_pdf_path
 
     def act(self, observation: List[Message]) -> str:
         """
@@ -100,18 +115,30 @@ class PaperExtractorPlayer(Player):
         Returns:
             str: The action (response) of the player.
         """
+        manifest = None
         if self.paper_pdf_path is not None:
             logging.info(f"Loading paper from {self.paper_pdf_path} ...")
+            document_path = Path(self.paper_pdf_path)
         else:
             logging.info(f"Loading {self.conference} paper {self.paper_id} ({self.paper_decision}) ...")
+            manifest = get_corpus_manifest(self.args.data_dir, self.conference)
+            pdf_path = manifest.pdf_path(self.paper_id)
+            if pdf_path is None:
+                pdf_path = os.path.join(self.args.data_dir, self.conference, "paper", self.paper_decision,
+                                        f"{self.paper_id}.pdf")
+            document_path = Path(pdf_path)
+
+        # llama_index takes seconds to import, and only the paper extractor needs it
+        from llama_index.readers.file.docs import PDFReader
 
         loader = PDFReader()
-        if self.paper_pdf_path is not None:
-            document_path = Path(self.paper_pdf_path)
-        else:
-            document_path = Path(os.path.join(self.args.data_dir, self.conference, "paper", self.paper_decision,
-                                            f"{self.paper_id}.pdf"))  #
-        documents = loader.load_data(file=document_path)
+        with span("parse_pdf", paper_id=self.paper_id, path=str(document_path)):
+            try:
+                documents = loader.load_data(file=document_path)
+            except Exception as e:
+                if manifest is not None:
+                    manifest.set_extraction_status(self.paper_id, EXTRACTION_FAILED, error=f"{type(e).__name__}: {e}")
+                raise
 
         num_words = 0
         main_contents = "Contents of this paper:\n\n"
@@ -127,7 +154,11 @@ class PaperExtractorPlayer(Player):
             main_contents += text + ' '
             if FLAG:
                 break
-        
-        print(main_contents)
-        
+
+        if manifest is not None:
+            manifest.set_extraction_status(self.paper_id, EXTRACTION_DONE, num_pages=len(documents),
+                                           num_words=num_words)
+
+        logging.debug(f"Extracted {num_words} words from paper {self.paper_id}")
+
         return main_contents
@@ -0,0 +1,206 @@
+"""
+Compiled prompt templates.
+
+Role descriptions depend only on a handful of settings (the role, its characteristics, the phase and the scoring
+method), but are requested for every player of every paper. `compiled_template` turns a function that builds a prompt
+from such settings into a cached one returning an immutable `PromptTemplate`, so that each combination of settings is
+built, and its tokens counted, once per process.
+
+    @compiled_template("reviewer")
+    def get_reviewer_template(is_benign, ..., phase) -> str:
+        ...
+
+    template = get_reviewer_template(True, True, True, phase="reviewer_write_reviews")
+    template.text, template.num_tokens
+
+Prompts that are extended at run time, such as the AC prompt with the metareviews of Phase 5, are composed from
+named segments with a `PromptBuilder`.
+"""
+
+import functools
+import importlib.util
+import inspect
+import math
+from dataclasses import dataclass
+from typing import Callable, Dict, Tuple
+
+is_tiktoken_available = importlib.util.find_spec("tiktoken") is not None
+
+# Encoding used to count the tokens of the templates. Counts are used for budgeting and logging, so the encoding of
+# the model actually used does not need to match exactly.
+DEFAULT_ENCODING = "o200k_base"
+
+# Average number of characters per token of English text, used when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(encoding_name: str):
+    import tiktoken
+
+    return tiktoken.get_encoding(encoding_name)
+
+
+def count_tokens(text: str, encoding_name: str = DEFAULT_ENCODING) -> int:
+    """Number of tokens of a text, or an estimate from its length if tiktoken is not installed."""
+    if is_tiktoken_available:
+        return len(_get_encoding(encoding_name).encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, head_tokens: int, tail_tokens: int, encoding_name: str = DEFAULT_ENCODING,
+                       marker: str = "\n[... {num_omitted} tokens omitted ...]\n") -> str:
+    """
+    Keep the first `head_tokens` and the last `tail_tokens` tokens of a text, replacing the middle by `marker`.
+    Without tiktoken, tokens are approximated by `CHARS_PER_TOKEN` characters.
+    """
+    if is_tiktoken_available:
+        encoding = _get_encoding(encoding_name)
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= head_tokens + tail_tokens:
+            return text
+        head = encoding.decode(tokens[:head_tokens])
+        tail = encoding.decode(tokens[len(tokens) - tail_tokens:]) if tail_tokens else ""
+        num_omitted = len(tokens) - head_tokens - tail_tokens
+
+    else:
+        head_chars, tail_chars = head_tokens * CHARS_PER_TOKEN, tail_tokens * CHARS_PER_TOKEN
+        if len(text) <= head_chars + tail_chars:
+            return text
+        head = text[:head_chars]
+        tail = text[len(text) - tail_chars:] if tail_chars else ""
+        num_omitted = math.ceil((len(text) - head_chars - tail_chars) / CHARS_PER_TOKEN)
+
+    return head + marker.format(num_omitted=num_omitted) + tail
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    A compiled prompt.
+
+    Attributes:
+        role (str): The role the prompt is written for, e.g. "reviewer" or "ac".
+        settings (Tuple): The (name, value) pairs of the settings the prompt was compiled from.
+        text (str): The prompt.
+        num_tokens (int): The number of tokens of the prompt, see `count_tokens`.
+    """
+
+    role: str
+    settings: Tuple[Tuple[str, object], ...]
+    text: str
+    num_tokens: int
+
+    def __str__(self):
+        return self.text
+
+
+def compiled_template(role: str) -> Callable[[Callable[..., str]], Callable[..., PromptTemplate]]:
+    """
+    Decorator turning a function that builds a prompt into a function returning a cached `PromptTemplate`.
+
+    Arguments are bound to the signature of the function (with defaults applied) before the cache lookup, so that
+    positional and keyword calls with the same settings share the compiled template. All arguments must be hashable.
+    """
+
+    def decorator(build: Callable[..., str]) -> Callable[..., PromptTemplate]:
+        signature = inspect.signature(build)
+
+        @functools.lru_cache(maxsize=None)
+        def compile_template(settings: Tuple[Tuple[str, object], ...]) -> PromptTemplate:
+            text = build(**dict(settings))
+            return PromptTemplate(role=role, settings=settings, text=text, num_tokens=count_tokens(text))
+
+        # Calls seen so far, so that repeated calls skip binding the arguments to the signature
+        templates_by_call = {}
+
+        @functools.wraps(build)
+        def get_template(*args, **kwargs) -> PromptTemplate:
+            call_key = (args, tuple(sorted(kwargs.items())))
+            template = templates_by_call.get(call_key)
+            if template is None:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                template = templates_by_call[call_key] = compile_template(tuple(bound.arguments.items()))
+            return template
+
+        get_template.cache_info = compile_template.cache_info
+
+        def cache_clear():
+            templates_by_call.clear()
+            compile_template.cache_clear()
+
+        get_template.cache_clear = cache_clear
+        return get_template
+
+    return decorator
+
+
+@dataclass(frozen=True)
+class PromptSegment:
+    """A named part of a prompt, with its token count."""
+
+    name: str
+    text: str
+    num_tokens: int
+
+    @classmethod
+    def from_text(cls, name: str, text) -> "PromptSegment":
+        if isinstance(text, PromptTemplate):
+            return cls(name=name, text=text.text, num_tokens=text.num_tokens)
+        return cls(name=name, text=text, num_tokens=count_tokens(text))
+
+
+class PromptBuilder:
+    """
+    An immutable prompt made of named segments, concatenated in order.
+
+    Segments are replaced by name rather than appended to, so that a prompt built again for a retry is the same as
+    the first one:
+
+        base = PromptBuilder(role=role_desc)
+        prompt = base.with_segments(metareviews=format_metareviews(...))
+        prompt.text, prompt.token_counts()
+    """
+
+    __slots__ = ("segments", "_text")
+
+    def __init__(self, segments: Tuple[PromptSegment, ...] = (), **texts):
+        segments = tuple(segments) + tuple(PromptSegment.from_text(name, text) for name, text in texts.items())
+        object.__setattr__(self, "segments", segments)
+        object.__setattr__(self, "_text", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable. Use `with_segments` instead.")
+
+    def with_segments(self, **texts) -> "PromptBuilder":
+        """A new prompt in which the given segments replace those of the same name, or are added at the end."""
+        new_segments = {name: PromptSegment.from_text(name, text) for name, text in texts.items()}
+        segments = [new_segments.pop(segment.name, segment) for segment in self.segments]
+        return PromptBuilder(tuple(segments) + tuple(new_segments.values()))
+
+    def without_segments(self, *names: str) -> "PromptBuilder":
+        return PromptBuilder(tuple(segment for segment in self.segments if segment.name not in names))
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            object.__setattr__(self, "_text", "".join(segment.text for segment in self.segments))
+        return self._text
+
+    @property
+    def num_tokens(self) -> int:
+        return sum(segment.num_tokens for segment in self.segments)
+
+    def token_counts(self) -> Dict[str, int]:
+        return {segment.name: segment.num_tokens for segment in self.segments}
+
+    def format_token_counts(self) -> str:
+        counts = ", ".join(f"{name}={num_tokens}" for name, num_tokens in self.token_counts().items())
+        return f"{counts} (total {self.num_tokens} tokens)"
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"PromptBuilder({self.format_token_counts()})"
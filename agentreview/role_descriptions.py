@@ -1,12 +1,12 @@
+import math
 import os
 import sys
 
-import numpy as np
-
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from agentreview import const
 from agentreview.config import AgentConfig
+from agentreview.prompt_templates import compiled_template
 
 PLAYER_BACKEND = {
     "backend_type": "openai-chat",
@@ -89,9 +89,10 @@ def get_instructions_for_overall_scores(author_type: str) -> str:
     return instruction
 
 
-def get_reviewer_description(is_benign: bool = None, is_knowledgeable: bool = None, is_responsible: bool = None,
-                             provides_numeric_rating:
-                             bool = True, knows_authors: bool = False, phase: str = "reviewer_write_reviews"):
+@compiled_template("reviewer")
+def get_reviewer_template(is_benign: bool = None, is_knowledgeable: bool = None, is_responsible: bool = None,
+                          provides_numeric_rating:
+                          bool = True, knows_authors: bool = False, phase: str = "reviewer_write_reviews") -> str:
     assert phase in ["reviewer_write_reviews", 'reviewer_ac_discussion']
     assert provides_numeric_rating in [True, False]
     bio = ("You are a reviewer. You write peer review of academic papers by evaluating their technical "
@@ -244,7 +245,15 @@ def get_reviewer_description(is_benign: bool = None, is_knowledgeable: bool = No
     return bio
 
 
-def get_author_description() -> str:
+def get_reviewer_description(is_benign: bool = None, is_knowledgeable: bool = None, is_responsible: bool = None,
+                             provides_numeric_rating:
+                             bool = True, knows_authors: bool = False, phase: str = "reviewer_write_reviews") -> str:
+    return get_reviewer_template(is_benign, is_knowledgeable, is_responsible, provides_numeric_rating, knows_authors,
+                                 phase).text
+
+
+@compiled_template("author")
+def get_author_template() -> str:
     bio = ("You are an author. You write research papers and submit them to conferences. During the rebuttal phase, "
            "you carefully read the reviews from the reviewers and respond to each of them.\n\n")
 
@@ -258,9 +267,14 @@ def get_author_description() -> str:
     return bio
 
 
-def get_ac_description(area_chair_type: str, phase: str, scoring_method: str, num_papers_per_area_chair: int,
-                       knows_authors: bool = False, **kwargs) -> (
-        str):
+def get_author_description() -> str:
+    return get_author_template().text
+
+
+@compiled_template("ac")
+def get_ac_template(area_chair_type: str, phase: str, scoring_method: str, num_papers_per_area_chair: int,
+                    knows_authors: bool = False, acceptance_rate: float = 0.32,
+                    structured_output: bool = False, num_papers_to_accept: int = None) -> str:
     """
     Note: We assume that the AC definitely provides a score so that the papers can be compared
     Args:
@@ -268,10 +282,13 @@ def get_ac_description(area_chair_type: str, phase: str, scoring_method: str, nu
         scoring_method (str): The method used by the area chair to make the final decision. Must be either of
             "recommendation": directly make a recommendation (e.g. "Accept", "Reject") for each paper
             "ranking": rank the papers using your willingness to accept
+        acceptance_rate (float): The fraction of papers the area chair should accept (Phase 5 only).
+        structured_output (bool): If True, ask for the decisions as a JSON object (Phase 5 only).
+        num_papers_to_accept (int): The number of papers the area chair should accept (Phase 5 only). Defaults to
+            `floor(num_papers_per_area_chair * acceptance_rate)`.
 
     """
 
-    acceptance_rate = kwargs.get('acceptance_rate', 0.32)
     bio = "You are a very knowledgeable and experienced area chair in a top-tier machine learning conference. "
 
     if phase == "ac_write_metareviews":
@@ -304,7 +321,11 @@ def get_ac_description(area_chair_type: str, phase: str, scoring_method: str, nu
         bio += "```\n\n"
 
     elif phase == "ac_make_decisions":
-        max_num_accepted_papers = int(np.floor(num_papers_per_area_chair * acceptance_rate))
+        if num_papers_to_accept is not None:
+            # The quota of a packed batch, see `pack_ac_batches`
+            max_num_accepted_papers = num_papers_to_accept
+        else:
+            max_num_accepted_papers = math.floor(num_papers_per_area_chair * acceptance_rate)
 
         # The area chair usually accept more papers than s/he should
         # So we use a ranking approach
@@ -357,6 +378,12 @@ def get_ac_description(area_chair_type: str, phase: str, scoring_method: str, nu
         else:
             raise NotImplementedError(f"Unknown scoring method: {scoring_method}")
 
+        if structured_output:
+            field = AC_DECISION_FIELDS[scoring_method]
+            value = '"Accept" or "Reject"' if scoring_method == "recommendation" else "..."
+            bio += (f"Instead of the format above, respond with a JSON object only: "
+                    f'{{"decisions": [{{"paper_id": ..., "{field}": {value}}}, ...]}}\n\n')
+
 
     else:
         raise ValueError(f"Invalid phase for an area chair: {phase}")
@@ -403,6 +430,15 @@ def get_ac_description(area_chair_type: str, phase: str, scoring_method: str, nu
     return bio
 
 
+def get_ac_description(area_chair_type: str, phase: str, scoring_method: str, num_papers_per_area_chair: int,
+                       knows_authors: bool = False, **kwargs) -> str:
+    """See `get_ac_template`. Other keyword arguments (e.g. the global settings) are ignored."""
+    return get_ac_template(area_chair_type, phase, scoring_method, num_papers_per_area_chair, knows_authors,
+                           acceptance_rate=kwargs.get('acceptance_rate', 0.32),
+                           structured_output=bool(kwargs.get("structured_output", False)),
+                           num_papers_to_accept=kwargs.get("num_papers_to_accept")).text
+
+
 def get_reviewer_player_config(reviewer_index: int, is_benign: bool, is_knowledgeable: bool, is_responsible: bool,
                                global_settings: dict) -> dict:
     """
@@ -471,6 +507,46 @@ def get_paper_extractor_config(**kwargs) -> dict:
     return AgentConfig(**paper_extractor)
 
 
+# The JSON field holding the decision of each paper when the AC uses structured outputs
+AC_DECISION_FIELDS = {
+    "recommendation": "decision",
+    "ranking": "willingness_to_accept",
+}
+
+
+def get_ac_decision_response_format(scoring_method: str) -> dict:
+    """The `response_format` (a JSON schema) of the AC decisions for the OpenAI chat completions API."""
+    field = AC_DECISION_FIELDS[scoring_method]
+    if scoring_method == "recommendation":
+        value_schema = {"type": "string", "enum": ["Accept", "Reject"]}
+    else:
+        value_schema = {"type": "integer"}
+
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "ac_decisions",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "decisions": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {"paper_id": {"type": "integer"}, field: value_schema},
+                            "required": ["paper_id", field],
+                            "additionalProperties": False,
+                        },
+                    },
+                },
+                "required": ["decisions"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
 def get_ac_config(**kwargs) -> dict:
     """
 
@@ -486,6 +562,8 @@ def get_ac_config(**kwargs) -> dict:
         paper.
 
         scoring_method (str): Scoring method for the area chair.
+        structured_output (bool): If True, the AC returns its decisions as JSON (Phase 5 only).
+        num_papers_to_accept (int): If set, the number of papers the AC is told to accept (Phase 5 only).
 
     Return
         player (dict): A player object that represents the area chair.
@@ -516,4 +594,7 @@ def get_ac_config(**kwargs) -> dict:
         "env_type": env_type,
     }
 
+    if phase == "ac_make_decisions" and kwargs.get("structured_output", False):
+        area_chair["backend"]["response_format"] = get_ac_decision_response_format(kwargs["scoring_method"])
+
     return AgentConfig(**area_chair)
@@ -0,0 +1,199 @@
+"""
+Hierarchical tracing of a run: sweep -> paper arena -> phase -> step -> backend request -> attempt.
+
+Spans are recorded in memory and exported in the Chrome Trace Event format, which can be opened with
+https://ui.perfetto.dev or chrome://tracing. Tracing is disabled by default, in which case `span` and `traced`
+cost a single attribute lookup.
+
+    configure_tracing()
+    with span("sweep", experiment="BASELINE"):
+        ...
+    export_trace("outputs/trace.json")
+
+The current span is tracked with `contextvars`, so spans opened in the same thread (or task) nest automatically.
+Spans that do not fit a `with` block, such as a phase spanning several calls to `Arena.step`, can be opened with
+`start_span` and closed with `Span.end`.
+"""
+
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+_CURRENT_SPAN: contextvars.ContextVar = contextvars.ContextVar("agentreview_current_span", default=None)
+
+
+class Span:
+    """A timed operation. Its attributes are shown in the `args` of the trace event."""
+
+    __slots__ = ("name", "category", "attributes", "span_id", "parent_id", "start", "thread_id", "_tracer", "_ended")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, parent: Optional["Span"], attributes: dict):
+        self._tracer = tracer
+        self._ended = False
+        self.name = name
+        self.category = category
+        self.attributes = attributes
+        self.span_id = next(tracer.span_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter()
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self):
+        if not self._ended:
+            self._ended = True
+            self._tracer.record(self, time.perf_counter())
+
+
+class Tracer:
+    """Collects finished spans and exports them as Chrome trace events."""
+
+    def __init__(self, max_events: int = 1_000_000):
+        self.enabled = False
+        self.max_events = max_events
+        self.span_ids = itertools.count(1)
+        self._events: List[dict] = []
+        self._thread_ids = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._num_dropped = 0
+
+    def _tid(self, thread_id: int) -> int:
+        # Small, stable thread IDs make the trace viewer easier to read
+        if thread_id not in self._thread_ids:
+            self._thread_ids[thread_id] = len(self._thread_ids) + 1
+        return self._thread_ids[thread_id]
+
+    def record(self, span: Span, end: float):
+        args = {key: value if isinstance(value, (int, float, bool, str)) or value is None else str(value)
+                for key, value in span.attributes.items()}
+        args["span_id"] = span.span_id
+        args["parent_id"] = span.parent_id
+
+        with self._lock:
+            if len(self._events) >= self.max_events:
+                self._num_dropped += 1
+                return
+            self._events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": (span.start - self._origin) * 1e6,
+                "dur": (end - span.start) * 1e6,
+                "pid": os.getpid(),
+                "tid": self._tid(span.thread_id),
+                "args": args,
+            })
+
+    def reset(self):
+        with self._lock:
+            self._events = []
+            self._thread_ids = {}
+            self._num_dropped = 0
+            self._origin = time.perf_counter()
+
+    def export(self, path: str):
+        """Write the spans recorded so far to `path` in the Chrome Trace Event format."""
+        with self._lock:
+            events = list(self._events)
+            thread_ids = dict(self._thread_ids)
+            num_dropped = self._num_dropped
+
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                     "args": {"name": thread_names.get(ident, f"thread-{tid}")}}
+                    for ident, tid in thread_ids.items()]
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+
+        if num_dropped:
+            logger.warning(f"Dropped {num_dropped} spans after reaching the limit of {self.max_events} events.")
+        logger.info(f"Trace with {len(events)} spans saved to {path}")
+
+
+_TRACER = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _TRACER
+
+
+def configure_tracing(enabled: bool = True) -> Tracer:
+    _TRACER.enabled = enabled
+    return _TRACER
+
+
+def export_trace(path: str):
+    _TRACER.export(path)
+
+
+def current_span() -> Optional[Span]:
+    return _CURRENT_SPAN.get()
+
+
+def start_span(name: str, category: str = "agentreview", parent: Optional[Span] = None,
+               **attributes) -> Optional[Span]:
+    """
+    Start a span that is ended explicitly with `Span.end`. The span does not become the current span.
+
+    Returns None if tracing is disabled.
+    """
+    if not _TRACER.enabled:
+        return None
+    return Span(_TRACER, name, category, parent if parent is not None else _CURRENT_SPAN.get(), attributes)
+
+
+@contextmanager
+def span(name: str, category: str = "agentreview", parent: Optional[Span] = None, **attributes):
+    """
+    Trace the enclosed block. The span is the parent of the spans opened inside the block.
+
+    args:
+        name: the name of the span
+        category: the category of the span, used to filter the events in the trace viewer
+        parent: the parent span. Defaults to the current span.
+        attributes: attributes shown with the span in the trace viewer
+    """
+    if not _TRACER.enabled:
+        yield None
+        return
+
+    current = Span(_TRACER, name, category, parent if parent is not None else _CURRENT_SPAN.get(), attributes)
+    token = _CURRENT_SPAN.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_attribute("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _CURRENT_SPAN.reset(token)
+        current.end()
+
+
+def traced(name: str, category: str = "agentreview"):
+    """Decorator that traces each call of the decorated function."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _TRACER.enabled:
+                return func(*args, **kwargs)
+            with span(name, category=category):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,14 +1,11 @@
 import logging
 import os
 import os.path as osp
+import re
 from typing import Union
 
 from colorama import Fore
 from colorama import Style as CRStyle
-from prompt_toolkit import prompt
-from prompt_toolkit.completion import WordCompleter
-from prompt_toolkit.styles import Style
-from rich.console import Console
 
 from agentreview.utility.utils import get_rebuttal_dir, load_llm_ac_decisions, \
     save_llm_ac_decisions
@@ -56,8 +53,20 @@ except ImportError:
 
 MAX_STEPS = 20  # We should not need this parameter for paper reviews anyway
 
-# Set logging level to ERROR
-logging.getLogger().setLevel(logging.ERROR)
+logger = logging.getLogger(__name__)
+
+
+class PlainConsole:
+    """
+    A stand-in for `rich.console.Console` in non-interactive (batch) runs, so that rich and prompt_toolkit are only
+    imported for interactive sessions. The output goes through the logs, so it is written by the background writer of
+    `setup_logging`, truncated and silenced with `--quiet`.
+    """
+
+    MARKUP = re.compile(r"\[/\]|\[/?(?:bold|italic|underline|red|green|blue)(?: (?:bold|italic|underline|red|green|blue))*]")
+
+    def print(self, *objects, style: str = None, **kwargs):
+        logger.info(" ".join(self.MARKUP.sub("", str(obj)) for obj in objects))
 
 
 class ArenaCLI:
@@ -76,7 +85,17 @@ class ArenaCLI:
 
         args = self.args
 
-        console = Console()
+        if interactive:
+            from prompt_toolkit import prompt
+            from prompt_toolkit.completion import WordCompleter
+            from prompt_toolkit.styles import Style
+            from rich.console import Console
+
+            console = Console()
+            # Only the errors are logged, so that they do not interleave with the conversation
+            logging.getLogger().setLevel(logging.ERROR)
+        else:
+            console = PlainConsole()
         # Print ascii art
         timestep = self.arena.reset()
         console.print("🎓AgentReview Initialized!", style="bold green")
@@ -89,7 +108,7 @@ class ArenaCLI:
         player_colors = visible_colors[:num_players]  # sample different colors for players
         name_to_color = dict(zip(env.player_names, player_colors))
 
-        print("name_to_color: ", name_to_color)
+        logger.debug(f"name_to_color: {name_to_color}")
         # System and Moderator messages are printed in red
         name_to_color["System"] = "red"
         name_to_color["Moderator"] = "red"
@@ -201,8 +220,7 @@ class ArenaCLI:
                     raise e  # cannot recover from this error in non-interactive mode
             except TooManyInvalidActions as e:
                 # Print the error message
-                # console.print(f"Too many invalid actions: {e}", style="bold red")
-                print(Fore.RED + "This will be red text" + CRStyle.RESET_ALL)
+                console.print(f"Too many invalid actions: {e}", style="bold red")
                 break
 
             # The messages that are not yet logged
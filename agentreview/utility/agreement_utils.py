@@ -0,0 +1,229 @@
+"""
+Agreement statistics between AC decisions, with bootstrap confidence intervals.
+
+Decisions are boolean arrays (True for accept) aligned on paper IDs, such as those returned by
+`load_llm_ac_decisions_as_array` and `load_llm_ac_decisions_as_matrix`. Resamples are drawn in chunks as
+(chunk_size, num_papers) arrays of indices, and every statistic is computed along the last axis, so that thousands of
+resamples take well under a second for a few thousand papers.
+
+    decisions, paper_ids = load_llm_ac_decisions_as_array(...)
+    results = compare_with_ground_truth(decisions, paper_ids, paper_id2decision)
+    print(format_agreement(results))
+"""
+
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass
+from itertools import combinations
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from agentreview.utility.utils import get_model_name_short, load_llm_ac_decisions_as_array
+
+logger = logging.getLogger(__name__)
+
+# Bump when the statistics change, to invalidate the cached results
+AGREEMENT_CACHE_VERSION = 1
+
+
+def accuracy(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Fraction of papers with the same decision, along the last axis."""
+    return np.mean(a == b, axis=-1)
+
+
+def cohen_kappa(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Cohen's kappa of two binary raters, along the last axis. NaN if the chance agreement is 1."""
+    observed = np.mean(a == b, axis=-1)
+    accept_rate_a, accept_rate_b = np.mean(a, axis=-1), np.mean(b, axis=-1)
+    expected = accept_rate_a * accept_rate_b + (1 - accept_rate_a) * (1 - accept_rate_b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(expected < 1, (observed - expected) / (1 - expected), np.nan)
+
+
+def jaccard(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Jaccard index of the sets of accepted papers, along the last axis. NaN if neither accepts any paper."""
+    intersection = np.sum(a & b, axis=-1)
+    union = np.sum(a | b, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(union > 0, intersection / union, np.nan)
+
+
+STATISTICS = {
+    "accuracy": accuracy,
+    "cohen_kappa": cohen_kappa,
+    "jaccard": jaccard,
+}
+
+
+@dataclass
+class AgreementResult:
+    """A statistic on the full sample, with its bootstrap standard error and percentile confidence interval."""
+
+    statistic: str
+    estimate: float
+    ci_low: float
+    ci_high: float
+    std: float
+    confidence: float
+    num_resamples: int
+    num_papers: int
+
+
+def bootstrap_agreement(a: np.ndarray, b: np.ndarray, statistics: Sequence[str] = tuple(STATISTICS),
+                        num_resamples: int = 10000, confidence: float = 0.95, seed: int = 0,
+                        chunk_size: int = 1024) -> Dict[str, AgreementResult]:
+    """
+    Compute agreement statistics between two aligned decision arrays, with bootstrap confidence intervals.
+
+    args:
+        a, b: boolean arrays of decisions on the same papers
+        statistics: names of the statistics in `STATISTICS`
+        num_resamples: number of bootstrap resamples
+        confidence: coverage of the percentile confidence intervals
+        seed: seed of the resampling. Pairs of arrays of the same length compared with the same seed are evaluated
+            on the same resamples (paired bootstrap).
+        chunk_size: number of resamples drawn and evaluated at once, which bounds the memory to about
+            10 * chunk_size * num_papers bytes
+    """
+    a, b = np.asarray(a, dtype=bool), np.asarray(b, dtype=bool)
+    if a.shape != b.shape or a.ndim != 1:
+        raise ValueError(f"Expected two 1-D arrays of the same length, got shapes {a.shape} and {b.shape}")
+    if len(a) == 0:
+        raise ValueError("Cannot compute agreement statistics without papers")
+
+    rng = np.random.default_rng(seed)
+    samples = {name: np.empty(num_resamples) for name in statistics}
+
+    for start in range(0, num_resamples, chunk_size):
+        size = min(chunk_size, num_resamples - start)
+        indices = rng.integers(0, len(a), size=(size, len(a)))
+        a_resampled, b_resampled = a[indices], b[indices]
+        for name in statistics:
+            samples[name][start:start + size] = STATISTICS[name](a_resampled, b_resampled)
+
+    alpha = (1 - confidence) / 2
+    results = {}
+    for name in statistics:
+        values = samples[name]
+
+        # Resamples where the statistic is undefined (e.g. no accepted paper for Jaccard) are left out
+        if np.all(np.isnan(values)):
+            ci_low = ci_high = std = float("nan")
+        else:
+            ci_low, ci_high = np.nanquantile(values, [alpha, 1 - alpha])
+            std = np.nanstd(values)
+
+        results[name] = AgreementResult(
+            statistic=name,
+            estimate=float(STATISTICS[name](a, b)),
+            ci_low=float(ci_low),
+            ci_high=float(ci_high),
+            std=float(std),
+            confidence=confidence,
+            num_resamples=num_resamples,
+            num_papers=len(a),
+        )
+    return results
+
+
+def get_ground_truth_decisions(paper_ids: np.ndarray, paper_id2decision: Dict[int, str]) -> np.ndarray:
+    """Whether each paper was accepted at the conference, from the mapping of `get_paper_decision_mapping`."""
+    return np.array([paper_id2decision[int(paper_id)].startswith("Accept") for paper_id in paper_ids], dtype=bool)
+
+
+def compare_with_ground_truth(decisions: np.ndarray, paper_ids: np.ndarray, paper_id2decision: Dict[int, str],
+                              **kwargs) -> Dict[str, AgreementResult]:
+    """Agreement between the AC decisions and the decisions at the conference. See `bootstrap_agreement`."""
+    known = np.array([int(paper_id) in paper_id2decision for paper_id in paper_ids], dtype=bool)
+    if not known.all():
+        logger.warning(f"Ignoring {np.sum(~known)} papers without a ground-truth decision")
+
+    ground_truth = get_ground_truth_decisions(np.asarray(paper_ids)[known], paper_id2decision)
+    return bootstrap_agreement(np.asarray(decisions)[known], ground_truth, **kwargs)
+
+
+def compare_experiments(matrix: np.ndarray, experiment_names: List[str], num_resamples: int = 10000,
+                        seed: int = 0, **kwargs) -> Dict[Tuple[str, str], Dict[str, AgreementResult]]:
+    """
+    Pairwise agreement between the experiments (rows) of a decision matrix from `load_llm_ac_decisions_as_matrix`
+    with `join='inner'`. All pairs are evaluated on the same resamples.
+    """
+    matrix = np.asarray(matrix)
+    if matrix.dtype != bool:
+        raise ValueError("Expected a boolean matrix. Use join='inner' to keep the papers decided in every experiment.")
+
+    return {(experiment_names[i], experiment_names[j]):
+                bootstrap_agreement(matrix[i], matrix[j], num_resamples=num_resamples, seed=seed, **kwargs)
+            for i, j in combinations(range(len(experiment_names)), 2)}
+
+
+def get_agreement_cache_path(output_dir: str, conference: str, model_name: str, ac_scoring_method: str,
+                             experiment_name: str) -> str:
+    return os.path.join(output_dir, "agreement", conference, get_model_name_short(model_name),
+                        f"agreement_thru_{ac_scoring_method}", f"agreement_{experiment_name}.json")
+
+
+def get_agreement_with_ground_truth(
+    output_dir: str,
+    conference: str,
+    model_name: str,
+    ac_scoring_method: str,
+    experiment_name: str,
+    acceptance_rate: float,
+    num_papers_per_area_chair: int,
+    paper_id2decision: Dict[int, str],
+    num_resamples: int = 10000,
+    confidence: float = 0.95,
+    seed: int = 0,
+    use_cache: bool = True,
+) -> Dict[str, AgreementResult]:
+    """
+    Agreement between the AC decisions of an experiment and the ground truth, cached per (experiment, model, scoring
+    method) in `{output_dir}/agreement/`.
+
+    The cache is keyed by a hash of the decisions, the ground truth and the bootstrap parameters, so it is
+    recomputed when any of them changes.
+    """
+    decisions, paper_ids = load_llm_ac_decisions_as_array(
+        output_dir=output_dir, experiment_name=experiment_name, ac_scoring_method=ac_scoring_method,
+        acceptance_rate=acceptance_rate, conference=conference, model_name=model_name,
+        num_papers_per_area_chair=num_papers_per_area_chair)
+
+    ground_truth = [paper_id2decision.get(int(paper_id)) for paper_id in paper_ids]
+    key = hashlib.sha256(json.dumps([AGREEMENT_CACHE_VERSION, decisions.tolist(), paper_ids.tolist(), ground_truth,
+                                     num_resamples, confidence, seed]).encode("utf-8")).hexdigest()
+
+    path = get_agreement_cache_path(output_dir, conference, model_name, ac_scoring_method, experiment_name)
+    if use_cache and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return {name: AgreementResult(**result) for name, result in cached["results"].items()}
+
+    results = compare_with_ground_truth(decisions, paper_ids, paper_id2decision, num_resamples=num_resamples,
+                                        confidence=confidence, seed=seed)
+
+    if use_cache:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "results": {name: asdict(result) for name, result in results.items()}}, f,
+                      indent=2)
+
+    return results
+
+
+def format_agreement(results: Dict, title: str = "Agreement") -> str:
+    """Render the results of `compare_with_ground_truth` or `compare_experiments` as a text table."""
+    if results and all(isinstance(value, AgreementResult) for value in results.values()):
+        results = {title: results}
+
+    lines = [f"{'':<40} {'statistic':<12} {'estimate':>9} {'CI':>19} {'n':>6}"]
+    for name, stats in results.items():
+        label = " vs ".join(name) if isinstance(name, tuple) else str(name)
+        for result in stats.values():
+            lines.append(f"{label:<40} {result.statistic:<12} {result.estimate:>9.3f} "
+                         f"{f'[{result.ci_low:.3f}, {result.ci_high:.3f}]':>19} {result.num_papers:>6}")
+    return "\n".join(lines)
@@ -1,13 +1,131 @@
+import importlib
+import importlib.util
 import logging
 import os
+import threading
+from typing import Dict, Tuple
 
-import openai
+logger = logging.getLogger(__name__)
 
-logging.basicConfig(level=logging.INFO)
+# HTTP/2 needs the optional `h2` package
+is_h2_available = importlib.util.find_spec("h2") is not None
+
+# Connection pool of each client. All the players of all the arenas of the process share the clients, so the pool must
+# hold a connection per concurrent request.
+HTTP_CLIENT_SETTINGS = {
+    "max_connections": 256,
+    "max_keepalive_connections": 64,
+    # Idle connections are kept this long (in seconds) before being closed
+    "keepalive_expiry": 120.0,
+    "http2": True,
+    "connect_timeout": 10.0,
+    "timeout": 600.0,
+}
+
+# Clients by (client type, endpoint, API version)
+_CLIENTS: Dict[Tuple[str, str, str], object] = {}
+_POOL_STATS: Dict[Tuple[str, str, str], "HTTPPoolStats"] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+class HTTPPoolStats:
+    """
+    Counts of the requests and of the connections opened by an HTTP client, from the trace events of its transport
+    (httpcore, or httpcore2 for httpx2). A pool that works well opens few connections (and TLS handshakes) for many
+    requests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.connection_errors = 0
+
+    def _increment(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self._increment("connections_opened")
+        elif event_name == "connection.start_tls.complete":
+            self._increment("tls_handshakes")
+        elif event_name == "connection.connect_tcp.failed":
+            self._increment("connection_errors")
+
+    def on_request(self, request):
+        """httpx request hook: count the request, and trace its connection events."""
+        self._increment("requests")
+        request.extensions["trace"] = self.trace
+
+    def to_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "connections_opened": self.connections_opened,
+                    "tls_handshakes": self.tls_handshakes, "connection_errors": self.connection_errors}
+
+
+def configure_http_clients(**settings):
+    """Change the `HTTP_CLIENT_SETTINGS` of the clients created from now on."""
+    unknown = set(settings) - set(HTTP_CLIENT_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown HTTP client settings: {sorted(unknown)}")
+    with _CLIENTS_LOCK:
+        HTTP_CLIENT_SETTINGS.update(settings)
+
+
+def _get_http_module():
+    """
+    The httpx-compatible module the OpenAI SDK is built on (`httpx` or, for recent versions, `httpx2`), and its client
+    class. None if it cannot be found.
+    """
+    import openai
+
+    client_cls = getattr(openai, "DefaultHttpxClient", None)
+    if client_cls is not None:
+        # The SDK subclasses the client of its HTTP library, e.g. `httpx2.Client`
+        base_cls = next((cls for cls in client_cls.__mro__[1:] if cls.__name__ == "Client"), None)
+        if base_cls is not None:
+            return importlib.import_module(base_cls.__module__.split(".")[0]), client_cls
+
+    try:
+        import httpx
+    except ImportError:
+        return None
+    return httpx, client_cls or httpx.Client
+
+
+def _create_http_client(stats: HTTPPoolStats):
+    """
+    An HTTP client with the pool of `HTTP_CLIENT_SETTINGS`, keeping the defaults of the OpenAI SDK. None (the default
+    client of the SDK) if the HTTP library of the SDK cannot be found.
+    """
+    http_module = _get_http_module()
+    if http_module is None:
+        logger.warning("Could not find the HTTP library of the OpenAI SDK. Using its default HTTP client, without the "
+                       "pool settings and statistics.")
+        return None
+    http, client_cls = http_module
+
+    settings = dict(HTTP_CLIENT_SETTINGS)
+    http2 = settings["http2"] and is_h2_available
+    if settings["http2"] and not is_h2_available:
+        logger.info("HTTP/2 is disabled because the `h2` package is not installed")
+
+    return client_cls(
+        limits=http.Limits(max_connections=settings["max_connections"],
+                           max_keepalive_connections=settings["max_keepalive_connections"],
+                           keepalive_expiry=settings["keepalive_expiry"]),
+        timeout=http.Timeout(settings["timeout"], connect=settings["connect_timeout"]),
+        http2=http2,
+        event_hooks={"request": [stats.on_request]},
+    )
 
 
 def get_openai_client(client_type: str):
     """
+    The OpenAI client of `client_type`, shared by all the backends of the process. One client (and connection pool) is
+    created per (client type, endpoint, API version), see `HTTP_CLIENT_SETTINGS`.
 
     Refer to [this page](https://platform.openai.com/docs/models) for authentication using OpenAI.
     Refer to [this page](https://learn.microsoft.com/en-us/azure/ai-services/openai/how-to/switching-endpoints) for
@@ -20,9 +138,7 @@ def get_openai_client(client_type: str):
         os.environ['OPENAI_API_VERSION'] = "2023-05-15"
 
     if client_type == "openai":
-        client = openai.OpenAI(
-            api_key=os.environ['OPENAI_API_KEY']
-        )
+        endpoint = os.environ.get('OPENAI_BASE_URL', "https://api.openai.com/v1")
 
     elif client_type == "azure_openai":
         endpoint: str = os.environ['AZURE_ENDPOINT']
@@ -31,14 +147,58 @@ def get_openai_client(client_type: str):
             endpoint = f"https://{endpoint}.openai.azure.com"
 
         os.environ['AZURE_ENDPOINT'] = endpoint
-        
-        client = openai.AzureOpenAI(
-            api_key=os.environ['AZURE_OPENAI_KEY'],
-            azure_endpoint=os.environ['AZURE_ENDPOINT'],  # f"https://YOUR_END_POINT.openai.azure.com"
-            azure_deployment=os.environ['AZURE_DEPLOYMENT']
-        )
 
     else:
         raise NotImplementedError
 
-    return client
+    key = (client_type, endpoint, os.environ['OPENAI_API_VERSION'])
+
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is not None:
+            return client
+
+        import openai
+
+        stats = HTTPPoolStats()
+        http_client = _create_http_client(stats)
+
+        if client_type == "openai":
+            client = openai.OpenAI(
+                api_key=os.environ['OPENAI_API_KEY'],
+                max_retries=0,  # Retries are handled by the backends, see `backends/resilience.py`
+                http_client=http_client,
+            )
+
+        else:
+            client = openai.AzureOpenAI(
+                api_key=os.environ['AZURE_OPENAI_KEY'],
+                azure_endpoint=os.environ['AZURE_ENDPOINT'],  # f"https://YOUR_END_POINT.openai.azure.com"
+                azure_deployment=os.environ['AZURE_DEPLOYMENT'],
+                max_retries=0,  # Retries are handled by the backends, see `backends/resilience.py`
+                http_client=http_client,
+            )
+
+        _CLIENTS[key] = client
+        if http_client is not None:
+            _POOL_STATS[key] = stats
+        logger.info(f"Created the {client_type} client of {endpoint} (API version {key[2]})")
+        return client
+
+
+def get_http_pool_stats() -> Dict[str, Dict[str, int]]:
+    """The requests and connections of each shared client, by client type, endpoint and API version."""
+    with _CLIENTS_LOCK:
+        stats = dict(_POOL_STATS)
+    return {f"{client_type} {endpoint} ({api_version})": pool_stats.to_dict()
+            for (client_type, endpoint, api_version), pool_stats in stats.items()}
+
+
+def format_http_pool_stats() -> str:
+    stats = get_http_pool_stats()
+    if not stats:
+        return "HTTP clients: none"
+    lines = ["HTTP clients:"]
+    for name, client_stats in stats.items():
+        lines.append(f"  {name}: " + ", ".join(f"{key}={value}" for key, value in client_stats.items()))
+    return "\n".join(lines)
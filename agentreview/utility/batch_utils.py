@@ -0,0 +1,129 @@
+"""
+Packing the papers of Phase 5 into AC batches by token length.
+
+With fixed batches of `num_papers_per_area_chair` papers, batches of long metareviews can overflow the context of the
+AC while batches of short ones are mostly empty. `pack_ac_batches` instead fills each batch with the metareviews of
+the next papers (in the order given, e.g. the deterministic shuffle of the CLI) until the token budget is reached, so
+that the papers assigned to a batch stay random and no batch exceeds the budget. The budget covers the whole context
+of the AC: the tokens of its role description, of the global prompt and of its response (`max_tokens`) are reserved
+out of it, see `get_reserved_tokens`.
+"""
+
+import logging
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+from agentreview.prompt_templates import count_tokens
+from agentreview.utility.utils import format_metareviews, generate_num_papers_to_accept
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ACBatch:
+    """A batch of papers decided on by one AC, as recorded next to the AC decisions."""
+
+    paper_ids: List[int]
+    metareviews: List[str]
+    num_tokens: int
+    token_budget: Optional[int]
+    num_papers_to_accept: int = 0
+
+    def to_record(self) -> Dict:
+        record = asdict(self)
+        del record["metareviews"]
+        return record
+
+
+def get_reserved_tokens(area_chair, global_prompt: str = None) -> int:
+    """The tokens of the context of an AC player that are not its metareviews: role description, prompt, response."""
+    reserved = count_tokens(area_chair.role_desc) + (getattr(area_chair.backend, "max_tokens", None) or 0)
+    if global_prompt:
+        reserved += count_tokens(global_prompt)
+    return reserved
+
+
+def pack_ac_batches(paper_ids: List[int], metareviews: List[str], token_budget: int, acceptance_rate: float,
+                    max_papers_per_batch: int = None, reserved_tokens: int = 0) -> List[ACBatch]:
+    """
+    Pack papers, in order, into batches whose formatted metareviews fit in `token_budget - reserved_tokens` tokens.
+
+    A paper whose metareview alone exceeds the budget gets a batch of its own. The papers to accept
+    (`acceptance_rate` of all papers) are split among the batches in proportion to their sizes, see
+    `generate_num_papers_to_accept`.
+
+    args:
+        paper_ids: the papers, in the order in which they are assigned to batches
+        metareviews: the metareview of each paper
+        token_budget: the maximum number of tokens of the context of the AC of a batch
+        acceptance_rate: the fraction of papers to accept
+        max_papers_per_batch: if set, the maximum number of papers of a batch
+        reserved_tokens: the tokens of the context that are not metareviews, see `get_reserved_tokens`
+    """
+    assert len(paper_ids) == len(metareviews)
+
+    metareview_budget = token_budget - reserved_tokens
+    if metareview_budget <= 0:
+        raise ValueError(f"The AC batch token budget of {token_budget} tokens leaves no room for metareviews: "
+                         f"{reserved_tokens} tokens are reserved for the role description, prompt and response of the "
+                         f"AC")
+
+    batches = []
+    current_ids, current_metareviews, current_tokens = [], [], 0
+
+    def close_batch():
+        batches.append(ACBatch(paper_ids=current_ids, metareviews=current_metareviews, num_tokens=current_tokens,
+                               token_budget=token_budget))
+
+    for paper_id, metareview in zip(paper_ids, metareviews):
+        num_tokens = count_tokens(format_metareviews([metareview], [paper_id]))
+        if num_tokens > metareview_budget:
+            logger.warning(f"The metareview of paper {paper_id} has {num_tokens} tokens, more than the "
+                           f"{metareview_budget} tokens left for the metareviews of an AC batch")
+
+        is_full = (current_tokens + num_tokens > metareview_budget
+                   or (max_papers_per_batch is not None and len(current_ids) >= max_papers_per_batch))
+        if current_ids and is_full:
+            close_batch()
+            current_ids, current_metareviews, current_tokens = [], [], 0
+
+        current_ids.append(int(paper_id))
+        current_metareviews.append(metareview)
+        current_tokens += num_tokens
+
+    if current_ids:
+        close_batch()
+
+    quotas = generate_num_papers_to_accept(n=acceptance_rate * len(paper_ids), batch_number=len(batches),
+                                           batch_sizes=[len(batch.paper_ids) for batch in batches])
+    for batch, quota in zip(batches, quotas):
+        batch.num_papers_to_accept = quota
+
+    if batches:
+        sizes = [len(batch.paper_ids) for batch in batches]
+        logger.info(f"Packed {len(paper_ids)} papers into {len(batches)} AC batches of {min(sizes)} to {max(sizes)} "
+                    f"papers (budget {token_budget} tokens, {reserved_tokens} reserved)")
+
+    return batches
+
+
+def split_ac_batches(paper_ids: List[int], metareviews: List[str], num_papers_per_area_chair: int) -> List[ACBatch]:
+    """
+    Fixed batches of `num_papers_per_area_chair` papers, the last batch including all the remaining papers. Papers are
+    dropped if there are fewer than `num_papers_per_area_chair` of them. The quotas of papers to accept are left to
+    the analysis (see `get_llm_acceptance_mask`).
+    """
+    num_batches = len(paper_ids) // num_papers_per_area_chair
+    batches = []
+
+    for batch_index in range(num_batches):
+        start = batch_index * num_papers_per_area_chair
+        # Last batch. Include all remaining papers
+        end = len(paper_ids) if batch_index >= num_batches - 1 else start + num_papers_per_area_chair
+        batch_metareviews = list(metareviews[start:end])
+        batches.append(ACBatch(paper_ids=[int(paper_id) for paper_id in paper_ids[start:end]],
+                               metareviews=batch_metareviews,
+                               num_tokens=count_tokens(format_metareviews(batch_metareviews, paper_ids[start:end])),
+                               token_budget=None))
+
+    return batches
@@ -1,6 +1,6 @@
 import os
 
-import pandas as pd
+from agentreview.utility.general_utils import import_pandas
 
 
 def save_to_excel(df, path, sheet_name, index: bool=False):
@@ -13,6 +13,8 @@ def save_to_excel(df, path, sheet_name, index: bool=False):
     path (str): Path to the Excel file.
     sheet_name (str): Name of the sheet to save the dataframe to.
     """
+    pd = import_pandas()
+
     # Check if the file exists
     if os.path.exists(path):
         # Load the existing workbook
@@ -4,15 +4,46 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from agentreview.agent import Player
+from agentreview.backends.hedging import DEFAULT_BUDGET
+from agentreview.model_router import ModelRouter, get_model_router
 from agentreview.paper_review_player import PaperExtractorPlayer, AreaChair, Reviewer
 from agentreview.role_descriptions import get_ac_config, get_reviewer_player_config, get_author_config, \
     get_paper_extractor_config
 
 
+def set_backend_type(player_config, args):
+    """Use the backend type requested on the command line (e.g. `fake` for load testing) for an LLM-based player."""
+    backend_type = getattr(args, "backend_type", None)
+    if backend_type is not None:
+        player_config['backend']['backend_type'] = backend_type
+    return player_config
+
+
+def set_backend_hedging(player_config, args):
+    """Hedge the backend calls of an LLM-based player if requested on the command line, see `backends/hedging.py`."""
+    hedge_percentile = getattr(args, "hedge_percentile", None)
+    if hedge_percentile is not None:
+        player_config['backend']['hedging'] = {"percentile": hedge_percentile,
+                                               "budget": getattr(args, "hedge_budget", DEFAULT_BUDGET)}
+    return player_config
+
+
+def set_backend_model(player_config, model_router: ModelRouter, role: str):
+    """
+    The initial model of an LLM-based player, routed by role. `Player.select_model` switches it by phase before each
+    action.
+    """
+    player_config['backend']['model'] = model_router.select(role)[1]
+    return player_config
+
+
 def initialize_players(experiment_setting: dict, args):
     paper_id = experiment_setting['paper_id']
     paper_decision = experiment_setting['paper_decision']
 
+    # Models by role and phase, defaulting to `--model_name`
+    model_router = get_model_router(experiment_setting['global_settings'], default_model=args.model_name)
+
     if args.task == "paper_decision":
         experiment_setting["players"] = {k: v for k, v in experiment_setting["players"].items() if k.startswith("AC")}
 
@@ -29,13 +60,18 @@ def initialize_players(experiment_setting: dict, args):
                                               num_papers_per_area_chair=args.num_papers_per_area_chair,
                                               global_settings=experiment_setting['global_settings'],
                                               acceptance_rate=args.acceptance_rate,
+                                              structured_output=getattr(args, "ac_structured_output", False),
+                                              num_papers_to_accept=getattr(args, "num_papers_to_accept", None),
                                               **player_config)
 
-                player_config['model'] = args.model_name
+                set_backend_model(player_config, model_router, "ac")
+                set_backend_hedging(player_config, args)
+                set_backend_type(player_config, args)
 
                 player = AreaChair(data_dir=args.data_dir,
                                    conference=args.conference,
                                    args=args,
+                                   model_router=model_router,
                                    **player_config)
 
 
@@ -58,9 +94,13 @@ def initialize_players(experiment_setting: dict, args):
                     # Author requires no behavior customization.
                     # So we directly use the Player class
                     player_config = get_author_config()
+                    set_backend_model(player_config, model_router, "author")
+                    set_backend_hedging(player_config, args)
+                    set_backend_type(player_config, args)
                     player = Player(data_dir=args.data_dir,
                                     conference=args.conference,
                                     args=args,
+                                    model_router=model_router,
                                     **player_config)
 
 
@@ -69,8 +109,11 @@ def initialize_players(experiment_setting: dict, args):
                     player_config = get_reviewer_player_config(reviewer_index=i + 1,
                                                                global_settings=experiment_setting['global_settings'],
                                                                **player_config)
-                    player_config['model'] = args.model_name
-                    player = Reviewer(data_dir=args.data_dir, conference=args.conference, args=args, **player_config)
+                    set_backend_model(player_config, model_router, "reviewer")
+                    set_backend_hedging(player_config, args)
+                    set_backend_type(player_config, args)
+                    player = Reviewer(data_dir=args.data_dir, conference=args.conference, args=args,
+                                      model_router=model_router, **player_config)
 
 
                 else:
@@ -2,7 +2,7 @@ import os
 import random
 from os import path as osp
 
-import numpy as np
+_PANDAS_CONFIGURED = False
 
 
 def check_cwd():
@@ -12,5 +12,22 @@ def check_cwd():
 
 
 def set_seed(seed):
+    import numpy as np
+
     random.seed(seed)
     np.random.seed(seed)
+
+
+def import_pandas():
+    """
+    Import pandas on first use, with the display options of the project. Modules that use pandas import it through
+    this function, so that the options are set however late pandas is loaded.
+    """
+    global _PANDAS_CONFIGURED
+    import pandas as pd
+
+    if not _PANDAS_CONFIGURED:
+        pd.set_option('display.max_rows', 40)
+        pd.set_option('display.max_columns', 20)
+        _PANDAS_CONFIGURED = True
+    return pd
@@ -0,0 +1,262 @@
+"""
+Non-blocking logging for batch runs.
+
+Loggers only put their records on a queue (`QueueHandler`). A background thread (`QueueListener`) formats them and
+writes them to the console and, with a `log_dir`, to one file per arena, so that the console and disk I/O of the logs
+does not slow down the arenas:
+
+    listener = setup_logging(quiet=args.quiet, log_dir=args.log_dir)
+    with log_context(experiment=args.experiment_name, arena=paper_id):
+        ...  # The records of this block go to {log_dir}/{experiment}/{paper_id}.log as well
+    stop_logging()
+
+On the console, messages longer than `max_message_chars` (e.g. whole papers or reviews) are truncated, `quiet` keeps
+only the warnings and errors, and at most `max_records_per_second` records below the WARNING level are written per
+second (in bursts of up to one second's worth). The records dropped by the rate limit are counted, and their number is
+written before the next record that gets through. The per-arena files get all the records, with the full messages.
+"""
+
+import atexit
+import contextvars
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Messages longer than this are truncated on the console
+DEFAULT_MAX_MESSAGE_CHARS = 2000
+
+# Records below the WARNING level written to the console per second
+DEFAULT_MAX_RECORDS_PER_SECOND = 50
+
+# Maximum number of per-arena log files kept open at once
+MAX_OPEN_LOG_FILES = 32
+
+# Libraries that log every HTTP request at the INFO level. Recent versions of the OpenAI SDK use httpx2 and httpcore2.
+NOISY_LOGGERS = ["httpx", "httpx2", "httpcore", "httpcore2", "openai", "urllib3"]
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+_LOG_CONTEXT: contextvars.ContextVar = contextvars.ContextVar("agentreview_log_context", default={})
+_LISTENER: Optional[logging.handlers.QueueListener] = None
+_LISTENER_LOCK = threading.Lock()
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields (`experiment`, `arena`) to the log records emitted in this context."""
+    merged = dict(_LOG_CONTEXT.get())
+    merged.update({key: str(value) for key, value in fields.items() if value is not None})
+    token = _LOG_CONTEXT.set(merged)
+    try:
+        yield
+    finally:
+        _LOG_CONTEXT.reset(token)
+
+
+class LogContextFilter(logging.Filter):
+    """Copies the fields of `log_context` to the records. Runs in the thread that logs."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _LOG_CONTEXT.get()
+        record.experiment = context.get("experiment")
+        record.arena = context.get("arena")
+        return True
+
+
+class TruncatingFilter(logging.Filter):
+    """Keeps the beginning and the end of messages longer than `max_chars`, and strips the ANSI colors."""
+
+    def __init__(self, max_chars: int = DEFAULT_MAX_MESSAGE_CHARS):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = ANSI_ESCAPE.sub("", record.getMessage())
+        if self.max_chars and len(message) > self.max_chars:
+            head = (self.max_chars * 2) // 3
+            tail = self.max_chars - head
+            message = (f"{message[:head]}\n[... {len(message) - head - tail} characters omitted ...]\n"
+                       f"{message[len(message) - tail:]}")
+        record.msg, record.args = message, None
+        return True
+
+
+class RateLimitingFilter(logging.Filter):
+    """
+    Token bucket of `max_per_second` records below the WARNING level, with bursts of up to `max_per_second` records.
+    Warnings and errors always pass. Counts the records it drops in `num_suppressed`.
+    """
+
+    def __init__(self, max_per_second: float = DEFAULT_MAX_RECORDS_PER_SECOND):
+        super().__init__()
+        self.max_per_second = max_per_second
+        self.num_suppressed = 0
+        self._tokens = max_per_second
+        self._last = time.monotonic()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.max_per_second or record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.max_per_second, self._tokens + (now - self._last) * self.max_per_second)
+        self._last = now
+        if self._tokens < 1:
+            self.num_suppressed += 1
+            return False
+        self._tokens -= 1
+        return True
+
+
+class TruncatingStreamHandler(logging.StreamHandler):
+    """
+    A stream handler that truncates the messages without changing the records seen by the other handlers, and
+    rate-limits the records below the WARNING level. Only called by the `QueueListener` thread.
+    """
+
+    def __init__(self, stream=None, max_chars: int = DEFAULT_MAX_MESSAGE_CHARS,
+                 max_records_per_second: float = DEFAULT_MAX_RECORDS_PER_SECOND):
+        super().__init__(stream)
+        self.truncate = TruncatingFilter(max_chars)
+        self.rate_limit = RateLimitingFilter(max_records_per_second)
+
+    def format(self, record: logging.LogRecord) -> str:
+        record = logging.makeLogRecord(record.__dict__)
+        self.truncate.filter(record)
+        return super().format(record)
+
+    def _write_suppressed(self, record: Optional[logging.LogRecord] = None):
+        """Write the number of records dropped by the rate limit since the last time, if any."""
+        if not self.rate_limit.num_suppressed:
+            return
+        summary = logging.makeLogRecord({
+            "name": __name__, "levelno": logging.INFO, "levelname": logging.getLevelName(logging.INFO),
+            "msg": f"Suppressed {self.rate_limit.num_suppressed} log records (more than "
+                   f"{self.rate_limit.max_per_second:g} per second) on the console",
+            "created": record.created if record is not None else time.time(),
+        })
+        self.rate_limit.num_suppressed = 0
+        super().emit(summary)
+
+    def emit(self, record: logging.LogRecord):
+        if not self.rate_limit.filter(record):
+            return
+        self._write_suppressed(record)
+        super().emit(record)
+
+    def close(self):
+        self._write_suppressed()
+        super().close()
+
+
+class ArenaFileHandler(logging.Handler):
+    """Writes the records of each arena to `{log_dir}/{experiment}/{arena}.log`, and ignores those without an arena."""
+
+    def __init__(self, log_dir: str, max_open_files: int = MAX_OPEN_LOG_FILES):
+        super().__init__()
+        self.log_dir = log_dir
+        self.max_open_files = max_open_files
+        self._files = OrderedDict()
+
+    def _get_file(self, experiment: Optional[str], arena: str):
+        key = (experiment, arena)
+        if key in self._files:
+            self._files.move_to_end(key)
+            return self._files[key]
+
+        path = os.path.join(self.log_dir, experiment or "default", f"{arena}.log")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._files[key] = open(path, "a", encoding="utf-8")
+        if len(self._files) > self.max_open_files:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+        return self._files[key]
+
+    def emit(self, record: logging.LogRecord):
+        arena = getattr(record, "arena", None)
+        if arena is None:
+            return
+        try:
+            f = self._get_file(getattr(record, "experiment", None), arena)
+            f.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        for f in self._files.values():
+            f.flush()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+        super().close()
+
+
+def setup_logging(level: int = logging.INFO, quiet: bool = False, log_dir: str = None,
+                  max_message_chars: int = DEFAULT_MAX_MESSAGE_CHARS,
+                  max_records_per_second: float = DEFAULT_MAX_RECORDS_PER_SECOND) -> logging.handlers.QueueListener:
+    """
+    Route all the logs through a queue to a background writer. Replaces the handlers of the root logger.
+
+    args:
+        level: the level of the root logger
+        quiet: if True, only warnings and errors are written to the console
+        log_dir: if set, the records of each arena (see `log_context`) are also written to a file in this directory
+        max_message_chars: messages longer than this are truncated on the console. 0 to never truncate.
+        max_records_per_second: records below the WARNING level written to the console per second. 0 for no limit.
+    """
+    global _LISTENER
+    stop_logging()
+
+    console = TruncatingStreamHandler(sys.stdout, max_chars=max_message_chars,
+                                      max_records_per_second=max_records_per_second)
+    console.setLevel(logging.WARNING if quiet else level)
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers = [console]
+
+    if log_dir is not None:
+        file_handler = ArenaFileHandler(log_dir)
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(LogContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    for name in NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(max(level, logging.WARNING))
+
+    with _LISTENER_LOCK:
+        _LISTENER = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _LISTENER.start()
+    return _LISTENER
+
+
+def stop_logging():
+    """Write the records left in the queue and stop the background writer."""
+    global _LISTENER
+    with _LISTENER_LOCK:
+        listener, _LISTENER = _LISTENER, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(stop_logging)
@@ -1,19 +1,46 @@
+import functools
 import json
 import os
 import os.path as osp
 import random
 import re
+import sys
 from collections import Counter
-from typing import Union, List, Dict, Tuple
-
-import numpy as np
-import pandas as pd
+from typing import TYPE_CHECKING, Union, List, Dict, Tuple
 
 from agentreview import const
-from agentreview.utility.general_utils import check_cwd, set_seed
+from agentreview.dataset.manifest import get_corpus_manifest
+from agentreview.utility.general_utils import check_cwd, import_pandas, set_seed
+
+# numpy and pandas are imported on first use to keep the startup of the CLIs fast
+if TYPE_CHECKING:
+    import numpy as np
 
 
-def generate_num_papers_to_accept(n, batch_number, shuffle=True):
+def generate_num_papers_to_accept(n, batch_number, shuffle=True, batch_sizes: List[int] = None):
+    """
+    Split the `n` papers to accept among `batch_number` batches.
+
+    Without `batch_sizes`, every batch gets the same quota (up to one paper). With `batch_sizes`, the quotas are
+    proportional to the sizes of the batches (largest remainder method), e.g. for batches packed by token length.
+    `shuffle` randomizes which batches get the extra papers.
+    """
+    if batch_sizes is not None:
+        assert len(batch_sizes) == batch_number
+        total_size = sum(batch_sizes)
+        shares = [n * size / total_size for size in batch_sizes] if total_size else [0.0] * batch_number
+        array = [int(share) for share in shares]
+
+        # The remaining papers go to the batches with the largest remainders. Ties are broken randomly if `shuffle`.
+        order = list(range(batch_number))
+        if shuffle:
+            random.shuffle(order)
+        order.sort(key=lambda i: shares[i] - array[i], reverse=True)
+        for i in order[:int(n) - sum(array)]:
+            array[i] += 1
+
+        return array
+
     # Calculate the base value (minimum value in the array)
     base_value = int(n // batch_number)
 
@@ -36,59 +63,73 @@ def generate_num_papers_to_accept(n, batch_number, shuffle=True):
     return array
 
 
-def get_papers_accepted_by_llm(llm_ac_decisions, acceptance_rate: float) -> list:
-    papers_accepted_by_llm = []
-
-    num_papers = sum([len(batch) for batch in llm_ac_decisions])
-
-    if num_papers == 0:
-        raise ValueError("No papers found in batch")
+def flatten_ac_decisions(llm_ac_decisions: List[Dict]) -> Tuple["np.ndarray", "np.ndarray", list]:
+    """
+    Flatten batches of AC decisions into parallel arrays.
 
-    num_papers_to_accept = generate_num_papers_to_accept(n=acceptance_rate * num_papers,
-                                                         batch_number=len(llm_ac_decisions))
+    Returns:
+        The batch index and the paper ID of each paper, and the list of the decisions (ranks or recommendations),
+        in the order of the batches.
+    """
+    import numpy as np
 
-    for idx_batch, batch in enumerate(llm_ac_decisions):
-        tups = sorted([(paper_id, rank) for paper_id, rank in batch.items()], key=lambda x: x[1], reverse=False)
+    batch_sizes = [len(batch) for batch in llm_ac_decisions]
+    batch_indices = np.repeat(np.arange(len(llm_ac_decisions)), batch_sizes)
+    paper_ids = np.fromiter((int(paper_id) for batch in llm_ac_decisions for paper_id in batch), dtype=np.int64,
+                            count=sum(batch_sizes))
+    values = [value for batch in llm_ac_decisions for value in batch.values()]
+    return batch_indices, paper_ids, values
 
-        paper_ids = [int(paper_id) for paper_id, rank in tups]
 
-        papers_accepted_by_llm += paper_ids[:num_papers_to_accept[idx_batch]]
+def get_llm_acceptance_mask(llm_ac_decisions: List[Dict], acceptance_rate: float,
+                            num_papers_to_accept: List[int] = None) -> "np.ndarray":
+    """
+    Returns whether each paper (in the order of `flatten_ac_decisions`) is accepted when the AC of each batch
+    accepts its best-ranked papers, up to the quota of the batch. The quotas are `num_papers_to_accept` (e.g. those
+    recorded when the batches were packed, see `load_ac_batch_quotas`), or else from `generate_num_papers_to_accept`.
+    """
+    import numpy as np
 
-    return papers_accepted_by_llm
+    batch_indices, _, ranks = flatten_ac_decisions(llm_ac_decisions)
+    num_papers = len(batch_indices)
 
+    if num_papers == 0:
+        raise ValueError("No papers found in batch")
 
-def get_paper_decision_mapping(data_dir: str, conference: str, verbose: bool = False):
-    paper_id2decision, paper_decision2ids = {}, {}
-    path_paper_id2decision = os.path.join(data_dir, conference, "id2decision.json")
-    path_paper_decision2ids = os.path.join(data_dir, conference, "decision2ids.json")
+    if num_papers_to_accept is None:
+        num_papers_to_accept = generate_num_papers_to_accept(n=acceptance_rate * num_papers,
+                                                             batch_number=len(llm_ac_decisions))
+    num_papers_to_accept = np.asarray(num_papers_to_accept)
 
-    if osp.exists(path_paper_id2decision) and osp.exists(path_paper_decision2ids):
-        paper_id2decision = json.load(open(path_paper_id2decision, 'r', encoding='utf-8'))
-        paper_decision2ids = json.load(open(path_paper_decision2ids, 'r', encoding='utf-8'))
+    # Sort by batch, then by rank. Ties keep the order of the papers within the batch, as a stable sort would.
+    order = np.lexsort((np.arange(num_papers), np.asarray(ranks, dtype=float), batch_indices))
 
-        paper_id2decision = {int(k): v for k, v in paper_id2decision.items()}
+    # Position of each paper in the ranking of its batch
+    batch_starts = np.searchsorted(batch_indices, np.arange(len(llm_ac_decisions)))
+    position_in_batch = np.empty(num_papers, dtype=np.int64)
+    position_in_batch[order] = np.arange(num_papers) - batch_starts[batch_indices[order]]
 
-        if verbose:
-            print(f"Loaded {len(paper_id2decision)} paper IDs to decisions from {path_paper_id2decision}")
+    return position_in_batch < num_papers_to_accept[batch_indices]
 
-    else:
 
-        PAPER_DECISIONS = get_all_paper_decisions(conference)
+def get_papers_accepted_by_llm(llm_ac_decisions, acceptance_rate: float, num_papers_to_accept: List[int] = None) -> list:
+    import numpy as np
 
-        for paper_decision in PAPER_DECISIONS:
+    batch_indices, paper_ids, ranks = flatten_ac_decisions(llm_ac_decisions)
+    accepted = get_llm_acceptance_mask(llm_ac_decisions, acceptance_rate, num_papers_to_accept)
 
-            paper_ids = os.listdir(os.path.join(data_dir, conference, "notes", paper_decision))
-            paper_ids = sorted(
-                [int(paper_id.split(".json")[0]) for paper_id in paper_ids if paper_id.endswith(".json")])
+    # Accepted papers of each batch, from the best-ranked one
+    order = np.lexsort((np.arange(len(paper_ids)), np.asarray(ranks, dtype=float), batch_indices))
+    return paper_ids[order][accepted[order]].tolist()
 
-            paper_id2decision.update({paper_id: paper_decision for paper_id in paper_ids})
-            paper_decision2ids[paper_decision] = paper_ids
 
-            if verbose:
-                print(f"{paper_decision}: {len(paper_ids)} papers")
+def get_paper_decision_mapping(data_dir: str, conference: str, verbose: bool = False):
+    # Read from the corpus manifest, which is built on first use instead of listing the notes of every decision
+    paper_id2decision, paper_decision2ids = get_corpus_manifest(data_dir, conference).get_paper_decision_mapping()
 
-        json.dump(paper_id2decision, open(path_paper_id2decision, 'w', encoding='utf-8'), indent=2)
-        json.dump(paper_decision2ids, open(path_paper_decision2ids, 'w', encoding='utf-8'), indent=2)
+    if verbose:
+        for paper_decision, paper_ids in paper_decision2ids.items():
+            print(f"{paper_decision}: {len(paper_ids)} papers")
 
     return paper_id2decision, paper_decision2ids
 
@@ -96,10 +137,12 @@ def get_paper_decision_mapping(data_dir: str, conference: str, verbose: bool = F
 def project_setup():
     check_cwd()
     import warnings
-    import pandas as pd
     warnings.simplefilter(action='ignore', category=FutureWarning)
-    pd.set_option('display.max_rows', 40)
-    pd.set_option('display.max_columns', 20)
+
+    # Configure pandas now if it is already loaded. Otherwise, `import_pandas` configures it on first use, rather than
+    # importing it for every entry point.
+    if "pandas" in sys.modules:
+        import_pandas()
     set_seed(42)
 
 
@@ -370,7 +413,7 @@ def load_llm_ac_decisions_as_array(
     conference: str,
     model_name: str,
     num_papers_per_area_chair: int
-) -> Tuple[np.ndarray, np.ndarray]:
+) -> Tuple["np.ndarray", "np.ndarray"]:
     """Loads and processes GPT-4 generated area chair (AC) decisions for an experiment.
 
     Args:
@@ -388,6 +431,8 @@ def load_llm_ac_decisions_as_array(
     Raises:
         NotImplementedError: If `ac_scoring_method` is not 'ranking' or 'recommendation'.
     """
+    import numpy as np
+
     print("=" * 30)
     print(f"Experiment Name: {experiment_name}")
 
@@ -400,26 +445,90 @@ def load_llm_ac_decisions_as_array(
         num_papers_per_area_chair=num_papers_per_area_chair
     )
 
-    paper_ids = sorted(
-        int(paper_id) for batch in llm_ac_decisions for paper_id in batch
-    )
+    # Batches packed by token length have quotas proportional to their sizes, recorded when they were packed
+    num_papers_to_accept = load_ac_batch_quotas(llm_ac_decisions, output_dir=output_dir, conference=conference,
+                                                model_name=model_name, ac_scoring_method=ac_scoring_method,
+                                                experiment_name=experiment_name)
+
+    decisions_llm, paper_ids = get_llm_decisions(llm_ac_decisions, ac_scoring_method, acceptance_rate,
+                                                 num_papers_to_accept)
+    return decisions_llm, paper_ids
+
+
+def get_llm_decisions(llm_ac_decisions: List[Dict], ac_scoring_method: str,
+                      acceptance_rate: float, num_papers_to_accept: List[int] = None) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Returns the decisions (True for accept) of the AC and the paper IDs, sorted by paper ID. See
+    `get_llm_acceptance_mask` for `num_papers_to_accept`.
+    """
+    import numpy as np
+
+    _, paper_ids, values = flatten_ac_decisions(llm_ac_decisions)
+    order = np.argsort(paper_ids, kind="stable")
 
     if ac_scoring_method == "ranking":
-        if len(paper_ids) != len(set(paper_ids)):
-            raise ValueError(f"Duplicate paper_ids found in the AC decisions: {Counter(paper_ids)}")
+        if len(np.unique(paper_ids)) != len(paper_ids):
+            raise ValueError(f"Duplicate paper_ids found in the AC decisions: {Counter(paper_ids.tolist())}")
 
-        papers_accepted_by_llm = get_papers_accepted_by_llm(llm_ac_decisions, acceptance_rate)
-        decisions_llm = np.array([paper_id in papers_accepted_by_llm for paper_id in paper_ids])
+        decisions_llm = get_llm_acceptance_mask(llm_ac_decisions, acceptance_rate, num_papers_to_accept)
 
     elif ac_scoring_method == "recommendation":
-        llm_ac_decisions_flat = {int(k): v for batch in llm_ac_decisions for k, v in batch.items()}
-        decisions_llm = np.array(
-            [llm_ac_decisions_flat[paper_id].startswith("Accept") for paper_id in paper_ids]
-        )
+        # With duplicate paper IDs, the decision in the last batch is used for all occurrences
+        last_values = dict(zip(paper_ids.tolist(), values))
+        decisions_llm = np.array([last_values[paper_id].startswith("Accept") for paper_id in paper_ids.tolist()],
+                                 dtype=bool)
     else:
         raise NotImplementedError(f"Scoring method '{ac_scoring_method}' not implemented.")
 
-    return decisions_llm, np.array(paper_ids)
+    return decisions_llm[order], paper_ids[order]
+
+
+def load_llm_ac_decisions_as_matrix(
+    output_dir: str,
+    experiment_names: List[str],
+    ac_scoring_method: str,
+    acceptance_rate: float,
+    conference: str,
+    model_name: str,
+    num_papers_per_area_chair: int,
+    join: str = "inner"
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Loads the AC decisions of several experiments into one matrix, e.g. to compute the agreement between them.
+
+    Args:
+        experiment_names (List[str]): Names of the experiments, one row of the matrix each.
+        join (str): 'inner' keeps the papers decided in every experiment. 'outer' keeps the papers decided in any
+            experiment, and the missing decisions are NaN.
+        Other arguments are the same as in `load_llm_ac_decisions_as_array`.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: A (num_experiments, num_papers) array of decisions (bool for 'inner', float
+            with NaN for 'outer'), and the sorted paper IDs of the columns.
+    """
+    import numpy as np
+
+    results = [load_llm_ac_decisions_as_array(output_dir=output_dir, experiment_name=experiment_name,
+                                              ac_scoring_method=ac_scoring_method, acceptance_rate=acceptance_rate,
+                                              conference=conference, model_name=model_name,
+                                              num_papers_per_area_chair=num_papers_per_area_chair)
+               for experiment_name in experiment_names]
+
+    if join == "inner":
+        paper_ids = functools.reduce(np.intersect1d, [ids for _, ids in results]) if results else np.array([])
+        matrix = np.zeros((len(results), len(paper_ids)), dtype=bool)
+    elif join == "outer":
+        paper_ids = functools.reduce(np.union1d, [ids for _, ids in results]) if results else np.array([])
+        matrix = np.full((len(results), len(paper_ids)), np.nan)
+    else:
+        raise ValueError(f"Unknown join '{join}', expected 'inner' or 'outer'.")
+
+    # Paper IDs are sorted and unique, so the columns of each experiment are found by binary search
+    for row, (decisions, ids) in enumerate(results):
+        columns = np.searchsorted(paper_ids, ids)
+        found = (columns < len(paper_ids)) & (paper_ids[np.minimum(columns, len(paper_ids) - 1)] == ids)
+        matrix[row, columns[found]] = decisions[found]
+
+    return matrix, paper_ids
 
 
 def load_llm_ac_decisions(
@@ -443,7 +552,8 @@ def load_llm_ac_decisions(
         List[Dict[str, str]]: List of batches, where each batch contains paper ID and decision.
 
     Raises:
-        AssertionError: If a non-final batch has a paper count different from `num_papers_per_area_chair`.
+        AssertionError: If a non-final batch has a paper count different from `num_papers_per_area_chair`, unless
+            the batches were packed by token length.
     """
     path = get_ac_decision_path(
         output_dir=output_dir,
@@ -463,8 +573,12 @@ def load_llm_ac_decisions(
 
     ac_decision = [batch for batch in ac_decision if batch]  # Remove empty batches
 
+    # Batches packed by token length (see `--ac_batch_token_budget`) have different sizes
+    is_packed = len(load_ac_batches(output_dir=output_dir, conference=conference, model_name=model_name,
+                                    ac_scoring_method=ac_scoring_method, experiment_name=experiment_name)) > 0
+
     for i, batch in enumerate(ac_decision):
-        if i != len(ac_decision) - 1:
+        if i != len(ac_decision) - 1 and not is_packed:
             if len(batch) != num_papers_per_area_chair:
                 raise AssertionError(
                     f"Batch {i} has {len(batch)} papers, expected {num_papers_per_area_chair} for non-final batches."
@@ -481,6 +595,8 @@ def write_to_excel(data, file_path, sheet_name):
     file_path (str): The path to the Excel file.
     sheet_name (str): The name of the sheet to write to.
     """
+    pd = import_pandas()
+
     # Check if the file exists
     if os.path.exists(file_path):
         # If the file exists, load it
@@ -498,6 +614,64 @@ def save_llm_ac_decisions(ac_decisions: List[dict], **kwargs):
     json.dump(ac_decisions, open(path, 'w', encoding='utf-8'), indent=2)
 
 
+def get_ac_batches_path(output_dir: str, conference: str, model_name: str, ac_scoring_method: str,
+                        experiment_name: str) -> str:
+    """Path of the composition of the AC batches packed by token length, next to the AC decisions."""
+    ac_decision_dir = os.path.dirname(get_ac_decision_path(output_dir=output_dir, conference=conference,
+                                                           model_name=model_name, ac_scoring_method=ac_scoring_method,
+                                                           experiment_name=experiment_name))
+    return os.path.join(ac_decision_dir, f"batches_{experiment_name}.json")
+
+
+def load_ac_batches(**kwargs) -> List[Dict]:
+    """
+    Returns the composition of the AC batches recorded by `save_ac_batch`, or an empty list if the batches were not
+    packed by token length. Arguments are those of `get_ac_batches_path`.
+    """
+    path = get_ac_batches_path(**kwargs)
+    if not osp.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_ac_batch(batch: Dict, **kwargs):
+    """
+    Append the composition of an AC batch (its paper IDs, token count and quota of papers to accept) to the file of
+    `get_ac_batches_path`, replacing a previous record of the same papers.
+    """
+    path = get_ac_batches_path(**kwargs)
+    batches = [b for b in load_ac_batches(**kwargs) if set(b["paper_ids"]) != set(batch["paper_ids"])]
+    batches.append(batch)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(batches, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_ac_batch_quotas(llm_ac_decisions: List[Dict], **kwargs) -> Union[List[int], None]:
+    """
+    The quotas of papers to accept of the batches of `llm_ac_decisions`, as recorded when the batches were packed.
+    Returns None (i.e. use `generate_num_papers_to_accept`) if the batches were not packed, or if some batch has no
+    recorded quota.
+    """
+    batches = load_ac_batches(**kwargs)
+    if not batches:
+        return None
+
+    paper_ids2quota = {frozenset(int(paper_id) for paper_id in batch["paper_ids"]): batch["num_papers_to_accept"]
+                       for batch in batches}
+    quotas = [paper_ids2quota.get(frozenset(int(paper_id) for paper_id in batch)) for batch in llm_ac_decisions]
+
+    if any(quota is None for quota in quotas):
+        print(f"Warning: {sum(quota is None for quota in quotas)} batches of AC decisions have no recorded quota. "
+              f"Splitting the papers to accept evenly across batches instead.")
+        return None
+
+    return quotas
+
+
 def get_model_name_short(name: str):
     """
     Convert long model names (e.g. `gpt-35-turbo`) to short model names (e.g. `gpt-35`)
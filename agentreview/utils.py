@@ -91,6 +91,8 @@ class AttributedDict(dict):
         (like `my_dict.my_key`) in addition to the traditional bracket notation (`my_dict['my_key']`).
     """
 
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -0,0 +1,352 @@
+"""
+End-to-end benchmark of the review pipeline.
+
+Runs N papers x M experiments through `PaperReviewArena` (Phase I - IV) and `PaperDecision` (Phase V) against the
+fake backend with a fixed latency, so that the numbers reflect the orchestration itself rather than the provider.
+For every concurrency level, it reports:
+
+* the wall time spent in each phase,
+* the framework overhead per step (step wall time minus the time spent waiting on the backend),
+* the time spent assembling prompts (observations and the prompt formatting inside the backend),
+* the backend calls by phase (latency, estimated tokens and retries, see `agentreview/metrics.py`),
+* the peak resident set size (RSS) of the process,
+* the throughput in papers per hour.
+
+The results are written to a JSON file so that regressions can be tracked between releases:
+
+    python benchmarks/benchmark_pipeline.py --num_papers 20 --experiments BASELINE malicious_Rx1 \
+        --concurrency 1 4 16 --latency 0.05 --output outputs/benchmarks/pipeline.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import sys
+import threading
+import time
+from argparse import Namespace
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import agentreview
+from agentreview import const
+from agentreview.environments import PaperDecision, PaperReview
+from agentreview.experiment_config import all_settings
+from agentreview.metrics import get_metrics_registry
+from agentreview.tracing import configure_tracing, export_trace, span
+from agentreview.paper_review_arena import PaperReviewArena
+from agentreview.paper_review_player import PaperExtractorPlayer
+from agentreview.paper_review_settings import get_experiment_settings
+from agentreview.utility.experiment_utils import initialize_players
+
+logger = logging.getLogger(__name__)
+
+
+class SyntheticPaperExtractor(PaperExtractorPlayer):
+    """A paper extractor that returns a synthetic paper instead of parsing a PDF."""
+
+    def __init__(self, num_words: int, **kwargs):
+        super().__init__(**kwargs)
+        self.num_words = num_words
+
+    def act(self, observation) -> str:
+        words = [f"token{i % 997}" for i in range(self.num_words)]
+        return "Contents of this paper:\n\n" + " ".join(words)
+
+
+class StepStats:
+    """Timings collected while running one arena."""
+
+    def __init__(self):
+        self.phase_time = defaultdict(float)
+        self.phase_steps = defaultdict(int)
+        self.step_overheads: List[float] = []
+        self.backend_time = 0.0
+        self.prompt_assembly_time = 0.0
+
+        # Time spent in the backend during the current step
+        self._step_backend_time = 0.0
+
+    def merge(self, other: "StepStats"):
+        for phase, value in other.phase_time.items():
+            self.phase_time[phase] += value
+        for phase, value in other.phase_steps.items():
+            self.phase_steps[phase] += value
+        self.step_overheads += other.step_overheads
+        self.backend_time += other.backend_time
+        self.prompt_assembly_time += other.prompt_assembly_time
+
+
+def instrument_arena(arena: PaperReviewArena, stats: StepStats):
+    """
+    Wrap the backends and the environment of an arena to measure where the time goes.
+
+    `backend.query` minus `backend._get_response` is the prompt formatting done by the backend, and
+    `environment.get_observation` is the observation assembly done by the framework.
+    """
+    for player in arena.players:
+        backend = player.backend
+        if not hasattr(backend, "_get_response"):
+            continue
+
+        def make_wrappers(backend):
+            query, get_response = backend.query, backend._get_response
+            inner = threading.local()
+
+            def timed_get_response(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return get_response(*args, **kwargs)
+                finally:
+                    inner.elapsed = getattr(inner, "elapsed", 0.0) + time.perf_counter() - start
+
+            def timed_query(*args, **kwargs):
+                inner.elapsed = 0.0
+                start = time.perf_counter()
+                try:
+                    return query(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    stats.backend_time += inner.elapsed
+                    stats._step_backend_time += inner.elapsed
+                    stats.prompt_assembly_time += elapsed - inner.elapsed
+
+            return timed_query, timed_get_response
+
+        backend.query, backend._get_response = make_wrappers(backend)
+
+    get_observation = arena.environment.get_observation
+
+    def timed_get_observation(player_name=None):
+        start = time.perf_counter()
+        try:
+            return get_observation(player_name)
+        finally:
+            if player_name is not None:
+                stats.prompt_assembly_time += time.perf_counter() - start
+
+    arena.environment.get_observation = timed_get_observation
+
+
+def run_arena(arena: PaperReviewArena, stats: StepStats, last_phase: int):
+    """Run an arena until it terminates, in the same way as `ArenaCLI.launch(interactive=False)`."""
+    instrument_arena(arena, stats)
+    timestep = arena.reset()
+
+    while not timestep.terminal and arena.environment.phase_index <= last_phase:
+        phase_index = arena.environment.phase_index
+        stats._step_backend_time = 0.0
+
+        start = time.perf_counter()
+        timestep = arena.step()
+        elapsed = time.perf_counter() - start
+
+        stats.phase_time[phase_index] += elapsed
+        stats.phase_steps[phase_index] += 1
+        stats.step_overheads.append(elapsed - stats._step_backend_time)
+
+
+def set_fake_latency(players, latency: float):
+    for player in players:
+        if player.backend.type_name == "fake":
+            player.backend.latency = {"distribution": "fixed", "mean": latency}
+
+
+def review_paper(paper_id: int, experiment_name: str, args: Namespace) -> Tuple[str, StepStats]:
+    """Run Phase I - IV for one paper and return the metareview."""
+    args = Namespace(**vars(args), task="paper_review", experiment_name=experiment_name)
+    paper_decision = "Accept-poster" if paper_id % 3 == 0 else "Reject"
+
+    experiment_setting = get_experiment_settings(paper_id=paper_id, paper_decision=paper_decision,
+                                                 setting=all_settings[experiment_name])
+    players = initialize_players(experiment_setting=experiment_setting, args=args)
+
+    for i, player in enumerate(players):
+        if isinstance(player, PaperExtractorPlayer):
+            players[i] = SyntheticPaperExtractor(num_words=args.paper_words, name=player.name,
+                                                 role_desc=player.role_desc, backend=player.backend,
+                                                 paper_id=paper_id, paper_decision=paper_decision,
+                                                 conference=args.conference, args=args)
+    set_fake_latency(players, args.latency)
+
+    env = PaperReview(player_names=[player.name for player in players], paper_decision=paper_decision,
+                      paper_id=paper_id, args=args, experiment_setting=experiment_setting)
+    arena = PaperReviewArena(players=players, environment=env, args=args, global_prompt=const.GLOBAL_PROMPT)
+
+    stats = StepStats()
+    with span("paper_arena", paper_id=paper_id, experiment=experiment_name):
+        run_arena(arena, stats, last_phase=4)
+
+    return env.get_observation()[-1].content, stats
+
+
+def decide_papers(paper_ids: List[int], metareviews: List[str], experiment_name: str, args: Namespace) -> StepStats:
+    """Run Phase V for one batch of papers."""
+    args = Namespace(**vars(args), task="paper_decision", experiment_name=experiment_name)
+
+    experiment_setting = get_experiment_settings(paper_id=None, paper_decision=None,
+                                                 setting=all_settings[experiment_name])
+    players = initialize_players(experiment_setting=experiment_setting, args=args)
+    set_fake_latency(players, args.latency)
+
+    env = PaperDecision(player_names=[player.name for player in players], paper_ids=paper_ids,
+                        metareviews=metareviews, experiment_setting=experiment_setting,
+                        ac_scoring_method=args.ac_scoring_method)
+    arena = PaperReviewArena(players=players, environment=env, args=args, global_prompt=const.GLOBAL_PROMPT)
+
+    stats = StepStats()
+    with span("decision_arena", experiment=experiment_name):
+        run_arena(arena, stats, last_phase=5)
+    return stats
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(args: Namespace, concurrency: int) -> Dict:
+    paper_ids = list(range(1, args.num_papers + 1))
+    jobs = [(paper_id, experiment_name) for experiment_name in args.experiments for paper_id in paper_ids]
+    stats = StepStats()
+    get_metrics_registry().aggregator.reset()
+
+    start = time.perf_counter()
+
+    # Phase I - IV: every (paper, experiment) pair is an independent arena
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda job: review_paper(job[0], job[1], args), jobs))
+
+    metareviews = defaultdict(list)
+    for (paper_id, experiment_name), (metareview, review_stats) in zip(jobs, results):
+        metareviews[experiment_name].append((paper_id, metareview))
+        stats.merge(review_stats)
+
+    # Phase V: the AC decides on batches of papers
+    batches = []
+    for experiment_name, items in metareviews.items():
+        for i in range(0, len(items), args.num_papers_per_area_chair):
+            batch = items[i: i + args.num_papers_per_area_chair]
+            batches.append(([paper_id for paper_id, _ in batch], [metareview for _, metareview in batch],
+                            experiment_name))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for decision_stats in executor.map(lambda batch: decide_papers(*batch, args), batches):
+            stats.merge(decision_stats)
+
+    wall_time = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "num_arenas": len(jobs) + len(batches),
+        "wall_time_s": wall_time,
+        "papers_per_hour": len(jobs) / wall_time * 3600,
+        "phases": {
+            str(phase): {
+                "total_step_time_s": stats.phase_time[phase],
+                "num_steps": stats.phase_steps[phase],
+                "mean_step_time_ms": stats.phase_time[phase] / stats.phase_steps[phase] * 1000,
+            } for phase in sorted(stats.phase_time)
+        },
+        "framework_overhead_per_step_ms": {
+            "mean": statistics.mean(stats.step_overheads) * 1000,
+            "p50": percentile(stats.step_overheads, 50) * 1000,
+            "p95": percentile(stats.step_overheads, 95) * 1000,
+            "max": max(stats.step_overheads) * 1000,
+        },
+        "backend_time_s": stats.backend_time,
+        "prompt_assembly_time_s": stats.prompt_assembly_time,
+        "backend_calls": get_metrics_registry().summary()["by_phase"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def parse_benchmark_args():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the AgentReview pipeline")
+    parser.add_argument("--num_papers", type=int, default=10, help="Number of papers per experiment.")
+    parser.add_argument("--experiments", type=str, nargs="+", default=["BASELINE"],
+                        choices=list(all_settings.keys()), help="Experiment settings to run.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4],
+                        help="Number of arenas run concurrently. One benchmark is run per value.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fixed latency of each backend call in seconds.")
+    parser.add_argument("--paper_words", type=int, default=8000, help="Number of words of each synthetic paper.")
+    parser.add_argument("--num_papers_per_area_chair", type=int, default=10)
+    parser.add_argument("--ac_scoring_method", type=str, default="ranking", choices=["recommendation", "ranking"])
+    parser.add_argument("--output", type=str, default="outputs/benchmarks/pipeline.json",
+                        help="Path of the JSON file with the results.")
+    parser.add_argument("--trace_path", type=str, default=None,
+                        help="If set, save the tracing spans of all runs to this file (Chrome Trace Event format). "
+                             "Tracing adds a small overhead to the measurements.")
+    return parser.parse_args()
+
+
+def main():
+    # Per-step logging would dominate the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+    bench_args = parse_benchmark_args()
+    configure_tracing(bench_args.trace_path is not None)
+
+    # The arguments expected by `initialize_players` and the arenas
+    args = Namespace(
+        backend_type="fake",
+        openai_client_type="openai",
+        model_name="gpt-4o",
+        conference="ICLR2023",
+        data_dir="data",
+        output_dir="outputs",
+        max_num_words=bench_args.paper_words,
+        num_reviewers_per_paper=3,
+        acceptance_rate=0.32,
+        skip_logging=True,
+        num_papers=bench_args.num_papers,
+        experiments=bench_args.experiments,
+        latency=bench_args.latency,
+        paper_words=bench_args.paper_words,
+        num_papers_per_area_chair=bench_args.num_papers_per_area_chair,
+        ac_scoring_method=bench_args.ac_scoring_method,
+    )
+
+    results = []
+    for concurrency in bench_args.concurrency:
+        result = run_benchmark(args, concurrency)
+        results.append(result)
+        print(f"concurrency={concurrency}: {result['papers_per_hour']:.0f} papers/hour, "
+              f"overhead/step={result['framework_overhead_per_step_ms']['mean']:.2f} ms, "
+              f"peak RSS={result['peak_rss_mb']:.0f} MB")
+
+    report = {
+        "benchmark": "pipeline",
+        "agentreview_version": agentreview.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(bench_args).items() if k not in ["output", "trace_path"]},
+        "results": results,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(bench_args.output)), exist_ok=True)
+    with open(bench_args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {bench_args.output}")
+
+    if bench_args.trace_path is not None:
+        export_trace(bench_args.trace_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Startup-time benchmark of the AgentReview entry points.
+
+Each module is imported in a fresh interpreter (as a worker process would), several times. For every module, it
+reports:
+
+* the wall time of `python -c "import <module>"`, minus the startup of a bare interpreter,
+* the cumulative import time of the module from `python -X importtime`, and the modules that are slowest to import,
+* which heavy dependencies (numpy, pandas, llama_index, ...) were loaded as a side effect.
+
+    python benchmarks/benchmark_startup.py --repeat 5 --output outputs/benchmarks/startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT_DIR)
+
+import agentreview
+
+DEFAULT_MODULES = [
+    "agentreview.backends",
+    "agentreview.utility.utils",
+    "agentreview.paper_review_player",
+    "agentreview.paper_review_arena",
+    "agentreview.ui.cli",
+    "run_paper_review_cli",
+    "run_paper_decision_cli",
+]
+
+HEAVY_DEPENDENCIES = ["numpy", "pandas", "llama_index", "prompt_toolkit", "rich", "openai", "transformers", "torch",
+                      "tiktoken", "matplotlib"]
+
+
+def run_python(code: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    return subprocess.run(command, cwd=ROOT_DIR, capture_output=True, text=True,
+                          env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get(
+                              "PYTHONPATH")]))})
+
+
+def time_import(module: str, repeat: int) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run_python(f"import {module}" if module else "pass")
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(f"Failed to import {module}:\n{result.stderr}")
+    return times
+
+
+def parse_importtime(stderr: str, module: str, top: int) -> Dict:
+    """Parse the output of `python -X importtime` (self and cumulative times are in microseconds)."""
+    self_us, cumulative_us = {}, {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = [field.strip() for field in line[len("import time:"):].split("|")]
+        try:
+            self_us[fields[2]], cumulative_us[fields[2]] = int(fields[0]), int(fields[1])
+        except ValueError:  # the header line
+            continue
+
+    slowest = sorted(self_us.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "cumulative_ms": cumulative_us.get(module, 0) / 1000,
+        "slowest_imports_self_ms": {name: us / 1000 for name, us in slowest},
+    }
+
+
+def loaded_heavy_dependencies(module: str) -> List[str]:
+    code = (f"import sys, json; import {module}; "
+            f"print(json.dumps([name for name in {HEAVY_DEPENDENCIES!r} if name in sys.modules]))")
+    result = run_python(code)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup-time benchmark of the AgentReview entry points")
+    parser.add_argument("--modules", type=str, nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5, help="Number of fresh interpreters per module.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to report per module.")
+    parser.add_argument("--output", type=str, default="outputs/benchmarks/startup.json",
+                        help="Path of the JSON file with the results.")
+    args = parser.parse_args()
+
+    interpreter_times = time_import("", args.repeat)
+    interpreter_s = statistics.median(interpreter_times)
+    print(f"Bare interpreter: {interpreter_s * 1000:.0f} ms")
+
+    results = {}
+    for module in args.modules:
+        times = time_import(module, args.repeat)
+        importtime = parse_importtime(run_python(f"import {module}", importtime=True).stderr, module, args.top)
+        heavy = loaded_heavy_dependencies(module)
+
+        results[module] = {
+            "wall_time_ms": {
+                "median": (statistics.median(times) - interpreter_s) * 1000,
+                "min": (min(times) - interpreter_s) * 1000,
+            },
+            **importtime,
+            "heavy_dependencies_loaded": heavy,
+        }
+        print(f"{module}: {results[module]['wall_time_ms']['median']:.0f} ms "
+              f"(heavy dependencies: {', '.join(heavy) or 'none'})")
+
+    report = {
+        "benchmark": "startup",
+        "agentreview_version": agentreview.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "repeat": args.repeat,
+        "interpreter_startup_ms": interpreter_s * 1000,
+        "results": results,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Check of the PDF downloader (`agentreview/dataset/download_openreview_paper.py`) against a local stand-in server.
+
+The server (`http.server`, in a background thread) serves a synthetic PDF and misbehaves on purpose, depending on the
+path. Each check downloads from one path and verifies the outcome:
+
+* `/resume`: a `.part` file holds the first half of the PDF, which is resumed with a Range request,
+* `/rate_limited`: the first request gets a 429 with a Retry-After header, which the session waits for and retries,
+* `/truncated_once`: the first response is cut short of its Content-Length, and the download resumes from the cut,
+* `/truncated`: every response is cut short, so the download fails,
+* `/not_pdf`: the body is not a PDF, so the download fails and the `.part` file is removed,
+* an existing PDF truncated by the previous (non-atomic) downloader is downloaded again by `download_paper`.
+
+    python benchmarks/check_download.py
+"""
+
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agentreview.dataset.download_openreview_paper import DownloadError, create_session, download_paper, \
+    download_pdf
+from agentreview.dataset.manifest import CorpusManifest, file_sha256
+
+logger = logging.getLogger(__name__)
+
+# Several chunks of `download_pdf`, so that a truncated response leaves bytes to resume from
+PDF_BODY = b"%PDF-1.4\n" + b"".join(f"{i} 0 obj\n<< /Length {i} >>\nendobj\n".encode() for i in range(12000)) \
+           + b"%%EOF\n"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: "StandInServer"
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        num_requests = self.server.count(path, self.headers.get("Range"))
+
+        if path == "/rate_limited" and num_requests == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = b"<html>Please log in</html>" if path == "/not_pdf" else PDF_BODY
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header is not None and range_header.startswith("bytes="):
+            start = int(range_header[len("bytes="):].split("-")[0])
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+
+        payload = body[start:]
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+
+        if path == "/truncated" or (path == "/truncated_once" and num_requests == 1):
+            # Close the connection in the middle of the body
+            self.wfile.write(payload[:len(payload) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(payload)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.requests = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def count(self, path: str, range_header: str) -> int:
+        """Record a request and return the number of requests to `path` so far."""
+        with self._lock:
+            self.requests[path].append(range_header)
+            return len(self.requests[path])
+
+    def url(self, path: str) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+
+def check_resume(server, session, tmp_dir):
+    path = os.path.join(tmp_dir, "resume.pdf")
+    half = len(PDF_BODY) // 2
+    with open(f"{path}.part", "wb") as f:
+        f.write(PDF_BODY[:half])
+
+    size, sha256 = download_pdf(session, server.url("/resume"), path)
+    assert size == len(PDF_BODY) and sha256 == file_sha256(path), "the resumed file differs from the PDF"
+    assert server.requests["/resume"] == [f"bytes={half}-"], f"expected one Range request, got " \
+                                                             f"{server.requests['/resume']}"
+    assert not os.path.exists(f"{path}.part"), "the .part file was not renamed"
+
+
+def check_rate_limited(server, session, tmp_dir):
+    path = os.path.join(tmp_dir, "rate_limited.pdf")
+    size, _ = download_pdf(session, server.url("/rate_limited"), path)
+    assert size == len(PDF_BODY), "the file differs from the PDF"
+    assert len(server.requests["/rate_limited"]) == 2, "the 429 was not retried once"
+
+
+def check_truncated_once(server, session, tmp_dir):
+    path = os.path.join(tmp_dir, "truncated_once.pdf")
+    size, _ = download_pdf(session, server.url("/truncated_once"), path)
+    assert size == len(PDF_BODY), "the file differs from the PDF"
+    ranges = server.requests["/truncated_once"]
+    assert len(ranges) == 2 and ranges[0] is None and ranges[1] is not None, \
+        f"expected a Range request after the truncated response, got {ranges}"
+
+
+def check_truncated(server, session, tmp_dir):
+    path = os.path.join(tmp_dir, "truncated.pdf")
+    try:
+        download_pdf(session, server.url("/truncated"), path, max_attempts=2)
+    except DownloadError:
+        pass
+    else:
+        raise AssertionError("a download truncated on every attempt did not fail")
+    assert not os.path.exists(path), "an incomplete file was renamed to the destination"
+
+
+def check_not_pdf(server, session, tmp_dir):
+    path = os.path.join(tmp_dir, "not_pdf.pdf")
+    try:
+        download_pdf(session, server.url("/not_pdf"), path)
+    except DownloadError:
+        pass
+    else:
+        raise AssertionError("a body that is not a PDF was accepted")
+    assert not os.path.exists(path) and not os.path.exists(f"{path}.part"), "the invalid file was kept"
+
+
+def check_existing_truncated(server, session, tmp_dir):
+    papers_directory = os.path.join(tmp_dir, "ICLR2023", "paper")
+    notes_directory = os.path.join(tmp_dir, "ICLR2023", "notes")
+    os.makedirs(papers_directory, exist_ok=True)
+    os.makedirs(notes_directory, exist_ok=True)
+
+    # Left by the previous downloader, which wrote the PDFs in place
+    paper_path = os.path.join(papers_directory, "1.pdf")
+    with open(paper_path, "wb") as f:
+        f.write(PDF_BODY[:len(PDF_BODY) // 2])
+
+    manifest = CorpusManifest(tmp_dir, "ICLR2023")
+    note = SimpleNamespace(number=1, id="existing", content={"title": "Existing"},
+                           to_json=lambda: {"id": "existing", "number": 1})
+    download_paper(session, note, manifest, papers_directory, notes_directory, server.url("/existing?id={note_id}"))
+
+    assert file_sha256(paper_path) == hashlib.sha256(PDF_BODY).hexdigest(), \
+        "the truncated PDF was not downloaded again"
+    assert manifest.records[1].size == len(PDF_BODY), "the manifest records the truncated file"
+
+
+CHECKS = [check_resume, check_rate_limited, check_truncated_once, check_truncated, check_not_pdf,
+          check_existing_truncated]
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    server = StandInServer()
+    threading.Thread(target=server.serve_forever, name="stand-in-server", daemon=True).start()
+    session = create_session(pool_size=2, max_retries=2, backoff_factor=0.0)
+
+    failures = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for check in CHECKS:
+                try:
+                    check(server, session, tmp_dir)
+                    print(f"ok      {check.__name__}")
+                except Exception as e:
+                    failures.append(check.__name__)
+                    print(f"FAILED  {check.__name__}: {type(e).__name__}: {e}")
+    finally:
+        session.close()
+        server.shutdown()
+        server.server_close()
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
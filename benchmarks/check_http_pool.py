@@ -0,0 +1,82 @@
+"""
+Check of the shared HTTP clients against the local mock server.
+
+Starts `backends/mock_server.py` in the background, points the OpenAI client at it and sends concurrent requests
+through `OpenAIChat` backends. The shared client must serve them all (`requests`) from a pool that opened at least
+one, and at most `--concurrency`, connections (`connections_opened`). Both counts come from the hooks of
+`HTTPPoolStats`, so a mismatch with the HTTP library of the installed OpenAI SDK shows up as zeros:
+
+    python benchmarks/check_http_pool.py --num_requests 64 --concurrency 8
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agentreview.backends.mock_server import start_mock_server
+from agentreview.message import Message
+from agentreview.utility.authentication_utils import get_http_pool_stats
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check the pool statistics of the shared OpenAI HTTP clients")
+    parser.add_argument("--num_requests", type=int, default=32, help="Number of requests to send.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of backends sending requests at once.")
+    parser.add_argument("--latency", type=float, default=0.01, help="Fixed latency of the mock server in seconds.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    server = start_mock_server(latency={"distribution": "fixed", "mean": args.latency})
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+
+    # Imported once the environment points at the mock server
+    from agentreview.backends.openai import OpenAIChat
+
+    backends = [OpenAIChat(openai_client_type="openai", model="mock") for _ in range(args.concurrency)]
+
+    def query(i: int) -> str:
+        message = Message(agent_name="Author", content=f"Request {i}", turn=0)
+        return backends[i % len(backends)].query(agent_name="Reviewer 1", role_desc="You are a reviewer.",
+                                                 history_messages=[message])
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            responses = list(executor.map(query, range(args.num_requests)))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    stats = get_http_pool_stats()
+    print(json.dumps({"responses": len(responses), "server_requests": server.num_requests, "clients": stats},
+                     indent=2))
+
+    errors = []
+    if len(stats) != 1:
+        errors.append(f"expected one shared client, got {len(stats)}")
+    for name, client_stats in stats.items():
+        if client_stats["requests"] != server.num_requests:
+            errors.append(f"{name}: counted {client_stats['requests']} requests, the server got "
+                          f"{server.num_requests}")
+        if not 0 < client_stats["connections_opened"] <= args.concurrency:
+            errors.append(f"{name}: opened {client_stats['connections_opened']} connections for a concurrency of "
+                          f"{args.concurrency}")
+
+    if errors:
+        print("FAILED: " + "; ".join(errors))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
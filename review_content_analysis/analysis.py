@@ -1,13 +1,17 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+import hashlib
 import os
 import re
+import threading
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import matplotlib.pyplot as plt
+import pandas as pd
 from openai import OpenAI
-import multiprocessing
 
 FONT_SIZE = 20
 
@@ -28,13 +32,43 @@ with open('classification_prompt.txt', 'r') as f:
 with open('reason_library.txt', 'r') as f:
     reason_library = f.read()
 
+# Responses are cached by the hash of the model, the temperature and the prompt, so that interrupted or repeated
+# runs do not query the same review twice
+GPT_MODEL = "gpt-4-1106-preview"
+GPT_TEMPERATURE = 0.7
+
+# One row per classified review. Rows are appended as the reviews are classified, which makes the pipeline resumable
+reason_table_path = os.path.join(save_base_dir, 'reasons.jsonl')
+response_cache_path = os.path.join(save_base_dir, 'response_cache.jsonl')
+
+VALID_REASONS = {
+    'accept': ['1', '2', '3', '4', '5'],
+    'reject': ['1', '2', '3', '4', '5', '6', '7'],
+}
+
+# Levels of the directory hierarchy of the reviews: {year}/{model}/{type}/{paper_id}/{review_id}.json
+REVIEW_LEVELS = ['year', 'model', 'type', 'paper_id', 'review_id']
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    # A single client, and thus a single connection pool, is shared by all the threads
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAI(api_key=openai_api_key)
+        return _client
+
+
 def get_gpt_response(prompt):
-    client = OpenAI(api_key=openai_api_key)
+    client = get_openai_client()
     messages = [{'role': 'user', 'content': prompt}]
     completion = client.chat.completions.create(
-            model="gpt-4-1106-preview",
+            model=GPT_MODEL,
             messages=messages,
-            temperature=0.7,
+            temperature=GPT_TEMPERATURE,
             max_tokens=2000,
         )
 
@@ -44,6 +78,77 @@ def get_gpt_response(prompt):
     # time.sleep(5)
     return response
 
+
+class ResponseCache:
+    """Append-only cache of GPT responses, keyed by the hash of the request."""
+
+    def __init__(self, path):
+        self.path = path
+        self.responses = {}
+        self._lock = threading.Lock()
+        # Prompts being sent, so that identical prompts sent concurrently wait for the first response
+        self._in_flight = {}
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.responses[entry['key']] = entry['response']
+
+    @staticmethod
+    def key(prompt):
+        return hashlib.sha256(f"{GPT_MODEL}\n{GPT_TEMPERATURE}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def get_response(self, prompt):
+        key = self.key(prompt)
+        with self._lock:
+            if key in self.responses:
+                return self.responses[key]
+            in_flight = self._in_flight.get(key)
+            is_sender = in_flight is None
+            if is_sender:
+                in_flight = self._in_flight[key] = threading.Event()
+
+        if not is_sender:
+            in_flight.wait()
+            with self._lock:
+                if key in self.responses:
+                    return self.responses[key]
+            # The request of the other thread failed. Send it again.
+            return self.get_response(prompt)
+
+        try:
+            response = get_gpt_response(prompt)
+            with self._lock:
+                self.responses[key] = response
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps({'key': key, 'response': response}, ensure_ascii=False) + '\n')
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            in_flight.set()
+        return response
+
+
+def parse_reasons(res):
+    # 解析res的输出，将accept和reject的原因分别提取出来
+    # "Accept: 1,2,3; Reject: 3,4,7"
+    reason_dict = {}
+    if 'Reject' in res:
+        accept_reason = re.search(r"Accept: (.+?);", res)
+    else:
+        accept_reason = re.search(r"Accept: (.+)", res)
+
+    reject_reason = re.search(r"Reject: (.+)", res)
+
+    for decision, match in [('accept', accept_reason), ('reject', reject_reason)]:
+        if match:
+            reason_dict[decision] = [r.strip() for r in match.group(1).split(',')
+                                     if r.strip() in VALID_REASONS[decision]]
+    return reason_dict
+
+
 def extract_review_from_real_data():
     base_dir = '/home/v-qinlinzhao/agent4reviews/real_review/original_data'
     result_dir = '/home/v-qinlinzhao/agent4reviews/real_review/extracted_real_review/'
@@ -125,50 +230,112 @@ def construct_reason_library():
             ans = get_gpt_response(prompt)
             print(ans)
 
-def analyze_reason_in_batch(json_files):
-    
-    for file in json_files:
+def load_classified_reviews(path=None):
+    path = path or reason_table_path
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r') as f:
+        return {json.loads(line)['path'] for line in f if line.strip()}
+
+
+def analyze_reason_in_batch(json_files, max_workers=8):
+    """
+    Classify the accept/reject reasons of each review with GPT, using up to `max_workers` concurrent requests.
+
+    Each classified review becomes one row of `reason_table_path`. Reviews that already have a row are skipped, so an
+    interrupted run can simply be restarted.
+    """
+    os.makedirs(os.path.dirname(reason_table_path), exist_ok=True)
+    cache = ResponseCache(response_cache_path)
+    classified = load_classified_reviews()
+    json_files = [file for file in json_files if os.path.relpath(file, base_dir) not in classified]
+    write_lock = threading.Lock()
+
+    print(f"Classifying {len(json_files)} reviews ({len(classified)} already classified)...")
+
+    def classify(file):
         with open(file, 'r') as f:
-            data = json.load(f)
-            review = data['review']
-            prompt = classification_prompt.format(review=review)
-            res = get_gpt_response(prompt)
-            
-            # 解析res的输出，将accept和reject的原因分别提取出来，写成json格式
-            # 依据该字符串分别抽取Accept和Reject的原因
-            reason_dict = {}
-            if 'Reject' in res:
-                accept_reason = re.search(r"Accept: (.+?);", res)
-            else:
-                accept_reason = re.search(r"Accept: (.+)", res)
-                
-            reject_reason = re.search(r"Reject: (.+)", res)
-            # print(reject_reason)
-            if accept_reason:
-                accept_reason = accept_reason.group(1).split(',')
-                reason_dict['accept'] = []
-                for r in accept_reason:
-                    r = r.strip()
-                    if r in ['1', '2', '3', '4', '5']:
-                        reason_dict['accept'].append(r)
-            if reject_reason:
-                reject_reason = reject_reason.group(1).split(',')
-                reason_dict['reject'] = []
-                for r in reject_reason:
-                    r = r.strip()
-                    if r in ['1', '2', '3', '4', '5', '6', '7']:
-                        reason_dict['reject'].append(r)
-    
-            # print(res)
-            relative_path = os.path.relpath(file, base_dir)
-            save_path = os.path.join(save_base_dir, relative_path)
-            save_dir = os.path.dirname(save_path)
-       
-            # 首先找到原来目录的目录结构，然后在save_dir中按照该目录保存结果保存结果
-            if not os.path.exists(save_dir):
-                os.makedirs(save_dir)
-            with open(save_path, 'w') as f:
-                json.dump(reason_dict, f, indent=4)
+            review = json.load(f)['review']
+        res = cache.get_response(classification_prompt.format(review=review))
+
+        row = {'path': os.path.relpath(file, base_dir), **parse_reasons(res)}
+        with write_lock:
+            with open(reason_table_path, 'a') as f:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    num_failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(classify, file): file for file in json_files}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                num_failed += 1
+                print(f"Failed to classify {futures[future]}: {e}")
+
+    if num_failed:
+        print(f"{num_failed} reviews failed. Run again to retry them.")
+
+
+def load_reason_table(path=None):
+    """
+    Load the classified reasons as a long table with one row per (review, decision, reason), and the columns
+    `year`, `model`, `type`, `paper_id`, `review_id`, `decision` and `reason`.
+
+    Besides the JSONL table written by `analyze_reason_in_batch`, this accepts the nested `reason.json` written by
+    `convert_txt_to_json`.
+    """
+    path = path or reason_table_path
+
+    if path.endswith('.jsonl'):
+        reviews = pd.read_json(path, lines=True)
+        levels = reviews['path'].str.replace(r'\.json$', '', regex=True).str.split(os.sep, expand=True)
+        reviews[REVIEW_LEVELS] = levels.iloc[:, -len(REVIEW_LEVELS):].to_numpy()
+    else:
+        with open(path, 'r') as f:
+            reason_count = json.load(f)
+        reviews = pd.DataFrame([
+            {'year': year, 'model': model, 'type': type, 'paper_id': paper_id, 'review_id': review_id,
+             **review_id_dict}
+            for year, year_dict in reason_count.items()
+            for model, model_dict in year_dict.items()
+            for type, type_dict in model_dict.items()
+            for paper_id, paper_id_dict in type_dict.items()
+            for review_id, review_id_dict in paper_id_dict.items()])
+
+    frames = []
+    for decision in ['accept', 'reject']:
+        if decision not in reviews:
+            continue
+        frame = reviews[REVIEW_LEVELS + [decision]].explode(decision).rename(columns={decision: 'reason'})
+        frames.append(frame.assign(decision=decision))
+
+    table = pd.concat(frames, ignore_index=True).dropna(subset=['reason'])
+    table['reason'] = table['reason'].astype(str)
+
+    # Keep only the reasons in the reason library
+    valid = pd.Series(False, index=table.index)
+    for decision, reasons in VALID_REASONS.items():
+        valid |= (table['decision'] == decision) & table['reason'].isin(reasons)
+    return table[valid]
+
+
+def _to_nested_dict(series):
+    # {level_0: {level_1: ... {decision: {reason: value}}}}, the format read by the plotting functions
+    nested = {}
+    for keys, value in series.items():
+        node = nested
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = value.item() if hasattr(value, 'item') else value
+    return nested
+
+
+def _with_decisions(nested, depth):
+    # Make sure every group has both decisions, as in the nested dicts of the previous implementation
+    if depth == 0:
+        return {'accept': nested.get('accept', {}), 'reject': nested.get('reject', {})}
+    return {key: _with_decisions(value, depth - 1) for key, value in nested.items()}
 
 def convert_txt_to_json():
     base_dir = '/home/v-qinlinzhao/agent4reviews/simulated_review/classified_meta_review_reason'
@@ -238,99 +405,36 @@ def convert_txt_to_json():
     # with open('reason_percentage.json', 'w') as f:
     #     json.dump(reason_percentage, f, indent=4)
 
-def count_reasons():
-    with open('../reason_result/reason.json', 'r') as f:
-        reason_count = json.load(f)
-
-    count = {}
-    for year, year_dict in reason_count.items():
-        count[year] = {}
-        for model, model_dict in year_dict.items():
-            count[year][model] = {}
-            for type, type_dict in model_dict.items():
-                count[year][model][type] = {}
-                count[year][model][type]['accept'] = {}
-                count[year][model][type]['reject'] = {}
-                # 只在type层面做统计就好了
-                for paper_id, paper_id_dict in type_dict.items():
-                    for review_id, review_id_dict in paper_id_dict.items():
-                        print(year, model, type, paper_id, review_id, review_id_dict)
-                        # {'accept': {'1': 1, '2': 1, '5': 1}, 'reject': {'3': 1, '4': 1, '5': 1, '7': 1}}
-                        if 'accept' in review_id_dict:
-                            for accept_reason in review_id_dict['accept']:
-                                if accept_reason not in count[year][model][type]['accept']  \
-                                                and accept_reason in ['1', '2', '3', '4', '5']:
-                                    count[year][model][type]['accept'][accept_reason] = 0
-                                count[year][model][type]['accept'][accept_reason] += 1
-                        if 'reject' in review_id_dict: 
-                            for reject_reason in review_id_dict['reject']:
-                                if reject_reason not in count[year][model][type]['reject'] \
-                                                and reject_reason in ['1', '2', '3', '4', '5', '6', '7']:
-                                    count[year][model][type]['reject'][reject_reason] = 0
-                                count[year][model][type]['reject'][reject_reason] += 1   
+def count_reasons(path=None):
+    # Number of times each reason is given, per year, model and type
+    table = load_reason_table(path)
+    count = table.groupby(['year', 'model', 'type', 'decision', 'reason']).size()
 
     with open('reason_count.json', 'w') as f:
-        json.dump(count, f, indent=4)
-
-def calcu_reason_percentage_every_year():
-    with open('../reason_result/reason_count.json', 'r') as f:
-        reason_count = json.load(f)
-
-    distribution = {}
-    for year, year_dict in reason_count.items():
-        distribution[year] = {}
-        for model, model_dict in year_dict.items():
-            distribution[year][model] = {}
-            for type, type_dict in model_dict.items():
-                distribution[year][model][type] = {}
-                distribution[year][model][type]['accept'] = {}
-                distribution[year][model][type]['reject'] = {}
-                # 统计百分比，先将accept下面的count加起来，然后得到每个百分比
-                accept_sum = sum(type_dict['accept'].values())
-                for reason, count in type_dict['accept'].items():
-                    distribution[year][model][type]['accept'][reason] = count / accept_sum
-                reject_sum = sum(type_dict['reject'].values())
-                for reason, count in type_dict['reject'].items():
-                    distribution[year][model][type]['reject'][reason] = count / reject_sum
-    
+        json.dump(_with_decisions(_to_nested_dict(count), 3), f, indent=4)
+    return count
+
+
+def calcu_reason_percentage_every_year(path=None):
+    # 统计百分比: the share of each reason among the accept (or reject) reasons of each year, model and type
+    table = load_reason_table(path)
+    count = table.groupby(['year', 'model', 'type', 'decision', 'reason']).size()
+    distribution = count / count.groupby(level=['year', 'model', 'type', 'decision']).transform('sum')
+
     with open('reason_percentage.json', 'w') as f:
-        json.dump(distribution, f, indent=4)
- 
-def calcu_reason_percentage():
-    # 以每种类别为单位，计算每种类别下的accept和reject的百分比
-    with open('../reason_result/reason_count.json', 'r') as f:
-        reason_count = json.load(f)
-        
-    count_dict = {}
-    for year, year_dict in reason_count.items():
-        for model, model_dict in year_dict.items():
-            for type, type_dict in model_dict.items():
-                count_dict[type] = {'accept': {}, 'reject': {}}
-                # 得到所有year和model的accept和reject的count
-                accept_count = type_dict['accept']
-                reject_count = type_dict['reject']
-                # 将accept中每一类原因进行累加
-                for reason, count in accept_count.items():
-                    if reason not in count_dict[type]['accept']:
-                        count_dict[type]['accept'][reason] = 0
-                    count_dict[type]['accept'][reason] += count
-                for reason, count in reject_count.items():
-                    if reason not in count_dict[type]['reject']:
-                        count_dict[type]['reject'][reason] = 0
-                    count_dict[type]['reject'][reason] += count
-    # 计算count_dict中accept和reject其中原因的百分比
-    reason_percentage = {}
-    for type, type_dict in count_dict.items():
-        reason_percentage[type] = {'accept': {}, 'reject': {}}
-        accept_sum = sum(type_dict['accept'].values())
-        for reason, count in type_dict['accept'].items():
-            reason_percentage[type]['accept'][reason] = count / accept_sum
-        reject_sum = sum(type_dict['reject'].values())
-        for reason, count in type_dict['reject'].items():
-            reason_percentage[type]['reject'][reason] = count / reject_sum
-    
+        json.dump(_with_decisions(_to_nested_dict(distribution), 3), f, indent=4)
+    return distribution
+
+
+def calcu_reason_percentage(path=None):
+    # 以每种类别为单位，计算每种类别下的accept和reject的百分比 (over all years and models)
+    table = load_reason_table(path)
+    count = table.groupby(['type', 'decision', 'reason']).size()
+    reason_percentage = count / count.groupby(level=['type', 'decision']).transform('sum')
+
     with open('reason_percentage.json', 'w') as f:
-        json.dump(reason_percentage, f, indent=4)
+        json.dump(_with_decisions(_to_nested_dict(reason_percentage), 1), f, indent=4)
+    return reason_percentage
 
 def draw_bar_chart(accept_or_reject, ax, type, name1, name2):
     # accept_or_reject = 'accept'
@@ -462,16 +566,5 @@ if __name__ == "__main__":
 #     # json_files = [f for f in json_files]
 #     # print(json_files)
     
-#     # 将其平均分为6份，每份分配给一个进程
-#     n = len(json_files)
-#     n_per_process = n // 6
-#     processes = []
-#     for i in range(6):
-#         start = i * n_per_process
-#         end = (i + 1) * n_per_process
-#         if i == 5:
-#             end = n
-#         p = multiprocessing.Process(target=analyze_reason_in_batch, args=(json_files[start:end], ))
-#         processes.append(p)
-#         p.start()
-    
\ No newline at end of file
+#     # Concurrent requests share one client; rerun to resume after an interruption
+#     analyze_reason_in_batch(json_files, max_workers=8)
@@ -1,6 +1,7 @@
 import logging
 import os
 import sys
+from argparse import Namespace
 
 import numpy as np
 
@@ -11,19 +12,18 @@ from agentreview.utility.experiment_utils import initialize_players
 from agentreview.experiment_config import all_settings
 from agentreview.paper_review_settings import get_experiment_settings
 from agentreview.environments import PaperDecision
+from agentreview.backends.coalescing import format_coalescing_counts
+from agentreview.backends.hedging import format_hedging_counts
+from agentreview.backends.resilience import format_error_counts
+from agentreview.metrics import configure_metrics, format_metrics_summary
+from agentreview.utility.authentication_utils import format_http_pool_stats
+from agentreview.tracing import configure_tracing, export_trace, span
 from agentreview.paper_review_arena import PaperReviewArena
 from agentreview.arguments import parse_args
+from agentreview.utility.batch_utils import get_reserved_tokens, pack_ac_batches, split_ac_batches
+from agentreview.utility.logging_utils import log_context, setup_logging
 from agentreview.utility.utils import project_setup, get_paper_decision_mapping, \
-    load_metareview, load_llm_ac_decisions
-
-# Set up logging configuration
-logging.basicConfig(
-    level=logging.DEBUG,  # Set to DEBUG to capture all levels of logs
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)  # Output to stdout
-    ]
-)
+    load_metareview, load_llm_ac_decisions, save_ac_batch
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +39,11 @@ def main(args):
     """
     args.task = "paper_decision"
 
-    print(const.AGENTREVIEW_LOGO)
+    if not args.quiet:
+        print(const.AGENTREVIEW_LOGO)
+
+    metrics = configure_metrics(args.metrics_dir)
+    configure_tracing(args.trace_path is not None)
 
     # Sample Paper IDs from each category
     paper_id2decision, paper_decision2ids = get_paper_decision_mapping(args.data_dir, args.conference)
@@ -94,28 +98,68 @@ def main(args):
             metareviews += [metareview]
             experimental_paper_ids += [paper_id]
 
-    num_batches = len(experimental_paper_ids) // args.num_papers_per_area_chair
-
-    for batch_index in range(num_batches):
-
-        players = initialize_players(experiment_setting=experiment_setting, args=args)
-
-        player_names = [player.name for player in players]
-
-        if batch_index >= num_batches - 1:  # Last batch. Include all remaining papers
-            batch_paper_ids = experimental_paper_ids[batch_index * args.num_papers_per_area_chair:]
-
-        else:
-            batch_paper_ids = experimental_paper_ids[batch_index * args.num_papers_per_area_chair: (batch_index + 1) *
-                                                                                                   args.num_papers_per_area_chair]
-
-        env = PaperDecision(player_names=player_names, paper_ids=batch_paper_ids,
-                            metareviews=metareviews,
-                            experiment_setting=experiment_setting, ac_scoring_method=args.ac_scoring_method)
+    if args.ac_batch_token_budget is not None:
+        # Fill each batch with the next papers of the shuffled order, up to the token budget left by the rest of the
+        # context of the AC
+        area_chair = next(player for player in initialize_players(experiment_setting=experiment_setting, args=args)
+                          if player.name.startswith("AC"))
+        batches = pack_ac_batches(experimental_paper_ids, metareviews, token_budget=args.ac_batch_token_budget,
+                                  acceptance_rate=args.acceptance_rate,
+                                  reserved_tokens=get_reserved_tokens(area_chair, const.GLOBAL_PROMPT))
+    else:
+        batches = split_ac_batches(experimental_paper_ids, metareviews, args.num_papers_per_area_chair)
+
+    with span("sweep", task=args.task, experiment=args.experiment_name):
+        for batch_index, batch in enumerate(batches):
+            with span("decision_arena", batch_index=batch_index, num_papers=len(batch.paper_ids),
+                      num_tokens=batch.num_tokens), \
+                    log_context(experiment=args.experiment_name, arena=f"ac_batch_{batch_index}"):
+                batch_args = args
+                if batch.token_budget is not None:
+                    # The AC is told how many papers are in its batch, and the quota of the batch used for the decisions
+                    batch_args = Namespace(**{**vars(args), "num_papers_per_area_chair": len(batch.paper_ids),
+                                              "num_papers_to_accept": batch.num_papers_to_accept})
+
+                players = initialize_players(experiment_setting=experiment_setting, args=batch_args)
+
+                player_names = [player.name for player in players]
+
+                logger.info(f"Batch {batch_index + 1}/{len(batches)}: {len(batch.paper_ids)} papers, "
+                            f"{batch.num_tokens} tokens of metareviews")
+
+                env = PaperDecision(player_names=player_names, paper_ids=batch.paper_ids,
+                                    metareviews=batch.metareviews,
+                                    experiment_setting=experiment_setting,
+                                    ac_scoring_method=args.ac_scoring_method)
+
+                if batch.token_budget is not None:
+                    # Record the composition and the quota of the batch, used when computing the decisions
+                    save_ac_batch(batch.to_record(), output_dir=args.output_dir, conference=args.conference,
+                                  model_name=args.model_name, ac_scoring_method=args.ac_scoring_method,
+                                  experiment_name=args.experiment_name)
+
+                arena = PaperReviewArena(players=players, environment=env, args=args,
+                                         global_prompt=const.GLOBAL_PROMPT)
+                arena.launch_cli(interactive=False)
+
+    if args.trace_path is not None:
+        export_trace(args.trace_path)
+
+    logger.info(format_metrics_summary(metrics.summary()))
+    logger.info(format_error_counts())
+    logger.info(format_http_pool_stats())
+    if args.hedge_percentile is not None:
+        logger.info(format_hedging_counts())
+    if args.coalesce_max_temperature is not None:
+        logger.info(format_coalescing_counts())
+    metrics.close()
 
-        arena = PaperReviewArena(players=players, environment=env, args=args, global_prompt=const.GLOBAL_PROMPT)
-        arena.launch_cli(interactive=False)
 
 if __name__ == "__main__":
     project_setup()
-    main(parse_args())
+    args = parse_args()
+    # Logs are written by a background thread, see `logging_utils.py`
+    setup_logging(level=logging.INFO, quiet=args.quiet, log_dir=args.log_dir,
+                  max_message_chars=args.log_max_message_chars,
+                  max_records_per_second=args.log_max_records_per_second)
+    main(args)
@@ -1,4 +1,3 @@
-import glob
 import logging
 import os
 import sys
@@ -10,21 +9,20 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from agentreview import const
 from agentreview.arguments import parse_args
 from agentreview.experiment_config import all_settings
+from agentreview.backends.coalescing import format_coalescing_counts
+from agentreview.backends.hedging import format_hedging_counts
+from agentreview.backends.resilience import format_error_counts
+from agentreview.dataset.manifest import get_corpus_manifest
+from agentreview.metrics import configure_metrics, format_metrics_summary
+from agentreview.utility.authentication_utils import format_http_pool_stats
+from agentreview.tracing import configure_tracing, export_trace, span
 from agentreview.environments import PaperReview
 from agentreview.paper_review_settings import get_experiment_settings
 from agentreview.paper_review_arena import PaperReviewArena
 from agentreview.utility.experiment_utils import initialize_players
+from agentreview.utility.logging_utils import log_context, setup_logging
 from agentreview.utility.utils import project_setup, get_paper_decision_mapping
 
-# Set up logging configuration
-logging.basicConfig(
-    level=logging.DEBUG,  # Set to DEBUG to capture all levels of logs
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)  # Output to stdout
-    ]
-)
-
 logger = logging.getLogger(__name__)
 
 
@@ -45,39 +43,70 @@ def main(args: Namespace):
 
     args.task = "paper_review"
 
-    print(const.AGENTREVIEW_LOGO)
+    if not args.quiet:
+        print(const.AGENTREVIEW_LOGO)
+
+    metrics = configure_metrics(args.metrics_dir)
+    configure_tracing(args.trace_path is not None)
 
     paper_id2decision, paper_decision2ids = get_paper_decision_mapping(args.data_dir, args.conference)
 
-    # Sample paper IDs for the simulation from existing data.
-    paper_paths = glob.glob(os.path.join(args.data_dir, args.conference, "paper", "**", "*.pdf"))
-    sampled_paper_ids = [int(os.path.basename(p).split(".pdf")[0]) for p in paper_paths if p.endswith(".pdf")]
+    # Sample paper IDs for the simulation from the papers whose PDFs are in the corpus manifest.
+    manifest = get_corpus_manifest(args.data_dir, args.conference)
+    sampled_paper_ids = [paper_id for paper_id in manifest.paper_ids(with_pdf=True) if paper_id in paper_id2decision]
+
+    num_undecided = len(manifest.paper_ids(with_pdf=True)) - len(sampled_paper_ids)
+    if num_undecided:
+        logger.warning(f"Skipping {num_undecided} papers without a decision in {manifest.path}")
+
+    with span("sweep", task=args.task, experiment=args.experiment_name):
+        for paper_id in sampled_paper_ids:
+            with span("paper_arena", paper_id=paper_id), log_context(experiment=args.experiment_name, arena=paper_id):
+                # Ground-truth decision in the conference.
+                # We use this to partition the papers into different quality.
+                paper_decision = paper_id2decision[paper_id]
+
+                experiment_setting = get_experiment_settings(paper_id=paper_id,
+                                                             paper_decision=paper_decision,
+                                                             setting=all_settings[args.experiment_name])
+
+                logger.info(f"Experiment Started!")
+                logger.info(f"Paper ID: {paper_id} (Decision in {args.conference}: {paper_decision})")
 
-    for paper_id in sampled_paper_ids:
-        # Ground-truth decision in the conference.
-        # We use this to partition the papers into different quality.
-        paper_decision = paper_id2decision[paper_id]
+                players = initialize_players(experiment_setting=experiment_setting, args=args)
 
-        experiment_setting = get_experiment_settings(paper_id=paper_id,
-                                                     paper_decision=paper_decision,
-                                                     setting=all_settings[args.experiment_name])
+                player_names = [player.name for player in players]
 
-        logger.info(f"Experiment Started!")
-        logger.info(f"Paper ID: {paper_id} (Decision in {args.conference}: {paper_decision})")
+                env = PaperReview(player_names=player_names, paper_decision=paper_decision, paper_id=paper_id,
+                                  args=args, experiment_setting=experiment_setting)
 
-        players = initialize_players(experiment_setting=experiment_setting, args=args)
+                arena = PaperReviewArena(players=players, environment=env, args=args,
+                                         global_prompt=const.GLOBAL_PROMPT)
+                arena.launch_cli(interactive=False)
 
-        player_names = [player.name for player in players]
+                # Persist the extraction status of the paper
+                manifest.save()
 
-        env = PaperReview(player_names=player_names, paper_decision=paper_decision, paper_id=paper_id,
-                          args=args, experiment_setting=experiment_setting)
+    if args.trace_path is not None:
+        export_trace(args.trace_path)
 
-        arena = PaperReviewArena(players=players, environment=env, args=args, global_prompt=const.GLOBAL_PROMPT)
-        arena.launch_cli(interactive=False)
+    logger.info(format_metrics_summary(metrics.summary()))
+    logger.info(format_error_counts())
+    logger.info(format_http_pool_stats())
+    if args.hedge_percentile is not None:
+        logger.info(format_hedging_counts())
+    if args.coalesce_max_temperature is not None:
+        logger.info(format_coalescing_counts())
+    metrics.close()
 
     logger.info("Done!")
 
 
 if __name__ == "__main__":
     project_setup()
-    main(parse_args())
+    args = parse_args()
+    # Logs are written by a background thread, see `logging_utils.py`
+    setup_logging(level=logging.INFO, quiet=args.quiet, log_dir=args.log_dir,
+                  max_message_chars=args.log_max_message_chars,
+                  max_records_per_second=args.log_max_records_per_second)
+    main(args)